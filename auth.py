@@ -0,0 +1,190 @@
+#------------------------------------------------------------------------------
+# auth.py
+#------------------------------------------------------------------------------
+# this file checks passwords and hands out resume codes.
+#
+# bcrypt is slow on purpose (about a quarter second at cost 12), so password
+# checks take one of AUTH_WORKERS slots first. the slots are lock files
+# shared by every dreamland process on the host, so a burst of logins waits
+# its turn instead of taking over every cpu, whether visitors come in through
+# gotty (one process each) or server.py (one thread each).
+#
+# after logging in, a user gets a resume code:
+#
+#   mia.mf3k2a.3jx7kq2mbnvc4pd6
+#
+# which is their username, when the code expires (seconds since the epoch,
+# base 36) and a signature made with the key in SECRET_PATH. typing it on
+# the welcome screen (or passing it with --resume, see dreamland.py) logs
+# them back in without running bcrypt. the signature also covers the
+# password hash and the user's code generation, a counter in their user
+# data that goes up when they log out or their password changes, so either
+# one makes every code handed out before it stop working.
+#------------------------------------------------------------------------------
+
+import os
+import hmac
+import time
+import base64
+import fcntl
+import hashlib
+import secrets
+import bcrypt
+
+from config import BCRYPT_ROUNDS, AUTH_WORKERS, AUTH_QUEUE_SECONDS, RESUME_DAYS, SECRET_PATH
+from filestore import locked, write_atomic
+
+SLOT_DIR = 'auth-slots'
+
+_secret = None
+
+class Busy(Exception):
+    """
+    raised when no password check slot frees up in time.
+    """
+
+def _slot():
+    """
+    takes a free password check slot and returns its open lock file, which
+    holds the slot until it is closed. raises Busy after AUTH_QUEUE_SECONDS.
+    """
+    os.makedirs(SLOT_DIR, exist_ok=True)
+    deadline = time.monotonic() + AUTH_QUEUE_SECONDS
+    while True:
+        for number in range(max(AUTH_WORKERS, 1)):
+            lock_file = open(os.path.join(SLOT_DIR, f'{number}.lock'), 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return lock_file
+            except BlockingIOError:
+                lock_file.close()
+        if time.monotonic() >= deadline:
+            raise Busy()
+        time.sleep(0.05)
+
+def _run(fn, *args):
+    """
+    runs fn while holding a slot.
+    """
+    with _slot():
+        return fn(*args)
+
+def _decode(password_hash):
+    """
+    turns a stored password hash (base64, as kept in the user file) into
+    bcrypt's own form.
+    """
+    return base64.b64decode(password_hash.encode('utf-8'))
+
+def _rounds(password_hash):
+    """
+    returns the cost a stored hash was made with, e.g. 12 for $2b$12$...
+    """
+    try:
+        return int(_decode(password_hash).split(b'$')[2])
+    except (ValueError, IndexError):
+        return 0
+
+def hash_password(password):
+    """
+    hashes a password at BCRYPT_ROUNDS and returns it as it is stored.
+    """
+    hashed = _run(bcrypt.hashpw, password.encode(), bcrypt.gensalt(BCRYPT_ROUNDS))
+    return base64.b64encode(hashed).decode('utf-8')
+
+def check_password(password, password_hash):
+    """
+    checks a password against a stored hash. raises Busy if every slot
+    stayed taken.
+    """
+    return _run(bcrypt.checkpw, password.encode(), _decode(password_hash))
+
+def needs_rehash(password_hash):
+    """
+    checks whether a stored hash was made with a lower cost than
+    BCRYPT_ROUNDS.
+    """
+    return _rounds(password_hash) < BCRYPT_ROUNDS
+
+def _key():
+    """
+    returns the key resume codes are signed with, making one the first
+    time it's needed.
+    """
+    global _secret
+    if _secret is None:
+        with locked(SECRET_PATH):
+            if not os.path.exists(SECRET_PATH):
+                write_atomic(SECRET_PATH, secrets.token_hex(32).encode('utf-8'))
+                os.chmod(SECRET_PATH, 0o600)
+            with open(SECRET_PATH, 'rb') as f:
+                _secret = f.read().strip()
+    return _secret
+
+def _sign(username, expires, user_data):
+    """
+    returns the signature part of a resume code.
+    """
+    generation = user_data.get('code_generation', 0)
+    message = f'{username}\n{expires}\n{user_data["password_hash"]}\n{generation}'.encode('utf-8')
+    digest = hmac.new(_key(), message, hashlib.sha256).digest()
+    return base64.b32encode(digest[:10]).decode('ascii').lower()
+
+def _base36(number):
+    """
+    writes a non-negative int in base 36.
+    """
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    text = ''
+    while True:
+        number, digit = divmod(number, 36)
+        text = digits[digit] + text
+        if not number:
+            return text
+
+def issue_code(username, user_data):
+    """
+    returns a resume code for a user that works for RESUME_DAYS, or until
+    their codes are revoked.
+    """
+    expires = _base36(int(time.time() + RESUME_DAYS * 86400))
+    return f'{username}.{expires}.{_sign(username, expires, user_data)}'
+
+def code_user(code):
+    """
+    returns the username a resume code is for, or None if it isn't one.
+    """
+    parts = code.strip().rsplit('.', 2)
+    return parts[0] if len(parts) == 3 and parts[0] else None
+
+def check_code(code, user_data):
+    """
+    checks a resume code against the user's current data.
+    """
+    parts = code.strip().rsplit('.', 2)
+    if len(parts) != 3:
+        return False
+    username, expires, signature = parts
+    try:
+        if int(expires, 36) < time.time():
+            return False
+    except ValueError:
+        return False
+    # compared as bytes: compare_digest refuses str with non-ascii characters
+    return hmac.compare_digest(signature.lower().encode('utf-8'),
+                               _sign(username, expires, user_data).encode('utf-8'))
+
+def revoke_codes(user_data):
+    """
+    makes every resume code issued so far for a user stop working.
+    changes user_data in place; the caller saves it.
+    """
+    user_data['code_generation'] = user_data.get('code_generation', 0) + 1
+
+def set_password_hash(user_data, password_hash):
+    """
+    gives a user a new password hash, revoking their resume codes.
+    changes user_data in place; the caller saves it.
+    """
+    user_data['password_hash'] = password_hash
+    revoke_codes(user_data)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+#------------------------------------------------------------------------------
+# bench_layout.py
+#------------------------------------------------------------------------------
+# this file times the text layout a screen does for one frame: wrapping and
+# indenting every comment of a long thread the way the comments screen does.
+# it compares laying out without any reuse (a new text wrapper per call, as
+# helpers.py used to), with a cold layout cache (the first time a thread is
+# shown) and with a warm one (every redraw after that).
+#
+#   python3 bench_layout.py                        # threads of 10 to 1000 comments
+#   python3 bench_layout.py --comments 5000 --frames 20
+#------------------------------------------------------------------------------
+
+import time
+import random
+import argparse
+import textwrap
+
+import helpers
+from config import SCREEN_WIDTH
+
+WORDS = ('dream land post like comment reply wow love this so much '
+         'honestly tomorrow maybe never again cute cat picture').split()
+
+def build_thread(comments, seed=1):
+    """
+    returns a synthetic comment thread of random lengths.
+    """
+    rng = random.Random(seed)
+    return [
+        {
+            'user': f"user{rng.randrange(1000)}",
+            'comment': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 60))),
+            'timestamp': f"today at {rng.randint(1, 12)}:{rng.randint(10, 59)}pm",
+        }
+        for _ in range(comments)
+    ]
+
+def _layout_without_reuse(text, indent):
+    """
+    what format_text and wrap_text did before the layout cache.
+    """
+    wrapper = textwrap.TextWrapper(width=SCREEN_WIDTH - indent, subsequent_indent=' ' * indent)
+    wrapped_text = wrapper.fill(text)
+    return '\n'.join(" " * indent + line for line in wrapped_text.split('\n'))
+
+def render_frame(thread, format_text, wrap_text):
+    """
+    lays out the comments screen for a thread and returns the frame.
+    """
+    parts = [format_text("comments:\n")]
+    for comment in thread:
+        comment_text = wrap_text(comment['comment'], 4)
+        comment_info = f"{comment['user']} (@{comment['user']}) - {comment['timestamp']}\n{comment_text}\n"
+        parts.append(format_text(comment_info, 1))
+    return '\n'.join(parts)
+
+def time_frames(thread, frames, format_text, wrap_text, before_frame=None):
+    """
+    returns the average seconds to lay out one frame.
+    """
+    total = 0.0
+    for _ in range(frames):
+        if before_frame:
+            before_frame()
+        start = time.perf_counter()
+        render_frame(thread, format_text, wrap_text)
+        total += time.perf_counter() - start
+    return total / frames
+
+def main():
+    parser = argparse.ArgumentParser(description='time the layout of a long comment thread')
+    parser.add_argument('--comments', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--frames', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"width {SCREEN_WIDTH}, {args.frames} frames each\n")
+    print(f"{'comments':>8} {'no reuse':>12} {'cold cache':>12} {'warm cache':>12}")
+    for comments in args.comments:
+        thread = build_thread(comments)
+        before = time_frames(thread, args.frames, lambda text, indent=1: _layout_without_reuse(text, indent),
+                             lambda text, indent=5: _layout_without_reuse(text, indent))
+        cold = time_frames(thread, args.frames, helpers.format_text, helpers.wrap_text,
+                           before_frame=helpers._layout.cache_clear)
+        helpers._layout.cache_clear()
+        render_frame(thread, helpers.format_text, helpers.wrap_text)
+        warm = time_frames(thread, args.frames, helpers.format_text, helpers.wrap_text)
+        print(f"{comments:>8} {before * 1000:>10.2f}ms {cold * 1000:>10.2f}ms {warm * 1000:>10.2f}ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+
+#------------------------------------------------------------------------------
+# bench_screens.py
+#------------------------------------------------------------------------------
+# this file times the screens themselves on synthetic datasets of growing
+# size (see gen_dataset.py). each scenario runs a screen function with no
+# terminal, typing a fixed script of input through a ScriptedIO channel, as
+# a handful of different accounts (popular ones and typical ones), and
+# reports:
+#
+#   latency   median and slowest run of the screen, input to last frame
+#   read      bytes the process read from files per run
+#   written   bytes the process wrote to files per run
+#   peak      most memory python had allocated at once during a run
+#
+# plus how long opening the store took (building indexes, or importing the
+# dataset into sqlite) and the run's peak resident memory.
+#
+#   python3 bench_screens.py                        # 1k, 10k and 100k users
+#   python3 bench_screens.py --users 1000 --backend sqlite --runs 20
+#------------------------------------------------------------------------------
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+
+from bench_storage import io_counters
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# (name, screen, lines typed). every script ends by leaving the screen
+SCENARIOS = [
+    ('feed, 10 posts', 'feed', ['n'] * 9 + ['']),
+    ('feed, comments', 'feed', ['4', '', '']),
+    ('discover, 5 pages', 'discover', ['n'] * 4 + ['back']),
+    ('messages inbox', 'messages', ['']),
+    ('newest conversation', 'messages', ['1', 'back']),
+    ('notifications', 'notifications', ['']),
+]
+
+def _accounts(manifest, screen):
+    """
+    returns the accounts to run a screen as: popular and typical ones in
+    turn (or the busiest inboxes, for messages).
+    """
+    if screen == 'messages':
+        return manifest['busiest_inboxes']
+    mixed = []
+    for pair in zip(manifest['popular'], manifest['typical']):
+        mixed.extend(pair)
+    return mixed
+
+def run_screens(runs):
+    """
+    runs inside a dataset directory with one storage engine selected.
+    prints the results as a single json line for the parent process.
+    """
+    import resource
+    import data  # imported here so the env var picks the engine
+    import notify
+    from feed import feed_screen
+    from friends import discover_users_screen
+    from chat import direct_messages_screen
+    from notifications import notifications_screen
+    from session import Session, ScriptedIO
+
+    screens = {
+        'feed': feed_screen,
+        'discover': discover_users_screen,
+        'messages': direct_messages_screen,
+        'notifications': notifications_screen,
+    }
+    with open('dataset.json', 'r') as f:
+        manifest = json.load(f)
+
+    def drive(screen, user, lines):
+        session = Session(ScriptedIO(lines, keep_output=False), user=user, screen=screen)
+        try:
+            screens[screen](session)
+        except EOFError:
+            pass  # the script ran out before the screen was left
+        notify.flush()
+
+    start = time.perf_counter()
+    data.load_directory_page()
+    data.load_follow_counts(manifest['popular'][0])
+    data.count_user_posts(manifest['popular'][0])
+    results = {'open': time.perf_counter() - start, 'scenarios': []}
+
+    for name, screen, lines in SCENARIOS:
+        accounts = _accounts(manifest, screen)
+        times = []
+        read_before, written_before = io_counters()
+        for user in accounts[:runs]:
+            started = time.perf_counter()
+            drive(screen, user, lines)
+            times.append(time.perf_counter() - started)
+        read_after, written_after = io_counters()
+        # memory is traced on a separate run, tracing slows everything down
+        tracemalloc.start()
+        drive(screen, accounts[runs % len(accounts)], lines)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        times.sort()
+        results['scenarios'].append({
+            'name': name,
+            'median': times[len(times) // 2],
+            'max': times[-1],
+            'read': (read_after - read_before) // len(times),
+            'written': (written_after - written_before) // len(times),
+            'peak': peak,
+        })
+    results['rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    print(json.dumps(results))
+
+def bench(dataset, backend, args):
+    """
+    copies a dataset for one engine and runs the scenarios against it.
+    """
+    directory = tempfile.mkdtemp(prefix=f'dreamland-screens-{backend}-')
+    try:
+        shutil.copytree(dataset, os.path.join(directory, 'data'))
+        env = dict(os.environ, DREAMLAND_STORAGE=backend, PYTHONPATH=HERE)
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--run', '--runs', str(args.runs)],
+                                cwd=os.path.join(directory, 'data'), env=env, check=True,
+                                stdout=subprocess.PIPE, text=True).stdout
+        return json.loads(output.strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='time every screen on synthetic datasets')
+    parser.add_argument('--users', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--posts-per-user', type=int, default=10)
+    parser.add_argument('--backend', choices=['json', 'sqlite', 'both'], default='both')
+    parser.add_argument('--runs', type=int, default=10, help='accounts each scenario runs as')
+    parser.add_argument('--datasets', help='keep generated datasets here and reuse them next time')
+    parser.add_argument('--run', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_screens(args.runs)
+        return
+
+    import gen_dataset
+    backends = ['json', 'sqlite'] if args.backend == 'both' else [args.backend]
+    scratch = tempfile.mkdtemp(prefix='dreamland-datasets-')
+    try:
+        for users in args.users:
+            dataset = os.path.join(args.datasets or scratch, f'{users}-users')
+            if not os.path.exists(os.path.join(dataset, 'dataset.json')):
+                shutil.rmtree(dataset, ignore_errors=True)
+                started = time.perf_counter()
+                gen_dataset.build(dataset, users, users * args.posts_per_user, users // 2)
+                print(f"  built {users} users in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+            print(f"\n{users} users, {users * args.posts_per_user} posts\n")
+            print(f"{'backend':<8} {'scenario':<20} {'median':>9} {'max':>9} {'read':>12} "
+                  f"{'written':>10} {'peak':>10}")
+            for backend in backends:
+                results = bench(dataset, backend, args)
+                for row in results['scenarios']:
+                    print(f"{backend:<8} {row['name']:<20} {row['median'] * 1000:>7.1f}ms "
+                          f"{row['max'] * 1000:>7.1f}ms {row['read']:>12,} {row['written']:>10,} "
+                          f"{row['peak'] // 1024:>8,}kb")
+                print(f"{backend:<8} opening the store took {results['open']:.2f}s, "
+                      f"peak rss {results['rss'] // (1024 * 1024)}mb")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
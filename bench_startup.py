@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+#------------------------------------------------------------------------------
+# bench_startup.py
+#------------------------------------------------------------------------------
+# this file times how long a new connection waits for its first frame (the
+# splash art), the way gotty starts it: a process on a fresh terminal.
+# it compares a cold start (python3 dreamland.py) with a start through a
+# running zygote (python3 -S zygote.py --connect, see zygote.py).
+#
+#   python3 bench_startup.py                    # in an empty data dir
+#   python3 bench_startup.py --data . --runs 50 # against a copy of real data
+#------------------------------------------------------------------------------
+
+import os
+import sys
+import time
+import shutil
+import select
+import argparse
+import tempfile
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def first_frame(command, cwd, env, timeout=30):
+    """
+    starts command on a new terminal and returns the seconds until it
+    writes its first output.
+    """
+    master, slave = os.openpty()
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=cwd, env=env, stdin=slave, stdout=slave,
+                               stderr=slave, start_new_session=True)
+    os.close(slave)
+    try:
+        if not select.select([master], [], [], timeout)[0]:
+            raise RuntimeError(f"no output from {' '.join(command)}")
+        os.read(master, 65536)
+        return time.perf_counter() - start
+    finally:
+        # closing the terminal ends the session, like closing the browser tab
+        os.close(master)
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+def summarize(times):
+    """
+    returns the median and 90th percentile in milliseconds.
+    """
+    times = sorted(times)
+    return times[len(times) // 2] * 1000, times[int(len(times) * 0.9)] * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description='time to first frame, cold start vs zygote')
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--data', help='data directory to copy and run against (default: empty)')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='dreamland-startup-')
+    data_dir = os.path.join(workdir, 'data')
+    if args.data:
+        shutil.copytree(args.data, data_dir, ignore=shutil.ignore_patterns('*.py', '__pycache__', '.git'))
+    else:
+        os.makedirs(data_dir)
+    env = dict(os.environ, DREAMLAND_ZYGOTE=os.path.join(workdir, 'zygote.sock'))
+    python = sys.executable
+    try:
+        cold = [first_frame([python, os.path.join(HERE, 'dreamland.py')], data_dir, env)
+                for _ in range(args.runs)]
+
+        zygote = subprocess.Popen([python, os.path.join(HERE, 'zygote.py')], cwd=data_dir, env=env,
+                                  stdin=subprocess.DEVNULL, stdout=subprocess.PIPE)
+        zygote.stdout.readline()  # "zygote ready on ..."
+        try:
+            warm = [first_frame([python, '-S', os.path.join(HERE, 'zygote.py'), '--connect'], data_dir, env)
+                    for _ in range(args.runs)]
+        finally:
+            zygote.terminate()
+            zygote.wait()
+
+        print(f"{args.runs} runs each, time to first frame\n")
+        print(f"{'':>8} {'median':>10} {'p90':>10}")
+        for name, times in (('cold', cold), ('zygote', warm)):
+            median, p90 = summarize(times)
+            print(f"{name:>8} {median:>8.1f}ms {p90:>8.1f}ms")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+
+#------------------------------------------------------------------------------
+# bench_storage.py
+#------------------------------------------------------------------------------
+# this file compares the json and sqlite storage engines.
+# it builds a synthetic dataset in a temporary directory, then times the
+# data.py calls that the screens make for everyday actions.
+#
+#   python3 bench_storage.py                      # 10k users, 1m posts
+#   python3 bench_storage.py --users 1000 --posts 50000
+#------------------------------------------------------------------------------
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def io_counters():
+    """
+    returns (bytes read, bytes written) for this process so far.
+    only linux exposes these, elsewhere it returns zeros.
+    """
+    try:
+        with open('/proc/self/io', 'r') as f:
+            fields = dict(line.split(': ') for line in f.read().splitlines())
+        return int(fields['rchar']), int(fields['wchar'])
+    except (OSError, KeyError, ValueError):
+        return 0, 0
+
+def build_dataset(directory, users, posts, seed=1):
+    """
+    writes users/, posts.json and messages.json the way the app would.
+    posts.json is streamed out so a million posts don't sit in memory twice.
+    """
+    rng = random.Random(seed)
+    names = [f"user{i}" for i in range(users)]
+    os.makedirs(os.path.join(directory, 'users'))
+    for name in names:
+        user_data = {
+            'password_hash': '',
+            'display_name': name,
+            'bio': f"hi, i am {name}",
+            'pronouns': '',
+            'age': '',
+            'following': rng.sample(names, min(20, users)),
+            'notifications': [],
+        }
+        with open(os.path.join(directory, 'users', f'{name}.json'), 'w') as f:
+            json.dump(user_data, f, indent=4)
+
+    with open(os.path.join(directory, 'posts.json'), 'w') as f:
+        f.write('[\n')
+        for post_id in range(1, posts + 1):
+            post = {
+                'id': post_id,
+                'user': rng.choice(names),
+                'content': f"post number {post_id} " + 'lorem ipsum ' * rng.randint(1, 8),
+                'likes': rng.sample(names, min(rng.randint(0, 5), users)),
+                'comments': [
+                    {'user': rng.choice(names), 'comment': 'nice', 'ts': 1729171532}
+                    for _ in range(rng.randint(0, 2))
+                ],
+                'ts': 1729171532,
+            }
+            if post_id > 1:
+                f.write(',\n')
+            f.write(json.dumps(post, indent=4))
+        f.write('\n]')
+
+    with open(os.path.join(directory, 'messages.json'), 'w') as f:
+        json.dump({}, f)
+
+def timed(results, name, fn):
+    """
+    runs fn once and records its wall time and file traffic under name.
+    """
+    read_before, written_before = io_counters()
+    start = time.perf_counter()
+    value = fn()
+    elapsed = time.perf_counter() - start
+    read_after, written_after = io_counters()
+    results.append({
+        'action': name,
+        'seconds': elapsed,
+        'read': read_after - read_before,
+        'written': written_after - written_before,
+    })
+    return value
+
+def run_actions():
+    """
+    runs inside the dataset directory with one storage engine selected.
+    prints the results as a single json line for the parent process.
+    """
+    results = []
+    import data  # imported here so the env var picks the engine
+
+    timed(results, 'open store', lambda: data.user_exists('user0'))
+    posts = timed(results, 'load_posts', data.load_posts)
+    target = posts[len(posts) // 2]
+
+    def like():
+        posts = data.load_posts()
+        post = next(p for p in posts if p['id'] == target['id'])
+        post['likes'].append('user1-liker')
+        data.save_posts(posts)
+    timed(results, 'like a post', like)
+
+    def comment():
+        posts = data.load_posts()
+        post = next(p for p in posts if p['id'] == target['id'])
+        post['comments'].append({'user': 'user1', 'comment': 'hi', 'ts': 1729245600})
+        data.save_posts(posts)
+    timed(results, 'comment on a post', comment)
+
+    def create():
+        posts = data.load_posts()
+        posts.append({'id': len(posts) + 1, 'user': 'user0', 'content': 'hello', 'likes': [],
+                      'comments': [], 'ts': 1729245600})
+        data.save_posts(posts)
+    timed(results, 'create a post', create)
+
+    # the calls the screens make now: one small append or row per action
+    timed(results, 'record_like', lambda: data.record_like(target['id'], 'user2'))
+    timed(results, 'record_comment', lambda: data.record_comment(
+        target['id'], {'user': 'user2', 'comment': 'hi', 'ts': 1729245600}))
+    timed(results, 'append_post', lambda: data.append_post(
+        {'user': 'user0', 'content': 'hello', 'likes': [], 'comments': [], 'ts': 1729245600}))
+
+    timed(results, 'load_user_data', lambda: data.load_user_data('user0'))
+    timed(results, 'save_notifications', lambda: data.save_notifications('user0', 'user1 liked your post.'))
+    timed(results, 'count_unread_notifications', lambda: data.count_unread_notifications('user0'))
+    timed(results, 'send_message', lambda: data.send_message('user1', 'user0', 'hello'))
+    print(json.dumps(results))
+
+def bench_backend(backend, args):
+    """
+    builds a fresh dataset for one engine and runs the actions against it.
+    """
+    directory = tempfile.mkdtemp(prefix=f'dreamland-bench-{backend}-')
+    try:
+        start = time.perf_counter()
+        build_dataset(directory, args.users, args.posts)
+        print(f"  built dataset for {backend} in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+        env = dict(os.environ, DREAMLAND_STORAGE=backend, PYTHONPATH=HERE)
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--run'],
+                                cwd=directory, env=env, check=True,
+                                stdout=subprocess.PIPE, text=True).stdout
+        return json.loads(output.strip().splitlines()[-1])
+    finally:
+        if not args.keep:
+            shutil.rmtree(directory, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='compare the dreamland storage engines')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--posts', type=int, default=1000000)
+    parser.add_argument('--backend', choices=['json', 'sqlite', 'both'], default='both')
+    parser.add_argument('--keep', action='store_true', help='keep the dataset directories')
+    parser.add_argument('--run', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_actions()
+        return
+
+    backends = ['json', 'sqlite'] if args.backend == 'both' else [args.backend]
+    print(f"{args.users} users, {args.posts} posts\n")
+    print(f"{'backend':<8} {'action':<20} {'time':>10} {'read':>12} {'written':>12}")
+    for backend in backends:
+        for row in bench_backend(backend, args):
+            print(f"{backend:<8} {row['action']:<20} {row['seconds'] * 1000:>8.1f}ms "
+                  f"{row['read']:>12,} {row['written']:>12,}")
+
+if __name__ == '__main__':
+    main()
@@ -14,127 +14,137 @@ from helpers import (
     format_menu_options,
     color_text,
     format_timestamp,
-    current_screen,
-    current_user,
+    input_until,
 )
-from data import load_messages, save_messages, load_user_data, save_notifications
-from datetime import datetime
+from data import send_message, load_conversation, load_inbox, mark_conversation_read, load_profiles
+from notify import notify
+import signals
 
-def direct_messages_screen():
+# how many messages the conversation screen shows at once
+CONVERSATION_PAGE_SIZE = 20
+
+def direct_messages_screen(session):
     """
     displays the user's direct messages.
     allows them to select a conversation to view or start a new one.
     """
-    clear_screen()
-    show_header(current_user[0])
-    print(format_text("direct messages\n"))
-    messages = load_messages()
-    user_messages = messages.get(current_user[0], {})
-
-    conversations = []
-    for user, msgs in user_messages.items():
-        unread_count = sum(1 for msg in msgs if not msg.get('read') and msg['sender'] != current_user[0])
-        last_message_time = msgs[-1]['timestamp'] if msgs else ''
-        conversations.append({
-            'user': user,
-            'unread': unread_count,
-            'last_message_time': last_message_time
-        })
+    clear_screen(session)
+    show_header(session)
+    session.io.print(format_text("direct messages\n"))
+    inbox = load_inbox(session.user)
 
-    # sort conversations by last message time
-    conversations.sort(key=lambda x: datetime.strptime(x['last_message_time'], '%Y-%m-%d %H:%M:%S') if x['last_message_time'] else datetime.min, reverse=True)
+    # newest conversation first
+    conversations = sorted(inbox.items(), key=lambda item: item[1].get('last_ts', 0), reverse=True)
 
-    for idx, convo in enumerate(conversations, start=1):
-        user = convo['user']
-        unread = convo['unread']
-        user_data = load_user_data(user)
-        display_name = user_data.get('display_name', user)
+    profiles = load_profiles([user for user, summary in conversations])
+    for idx, (user, summary) in enumerate(conversations, start=1):
+        unread = summary.get('unread', 0)
+        display_name = profiles.get(user, {}).get('display_name', user)
         display_text = f"{idx}. {display_name} (@{user})"
         if unread > 0:
             display_text += color_text(f" ({unread} new messages)", '33')  # yellow for unread messages
-        print(format_text(display_text))
+        session.io.print(format_text(display_text))
+        if summary.get('last_id'):
+            sender = "you" if summary['last_sender'] == session.user else summary['last_sender']
+            session.io.print(format_text(f"   {sender}: {summary['preview']} - {format_timestamp(summary['last_ts'])}"))
 
-    print(format_text("\nenter the number of a user to chat with."))
-    print(format_text("press enter to return to the main menu.\n"))
-    choice = input(format_text("enter your choice: ")).strip()
+    session.io.print(format_text("\nenter the number of a user to chat with."))
+    session.io.print(format_text("press enter to return to the main menu.\n"))
+    choice = session.io.input(format_text("enter your choice: ")).strip()
 
     if choice == '':
-        current_screen[0] = "main_menu"
+        session.screen = "main_menu"
         return
 
     try:
         choice = int(choice)
         if 1 <= choice <= len(conversations):
-            selected_user = conversations[choice - 1]['user']
-            view_conversation(selected_user)
+            selected_user = conversations[choice - 1][0]
+            view_conversation(session, selected_user)
         else:
-            print(format_text("invalid choice. please try again."))
-            input(format_text("press enter to continue..."))
+            session.io.print(format_text("invalid choice. please try again."))
+            session.io.input(format_text("press enter to continue..."))
     except ValueError:
-        print(format_text("invalid input. please try again."))
-        input(format_text("press enter to continue..."))
+        session.io.print(format_text("invalid input. please try again."))
+        session.io.input(format_text("press enter to continue..."))
 
-def view_conversation(other_user):
+def view_conversation(session, other_user):
     """
-    displays the conversation with another user.
-    allows the user to send messages.
+    displays the conversation with another user, a window of the latest
+    messages at a time, and allows the user to send messages.
     """
-    messages = load_messages()
-    conversation = messages.get(current_user[0], {}).get(other_user, [])
+    # the messages fetched so far, oldest first. new ones are added to the
+    # end as they arrive and older ones to the front when paging back
+    window = load_conversation(session.user, other_user, limit=CONVERSATION_PAGE_SIZE)
+    top = max(0, len(window) - CONVERSATION_PAGE_SIZE)  # first message on screen
+    marked_id = 0  # the newest message this screen has marked as read
     while True:
-        clear_screen()
-        show_header(current_user[0])
-        print(format_text(f"conversation with {other_user}\n"))
-        if not conversation:
-            print(format_text("no messages yet."))
+        # pick up messages that arrived since the last redraw
+        seen_version = signals.version(session.user, 'messages')
+        at_bottom = top >= len(window) - CONVERSATION_PAGE_SIZE
+        window += load_conversation(session.user, other_user, after=window[-1]['id'] if window else 0)
+        if at_bottom:
+            top = max(0, len(window) - CONVERSATION_PAGE_SIZE)
+
+        clear_screen(session)
+        show_header(session)
+        session.io.print(format_text(f"conversation with {other_user}\n"))
+        if not window:
+            session.io.print(format_text("no messages yet."))
         else:
-            # mark messages as read
-            for msg in conversation:
-                if msg['sender'] != current_user[0]:
-                    msg['read'] = True
-            save_messages(messages)
+            # mark messages as read, only when there is something new
+            if window[-1]['id'] > marked_id:
+                marked_id = window[-1]['id']
+                mark_conversation_read(session.user, other_user, marked_id)
 
             # display messages
-            conversation.sort(key=lambda x: datetime.strptime(x['timestamp'], '%Y-%m-%d %H:%M:%S'))
-            for msg in conversation:
+            if window[top]['id'] > 1:
+                session.io.print(format_text("(type 'older' to see earlier messages)\n"))
+            for msg in window[top:top + CONVERSATION_PAGE_SIZE]:
                 sender = msg['sender']
-                timestamp = format_timestamp(msg['timestamp'])
+                timestamp = format_timestamp(msg['ts'])
                 message_text = wrap_text(msg['message'], indent=4)
                 msg_display = f"{sender} - {timestamp}\n{message_text}\n"
-                print(format_text(msg_display))
+                session.io.print(format_text(msg_display))
+            if top + CONVERSATION_PAGE_SIZE < len(window):
+                session.io.print(format_text("(type 'newer' to see later messages)"))
 
-        print(format_text("\ntype your message and press enter to send."))
-        print(format_text("type 'back' to go back.\n"))
-        user_input = input(format_text("enter your message: ")).strip()
+        session.io.print(format_text("\ntype your message and press enter to send."))
+        session.io.print(format_text("type 'back' to go back.\n"))
+        # redraw by itself when someone sends the user a message
+        user_input = input_until(session, format_text("enter your message: "),
+                                 lambda: signals.version(session.user, 'messages') != seen_version)
+        if user_input is None:
+            continue
+        user_input = user_input.strip()
 
         if user_input.lower() == 'back':
             return
         elif user_input == '':
             continue
+        elif user_input.lower() == 'older' and window and window[top]['id'] > 1:
+            if top < CONVERSATION_PAGE_SIZE:
+                older = load_conversation(session.user, other_user, before=window[0]['id'],
+                                          limit=CONVERSATION_PAGE_SIZE)
+                window = older + window
+                top += len(older)
+            top = max(0, top - CONVERSATION_PAGE_SIZE)
+        elif user_input.lower() == 'newer' and top + CONVERSATION_PAGE_SIZE < len(window):
+            top = min(top + CONVERSATION_PAGE_SIZE, len(window) - CONVERSATION_PAGE_SIZE)
         else:
-            send_message_to_user(other_user, user_input)
-            messages = load_messages()
-            conversation = messages.get(current_user[0], {}).get(other_user, [])
+            message = send_message_to_user(session, other_user, user_input)
+            # add it straight to the window unless something else arrived
+            # first, in which case the next redraw fetches both
+            if message['id'] == (window[-1]['id'] if window else 0) + 1:
+                window.append(message)
+            top = max(0, len(window) - CONVERSATION_PAGE_SIZE)
 
-def send_message_to_user(recipient, message):
+def send_message_to_user(session, recipient, message):
     """
     sends a direct message to another user.
-    updates the messages data and notifies the recipient.
+    appends it to their conversation and notifies the recipient.
+    returns the stored message.
     """
-    messages = load_messages()
-    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    message_data = {
-        'sender': current_user[0],
-        'recipient': recipient,
-        'message': message,
-        'timestamp': timestamp,
-        'read': False
-    }
-
-    # update the messages for both users
-    messages.setdefault(current_user[0], {}).setdefault(recipient, []).append(message_data)
-    messages.setdefault(recipient, {}).setdefault(current_user[0], []).append(message_data)
-
-    save_messages(messages)
-    notification = f"you have a new message from {current_user[0]}."
-    save_notifications(recipient, notification)
+    sent = send_message(session.user, recipient, message)
+    notify(recipient, 'message', session.user)
+    return sent
@@ -0,0 +1,67 @@
+#------------------------------------------------------------------------------
+# config.py
+#------------------------------------------------------------------------------
+# this file holds the settings that can change between installs.
+# every setting can be overridden with an environment variable, so the
+# server can be tuned without touching the code.
+#------------------------------------------------------------------------------
+
+import os
+import shutil
+
+# which storage engine data.py uses: 'json' (plain files) or 'sqlite'
+STORAGE_BACKEND = os.environ.get('DREAMLAND_STORAGE', 'json').strip().lower()
+
+# where the database lives when the sqlite storage engine is selected
+SQLITE_PATH = os.environ.get('DREAMLAND_DB', 'dreamland.db')
+
+# how many posts each home timeline keeps; older posts are found by merging
+# the followed users' own post lists instead
+TIMELINE_LENGTH = int(os.environ.get('DREAMLAND_TIMELINE_LENGTH', '500'))
+
+# users following more accounts than this get a feed merged on the fly from
+# each account's posts instead of their materialized home timeline
+FEED_MERGE_THRESHOLD = int(os.environ.get('DREAMLAND_FEED_MERGE_THRESHOLD', '200'))
+
+# how long a cached profile summary (display name, bio, pronouns) is trusted
+# before it is read again, so edits from other sessions show up
+PROFILE_CACHE_SECONDS = float(os.environ.get('DREAMLAND_PROFILE_CACHE_SECONDS', '60'))
+
+# notifications are held back and written in batches: a batch is written
+# once it has this many events, once its oldest event is this many seconds
+# old, whenever the user moves to another screen, and when dreamland exits
+NOTIFY_BATCH_SIZE = int(os.environ.get('DREAMLAND_NOTIFY_BATCH_SIZE', '50'))
+NOTIFY_BATCH_SECONDS = float(os.environ.get('DREAMLAND_NOTIFY_BATCH_SECONDS', '5'))
+
+# how often a screen waiting for input checks whether new messages or
+# notifications have arrived for the user
+POLL_SECONDS = float(os.environ.get('DREAMLAND_POLL_SECONDS', '1'))
+
+# set to 1 to redraw a screen by rewriting only the rows that changed since
+# the last one, instead of clearing and sending it whole. this assumes rows
+# don't wrap, so only turn it on for terminals at least 50 columns wide
+DIFF_FRAMES = os.environ.get('DREAMLAND_DIFF_FRAMES', '0') == '1'
+
+# how many columns screens are laid out in. 'auto' uses the width of the
+# terminal dreamland was started in
+_width = os.environ.get('DREAMLAND_WIDTH', '40').strip().lower()
+SCREEN_WIDTH = shutil.get_terminal_size().columns if _width == 'auto' else int(_width)
+
+# how many wrapped texts and menus are kept, so redrawing a screen doesn't
+# wrap the same posts and comments again
+LAYOUT_CACHE_SIZE = int(os.environ.get('DREAMLAND_LAYOUT_CACHE_SIZE', '4096'))
+
+# bcrypt cost for new password hashes. older hashes with a lower cost are
+# upgraded the next time their user logs in
+BCRYPT_ROUNDS = int(os.environ.get('DREAMLAND_BCRYPT_ROUNDS', '12'))
+
+# how many password checks run at once, and how long a login waits for a
+# free slot before it is told to try again. bcrypt is slow on purpose, so
+# this keeps a burst of logins from taking over the cpu
+AUTH_WORKERS = int(os.environ.get('DREAMLAND_AUTH_WORKERS', str(max(1, (os.cpu_count() or 2) // 2))))
+AUTH_QUEUE_SECONDS = float(os.environ.get('DREAMLAND_AUTH_QUEUE_SECONDS', '10'))
+
+# how long a resume code (see auth.py) lets a user back in without their
+# password, and the file holding the key that signs those codes
+RESUME_DAYS = float(os.environ.get('DREAMLAND_RESUME_DAYS', '30'))
+SECRET_PATH = os.environ.get('DREAMLAND_SECRET', 'secret.key')
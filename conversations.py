@@ -0,0 +1,311 @@
+#------------------------------------------------------------------------------
+# conversations.py
+#------------------------------------------------------------------------------
+# this file stores direct messages for the json storage engine.
+# every conversation is kept once, in a file named after the two users in
+# alphabetical order:
+#
+#   conversations/<user a>+<user b>.log
+#
+# with one line per message: {"id": 7, "sender": "mia", "message": "...",
+# "ts": 1729171532}. ids count up from 1 within a conversation, so the file
+# is always in order. sending a message is one append.
+#
+# every user also has inbox/<username>.json, a summary of each conversation
+# they have, kept up to date on every send and read so the inbox screen
+# never has to open the conversations themselves:
+#
+#   {"sam": {"read_id": 6, "last_id": 7, "last_sender": "sam",
+#            "last_ts": 1729171532, "preview": "see you tomorrow"}}
+#
+# read_id is the last message the user has seen. sending a message moves
+# the sender's read_id past it, so everything after read_id is from the
+# other person and the unread count is simply last_id - read_id.
+#------------------------------------------------------------------------------
+
+import os
+import json
+import threading
+from urllib.parse import quote, unquote
+
+from filestore import locked, append_records, read_records, encode_record, write_atomic
+import timestamps
+
+CONVERSATION_DIR = 'conversations'
+INBOX_DIR = 'inbox'
+
+# written once messages.json has been moved into conversations/
+MIGRATED_MARKER = os.path.join(CONVERSATION_DIR, '.migrated')
+
+# how much of the last message the inbox shows
+PREVIEW_LENGTH = 40
+
+# path -> [inode, bytes scanned, offset of every message], so a window of a
+# long conversation can be read without going through the whole log
+_offsets = {}
+_offsets_mutex = threading.Lock()
+
+def key(user_a, user_b):
+    """
+    returns the name shared by both sides of a conversation.
+    """
+    return '+'.join(quote(user, safe='') for user in sorted((user_a, user_b)))
+
+def _path(user_a, user_b):
+    """
+    returns the path of the log holding a conversation.
+    """
+    return os.path.join(CONVERSATION_DIR, f'{key(user_a, user_b)}.log')
+
+def _inbox_path(username):
+    """
+    returns the path of a user's conversation index.
+    """
+    return os.path.join(INBOX_DIR, f'{username}.json')
+
+def exists():
+    """
+    checks whether messages.json has been moved over yet.
+    """
+    return os.path.exists(MIGRATED_MARKER)
+
+def _last_id(path):
+    """
+    returns the id of the last message in a conversation log, or 0.
+    only the end of the file is read.
+    """
+    try:
+        with open(path, 'rb') as f:
+            size = f.seek(0, os.SEEK_END)
+            chunk = 4096
+            while True:
+                start = max(0, size - chunk)
+                f.seek(start)
+                tail = f.read(size - start)
+                lines = tail.rstrip(b'\n').split(b'\n')
+                if len(lines) > 1 or start == 0:
+                    return json.loads(lines[-1])['id'] if lines[-1] else 0
+                chunk *= 2
+    except FileNotFoundError:
+        return 0
+
+def read_inbox(username):
+    """
+    returns a user's conversation summaries: {partner: summary}.
+    """
+    try:
+        with open(_inbox_path(username), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def update_inbox(username, fn):
+    """
+    changes a user's conversation index under its lock.
+    fn gets the index and changes it in place.
+    """
+    os.makedirs(INBOX_DIR, exist_ok=True)
+    path = _inbox_path(username)
+    with locked(path):
+        inbox = read_inbox(username)
+        fn(inbox)
+        write_atomic(path, json.dumps(inbox).encode('utf-8'))
+
+def summarize(message):
+    """
+    returns the inbox fields that describe a conversation's last message.
+    """
+    return {
+        'last_id': message['id'],
+        'last_sender': message['sender'],
+        'last_ts': timestamps.of(message),
+        'preview': message['message'][:PREVIEW_LENGTH],
+    }
+
+def _note_message(owner, partner, message):
+    """
+    updates owner's summary of their conversation with partner after a
+    new message.
+    """
+    def note(inbox):
+        entry = inbox.setdefault(partner, {'read_id': 0, 'last_id': 0})
+        # sends can finish out of order, keep the newest message
+        if message['id'] > entry.get('last_id', 0):
+            entry.update(summarize(message))
+        if message['sender'] == owner:
+            entry['read_id'] = max(entry['read_id'], message['id'])
+    update_inbox(owner, note)
+
+def append(sender, recipient, text, ts):
+    """
+    adds a message to a conversation and returns it.
+    both users' inbox summaries are updated.
+    """
+    os.makedirs(CONVERSATION_DIR, exist_ok=True)
+    path = _path(sender, recipient)
+    with locked(path):
+        message = {'id': _last_id(path) + 1, 'sender': sender, 'message': text, 'ts': ts}
+        append_records(path, [message])
+    _note_message(sender, recipient, message)
+    _note_message(recipient, sender, message)
+    return message
+
+def unread(entry):
+    """
+    returns how many messages in a summary the user hasn't seen.
+    """
+    return max(0, entry.get('last_id', 0) - entry['read_id'])
+
+def mark_read(username, partner, message_id):
+    """
+    moves a user's read position in a conversation forward to message_id.
+    the inbox is only rewritten when the position actually moves.
+    """
+    if read_inbox(username).get(partner, {}).get('read_id', 0) >= message_id:
+        return
+    def advance(inbox):
+        entry = inbox.setdefault(partner, {'read_id': 0, 'last_id': 0})
+        entry['read_id'] = max(entry['read_id'], message_id)
+    update_inbox(username, advance)
+
+def build_summary(owner, thread, read_id):
+    """
+    builds owner's inbox summary of a whole conversation.
+    """
+    # the user has seen everything up to their own last message
+    for msg in thread:
+        if msg['sender'] == owner:
+            read_id = max(read_id, msg['id'])
+    entry = {'read_id': read_id, 'last_id': 0}
+    if thread:
+        entry.update(summarize(thread[-1]))
+    return entry
+
+def read(user_a, user_b):
+    """
+    returns every message between two users, oldest first.
+    """
+    try:
+        with open(_path(user_a, user_b), 'rb') as f:
+            return [message for offset, end, message in read_records(f)]
+    except FileNotFoundError:
+        return []
+
+def _sync_offsets(path):
+    """
+    returns the offset of every message in a conversation log (message id n
+    starts at offsets[n - 1]), reading only what was appended since the
+    last call.
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return []
+    with _offsets_mutex:
+        known = _offsets.get(path)
+        if known is None or known[0] != st.st_ino:
+            known = _offsets[path] = [st.st_ino, 0, []]
+        if known[1] < st.st_size:
+            with open(path, 'rb') as f:
+                f.seek(known[1])
+                offset = known[1]
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    known[2].append(offset)
+                    offset += len(line)
+                known[1] = offset
+        return known[2]
+
+def read_range(user_a, user_b, after=0, before=None, limit=None):
+    """
+    returns the messages with after < id < before, oldest first. with a
+    limit, only the newest limit of them. the log is read from the first
+    wanted message on, using the offset index.
+    """
+    path = _path(user_a, user_b)
+    offsets = _sync_offsets(path)
+    last = len(offsets) if before is None else min(len(offsets), before - 1)
+    first = after + 1
+    if limit is not None:
+        first = max(first, last - limit + 1)
+    if first > last:
+        return []
+    with open(path, 'rb') as f:
+        messages = []
+        for offset, end, message in read_records(f, offsets[first - 1]):
+            messages.append(message)
+            if len(messages) == last - first + 1:
+                break
+        return messages
+
+def load_all():
+    """
+    returns every conversation and read position in the same shape as
+    from_legacy, for copying into another store.
+    """
+    threads = {}
+    read_ids = {}
+    if os.path.isdir(CONVERSATION_DIR):
+        for name in os.listdir(CONVERSATION_DIR):
+            if name.endswith('.log'):
+                user_a, user_b = (unquote(user) for user in name[:-4].split('+'))
+                threads[(user_a, user_b)] = read(user_a, user_b)
+    if os.path.isdir(INBOX_DIR):
+        for name in os.listdir(INBOX_DIR):
+            if name.endswith('.json'):
+                owner = name[:-5]
+                for partner, entry in read_inbox(owner).items():
+                    read_ids[(owner, partner)] = entry['read_id']
+    return threads, read_ids
+
+def from_legacy(messages):
+    """
+    turns the old messages.json layout, where every message was stored
+    under both users, into ({(user a, user b): messages}, {(owner, partner):
+    read id}). each message is taken from the recipient's copy, the one whose
+    read flag was kept up to date.
+    """
+    threads = {}
+    read_ids = {}
+    copies = []
+    for owner, partners in messages.items():
+        for partner, msgs in partners.items():
+            read_ids.setdefault((owner, partner), None)
+            for msg in msgs:
+                if msg.get('recipient') == owner:
+                    copies.append(msg)
+    copies.sort(key=timestamps.of)
+    first_unread = {}
+    for msg in copies:
+        pair = tuple(sorted((msg['sender'], msg['recipient'])))
+        thread = threads.setdefault(pair, [])
+        thread.append({'id': len(thread) + 1, 'sender': msg['sender'],
+                       'message': msg['message'], 'ts': timestamps.of(msg)})
+        if not msg.get('read'):
+            first_unread.setdefault((msg['recipient'], msg['sender']), len(thread))
+    for (owner, partner) in read_ids:
+        thread = threads.get(tuple(sorted((owner, partner))), [])
+        # everything before the first unread message counts as read
+        read_ids[(owner, partner)] = first_unread.get((owner, partner), len(thread) + 1) - 1
+    return threads, read_ids
+
+def import_legacy(messages):
+    """
+    writes the conversations from an old messages.json and marks the
+    migration as done.
+    """
+    os.makedirs(CONVERSATION_DIR, exist_ok=True)
+    os.makedirs(INBOX_DIR, exist_ok=True)
+    threads, read_ids = from_legacy(messages)
+    for (user_a, user_b), thread in threads.items():
+        path = _path(user_a, user_b)
+        with locked(path):
+            write_atomic(path, b''.join(encode_record(msg) for msg in thread))
+    inboxes = {}
+    for (owner, partner), read_id in read_ids.items():
+        thread = threads.get(tuple(sorted((owner, partner))), [])
+        inboxes.setdefault(owner, {})[partner] = build_summary(owner, thread, read_id)
+    for owner, entries in inboxes.items():
+        update_inbox(owner, lambda inbox: inbox.update(entries))
+    write_atomic(MIGRATED_MARKER, b'')
@@ -9,32 +9,128 @@ import os
 import json
 import base64
 import bcrypt
+import heapq
+from bisect import bisect_left, bisect_right
 
-# ensure necessary directories and files exist
-if not os.path.exists('users'):
-    os.makedirs('users')
+from config import STORAGE_BACKEND, TIMELINE_LENGTH, FEED_MERGE_THRESHOLD
+from filestore import locked, write_atomic
+import postlog
+import timelines
+import profile_cache
+import directory
+import follows
+import notification_log
+import conversations
+import signals
+import timestamps
 
-if not os.path.exists('posts.json'):
-    with open('posts.json', 'w') as f:
-        json.dump([], f)
+# ensure necessary directories and files exist
+if STORAGE_BACKEND == 'json':
+    if not os.path.exists('users'):
+        os.makedirs('users')
 
-if not os.path.exists('messages.json'):
-    with open('messages.json', 'w') as f:
-        json.dump({}, f)  # dictionary with usernames as keys
+#------------------------------------------------------------------------------
+# posts
+#------------------------------------------------------------------------------
 
 def load_posts():
     """
-    loads all posts from the posts.json file.
+    loads all posts from the post log, oldest first.
     """
-    with open('posts.json', 'r') as f:
-        return json.load(f)
+    return postlog.load_all()
 
 def save_posts(posts):
     """
-    saves the list of posts to the posts.json file.
+    replaces every post with the given list.
+    screens should use the append_post and record_* functions below,
+    which only append a line to the log.
+    """
+    postlog.replace_all(posts)
+
+def allocate_post_id():
+    """
+    returns a new post id. ids only ever go up and are never reused.
+    """
+    return postlog.allocate_id()
+
+def get_post(post_id):
+    """
+    returns a single post by id, or None if it was deleted.
+    """
+    return postlog.get(post_id)
+
+def update_post(post_id, fn):
+    """
+    applies fn to the stored post (fn changes the dict in place) and saves
+    it, without another session's change sneaking in between.
+    returns the updated post, or None if it was deleted.
+    """
+    return postlog.update(post_id, fn)
+
+def load_user_posts(username, start=0, count=10):
+    """
+    returns a page of one user's posts, newest first.
+    start counts from their newest post, so start=0 is the first page.
+    """
+    return postlog.load_by_author(username, start, count)
+
+def count_user_posts(username):
+    """
+    returns how many posts a user has.
+    """
+    return postlog.count_by_author(username)
+
+def append_post(post):
+    """
+    adds a new post. if it has no id yet, a new one is allocated.
+    returns the post's id.
+    the post is also pushed onto the home timeline of everyone who follows
+    the author (and the author's own).
+    """
+    postlog.append([{'op': 'put', 'post': post}])
+    timelines.push(load_followers(post['user']) + [post['user']], post)
+    return post['id']
+
+def record_like(post_id, username):
+    """
+    records that a user liked a post.
+    """
+    postlog.append([{'op': 'like', 'id': post_id, 'user': username}])
+
+def record_unlike(post_id, username):
+    """
+    records that a user took back their like.
+    """
+    postlog.append([{'op': 'unlike', 'id': post_id, 'user': username}])
+
+def record_comment(post_id, comment):
+    """
+    adds a comment (a dict with user, comment and ts) to a post.
     """
-    with open('posts.json', 'w') as f:
-        json.dump(posts, f, indent=4)
+    postlog.append([{'op': 'comment', 'id': post_id, 'comment': comment}])
+
+def record_edit(post_id, content):
+    """
+    replaces the content of a post.
+    """
+    postlog.append([{'op': 'edit', 'id': post_id, 'content': content}])
+
+def record_delete(post_id):
+    """
+    deletes a post.
+    """
+    postlog.append([{'op': 'delete', 'id': post_id}])
+
+def compact_posts():
+    """
+    folds the post log's changes into one snapshot per post.
+    this also happens on its own once enough changes pile up.
+    """
+    postlog.compact()
+
+#------------------------------------------------------------------------------
+# users
+#------------------------------------------------------------------------------
 
 def load_user_data(username):
     """
@@ -48,30 +144,459 @@ def save_user_data(username, data):
     """
     saves a user's data to their json file.
     """
+    # other sessions read user files all the time (profiles, the follower
+    # index), so they must never see one half written
     user_file = os.path.join('users', f'{username}.json')
-    with open(user_file, 'w') as f:
-        json.dump(data, f, indent=4)
+    write_atomic(user_file, json.dumps(data, indent=4).encode('utf-8'))
+    profile_cache.store(username, profile_cache.summarize(data))
 
-def load_messages():
+def update_user_data(username, fn):
     """
-    loads all messages from the messages.json file.
+    reads a user's data, lets fn change it in place and saves it, holding
+    the follows lock. screens that wait for input (or bcrypt) between
+    loading and saving must use this: saving the copy they loaded would
+    undo any follow or unfollow made in the meantime.
+    returns the saved data.
     """
-    with open('messages.json', 'r') as f:
-        return json.load(f)
+    with follows.lock():
+        user_data = load_user_data(username)
+        fn(user_data)
+        save_user_data(username, user_data)
+    return user_data
+
+def fetch_profiles(usernames):
+    """
+    reads profile summaries straight from the user files, skipping unknown
+    users. screens should use load_profiles, which is cached.
+    """
+    profiles = {}
+    for username in usernames:
+        try:
+            profiles[username] = profile_cache.summarize(load_user_data(username))
+        except FileNotFoundError:
+            continue
+    return profiles
+
+def user_exists(username):
+    """
+    checks whether an account with this username exists.
+    """
+    return os.path.exists(os.path.join('users', f'{username}.json'))
+
+def list_usernames():
+    """
+    returns the usernames of every account on disk.
+    """
+    return [user_file[:-5] for user_file in os.listdir('users') if user_file.endswith('.json')]
+
+#------------------------------------------------------------------------------
+# follows
+#------------------------------------------------------------------------------
+
+def _ensure_follows():
+    """
+    builds the follower index from the user files if it doesn't exist yet.
+    the caller must hold the follows lock.
+    """
+    if not follows.exists():
+        follows.rebuild({username: load_user_data(username).get('following', [])
+                         for username in list_usernames()})
+
+def follow_user(username, other):
+    """
+    makes username follow other. their following list, other's followers
+    and both counters change together.
+    returns False if username already followed other.
+    """
+    with follows.lock():
+        _ensure_follows()
+        user_data = load_user_data(username)
+        following = user_data.get('following', [])
+        if other in following:
+            return False
+        following.append(other)
+        user_data['following'] = following
+        save_user_data(username, user_data)
+        entry = follows.read(username)
+        entry['following_count'] = len(following)
+        follows.write(username, entry)
+        entry = follows.read(other)
+        entry['followers'].append(username)
+        follows.write(other, entry)
+    return True
+
+def unfollow_user(username, other):
+    """
+    makes username stop following other.
+    returns False if username wasn't following other.
+    """
+    with follows.lock():
+        _ensure_follows()
+        user_data = load_user_data(username)
+        following = user_data.get('following', [])
+        if other not in following:
+            return False
+        following.remove(other)
+        user_data['following'] = following
+        save_user_data(username, user_data)
+        entry = follows.read(username)
+        entry['following_count'] = len(following)
+        follows.write(username, entry)
+        entry = follows.read(other)
+        if username in entry['followers']:
+            entry['followers'].remove(username)
+        follows.write(other, entry)
+    return True
+
+def load_followers(username):
+    """
+    returns the users who follow username.
+    """
+    if not follows.exists():
+        with follows.lock():
+            _ensure_follows()
+    return follows.read(username)['followers']
+
+def load_follow_counts(username):
+    """
+    returns (followers, following) counts for a user.
+    """
+    if not follows.exists():
+        with follows.lock():
+            _ensure_follows()
+    entry = follows.read(username)
+    return len(entry['followers']), entry['following_count']
+
+#------------------------------------------------------------------------------
+# home timelines
+#------------------------------------------------------------------------------
+
+def _timeline_entries(post_ids):
+    """
+    turns post ids into timeline entries: [id, author, ts].
+    """
+    entries = []
+    for post_id in post_ids:
+        post = postlog.get(post_id)
+        if post is not None:
+            entries.append([post['id'], post['user'], post['ts']])
+    return entries
+
+def _merge_authors(authors, before, count):
+    """
+    returns up to count post ids older than before, newest first, merged
+    from the authors' own post lists. only the ids are compared, the posts
+    themselves are never read.
+    """
+    streams = []
+    for author in authors:
+        ids = postlog.author_ids(author)
+        cut = bisect_left(ids, before) if before is not None else len(ids)
+        streams.append(reversed(ids[:cut]))
+    merged = heapq.merge(*streams, reverse=True)
+    return [post_id for post_id, _ in zip(merged, range(count))]
+
+def _ensure_timeline(username):
+    """
+    builds a user's timeline from the people they follow if they have none.
+    """
+    if not timelines.exists(username):
+        authors = load_user_data(username).get('following', []) + [username]
+        timelines.write(username, _timeline_entries(_merge_authors(authors, None, TIMELINE_LENGTH)))
+
+def _feed_ids(username, entries, before, count):
+    """
+    picks the next count post ids for a feed page (see load_feed_page).
+    """
+    ids = [entry[0] for entry in reversed(entries) if before is None or entry[0] < before][:count]
+    if len(ids) < count and len(entries) >= TIMELINE_LENGTH:
+        oldest = ids[-1] if ids else (entries[0][0] if before is None else min(before, entries[0][0]))
+        authors = load_user_data(username).get('following', []) + [username]
+        ids += _merge_authors(authors, oldest, count - len(ids))
+    return ids
+
+def load_feed_page(username, before=None, count=10):
+    """
+    returns up to count posts for a user's feed, newest first, older than
+    the post id before (or the newest posts if before is None).
+    posts come from the user's home timeline; once that runs out and it has
+    been trimmed, older posts are merged from the followed users' posts.
+    """
+    _ensure_timeline(username)
+    entries = timelines.read(username)
+    posts = []
+    while len(posts) < count:
+        ids = _feed_ids(username, entries, before, count - len(posts))
+        if not ids:
+            break
+        # deleted posts still have timeline entries, skip over them
+        posts += [post for post in map(postlog.get, ids) if post is not None]
+        before = ids[-1]
+    return posts
+
+def backfill_timeline(username, author):
+    """
+    adds author's recent posts to username's timeline after a follow.
+    """
+    if not timelines.exists(username):
+        _ensure_timeline(username)
+        return
+    ids = postlog.author_ids(author)[-TIMELINE_LENGTH:]
+    timelines.merge(username, _timeline_entries(ids))
+
+def prune_timeline(username, author):
+    """
+    removes author's posts from username's timeline after an unfollow.
+    if that leaves the timeline short, it is topped up with older posts from
+    the people they still follow. a user without a timeline gets one
+    built the next time they open their feed.
+    """
+    if not timelines.exists(username):
+        return
+    timelines.remove_author(username, author)
+    entries = timelines.read(username)
+    if len(entries) < TIMELINE_LENGTH:
+        authors = load_user_data(username).get('following', []) + [username]
+        oldest = entries[0][0] if entries else None
+        older = _merge_authors(authors, oldest, TIMELINE_LENGTH - len(entries))
+        timelines.merge(username, _timeline_entries(older))
+
+def load_feed_cursor(username):
+    """
+    returns the (ts, id) of the feed post a user last looked at, or None.
+    """
+    return timelines.load_cursor(username)
+
+def save_feed_cursor(username, cursor):
+    """
+    remembers a (ts, id) feed position so the feed can reopen there.
+    """
+    timelines.save_cursor(username, cursor)
+
+def iter_author_keys(username, start=None):
+    """
+    yields (ts, id) for a user's posts, newest first, starting at
+    start (inclusive) if given.
+    """
+    keys = postlog.author_keys(username)
+    end = bisect_right(keys, tuple(start)) if start is not None else len(keys)
+    for i in range(end - 1, -1, -1):
+        yield keys[i]
+
+#------------------------------------------------------------------------------
+# user directory
+#------------------------------------------------------------------------------
 
-def save_messages(messages):
+def _ensure_directory():
     """
-    saves all messages to the messages.json file.
+    builds the directory from the user files the first time it is needed.
     """
-    with open('messages.json', 'w') as f:
-        json.dump(messages, f, indent=4)
+    if not directory.exists():
+        # user files don't say when the account was made; the time the
+        # directory was built is the best guess there is
+        now = timestamps.now()
+        entries = []
+        for username in list_usernames():
+            user_data = load_user_data(username)
+            entries.append(directory.make_entry(username, user_data, user_data.get('created') or now))
+        directory.rebuild(entries)
+
+def update_directory(username, user_data):
+    """
+    adds or refreshes a user's directory entry (display name, bio snippet
+    and when they joined). call this after registering or editing a profile.
+    """
+    _ensure_directory()
+    directory.update(directory.make_entry(username, user_data, timestamps.now()))
+
+def load_directory_page(after=None, count=10):
+    """
+    returns up to count directory entries in alphabetical order, starting
+    after the username after. each entry has username, display_name, bio
+    (the first few words) and created.
+    """
+    _ensure_directory()
+    return directory.load_page(after, count)
+
+#------------------------------------------------------------------------------
+# messages and notifications
+#------------------------------------------------------------------------------
+
+def _ensure_conversations():
+    """
+    moves the conversations in messages.json, which kept every message twice,
+    into one log per conversation the first time messages are used.
+    """
+    if conversations.exists():
+        return
+    os.makedirs(conversations.CONVERSATION_DIR, exist_ok=True)
+    with locked(conversations.MIGRATED_MARKER):
+        if conversations.exists():
+            return
+        messages = {}
+        if os.path.exists('messages.json'):
+            with open('messages.json', 'r') as f:
+                messages = json.load(f)
+        conversations.import_legacy(messages)
+
+def send_message(sender, recipient, text):
+    """
+    adds a message to the conversation between sender and recipient and
+    returns it. this is one append to that conversation's log.
+    """
+    _ensure_conversations()
+    message = conversations.append(sender, recipient, text, timestamps.now())
+    signals.bump(recipient, 'messages')
+    return message
+
+def load_conversation(username, partner, after=0, before=None, limit=None):
+    """
+    returns the messages between two users with after < id < before,
+    oldest first (every message by default). with a limit, only the newest
+    limit of them. each message has id, sender, message and ts.
+    """
+    _ensure_conversations()
+    return conversations.read_range(username, partner, after, before, limit)
+
+def load_inbox(username):
+    """
+    returns {partner: summary} for everyone a user has a conversation with.
+    a summary has read_id (the last message they have seen), last_id,
+    last_sender, last_ts, preview and unread, which is worked out
+    from the two ids.
+    """
+    _ensure_conversations()
+    inbox = conversations.read_inbox(username)
+    for entry in inbox.values():
+        entry['unread'] = conversations.unread(entry)
+    return inbox
+
+def mark_conversation_read(username, partner, message_id):
+    """
+    records that a user has seen a conversation up to message_id.
+    nothing is written unless that moves their read position forward.
+    """
+    _ensure_conversations()
+    conversations.mark_read(username, partner, message_id)
+
+def _ensure_notifications(username):
+    """
+    sets up a user's notification store the first time it's needed,
+    moving over any notifications still kept in their user file.
+    """
+    if notification_log.exists(username):
+        return
+    with notification_log.lock(username):
+        if notification_log.exists(username):
+            return
+        try:
+            user_data = load_user_data(username)
+        except FileNotFoundError:
+            user_data = {}
+        notification_log.create(username, user_data.get('notifications', []))
+        if user_data.get('notifications'):
+            update_user_data(username, lambda user_data: user_data.pop('notifications', None))
 
 def save_notifications(username, notification):
     """
-    adds a notification to a user's data.
+    adds a notification for a user. this is an append to their
+    notification log; their user file isn't touched.
+    """
+    save_notification_batch(username, [notification])
+
+def save_notification_batch(username, notifications):
+    """
+    adds several notifications for a user in one append.
+    a notification is a string or an event dict (see notify.py).
+    """
+    _ensure_notifications(username)
+    notification_log.append(username, notifications)
+    signals.bump(username, 'notifications')
+
+def count_unread_notifications(username):
+    """
+    returns how many notifications a user hasn't seen yet.
+    """
+    _ensure_notifications(username)
+    return notification_log.unread_count(username)
+
+def load_new_notifications(username):
+    """
+    returns (notifications, cursor) with the notifications a user hasn't
+    seen yet, oldest first. pass the cursor to mark_notifications_read
+    once they have been shown.
+    """
+    _ensure_notifications(username)
+    return notification_log.read_unread(username)
+
+def mark_notifications_read(username, cursor):
     """
-    user_data = load_user_data(username)
-    notifications = user_data.get('notifications', [])
-    notifications.append(notification)
-    user_data['notifications'] = notifications
-    save_user_data(username, user_data)
+    marks the notifications returned with cursor as seen.
+    """
+    notification_log.mark_read(username, cursor)
+
+#------------------------------------------------------------------------------
+# shared helpers
+#------------------------------------------------------------------------------
+# these are built on the functions above and work with either storage engine,
+# which is why the sqlite engine doesn't replace them.
+
+def load_profiles(usernames):
+    """
+    returns {username: profile summary} for many users at once.
+    a summary has display_name, bio and pronouns (when set); unknown users
+    are left out. summaries come from a short-lived cache, so showing a
+    hundred likers costs one lookup instead of a hundred file reads.
+    """
+    found, missing = profile_cache.lookup(usernames)
+    for username, summary in fetch_profiles(missing).items():
+        profile_cache.store(username, summary)
+        found[username] = summary
+    return found
+
+def feed_cursor(post):
+    """
+    returns the (ts, id) position of a post in the feed.
+    """
+    return (timestamps.of(post), post['id'])
+
+def iter_merged_feed(username, start=None):
+    """
+    yields a user's feed newest first by heap-merging the post streams of
+    everyone they follow plus their own. only the (ts, id) keys are
+    compared; each post is read from the store just before it is yielded.
+    start is a feed cursor to resume from (that post comes first).
+    """
+    authors = load_user_data(username).get('following', []) + [username]
+    streams = [iter_author_keys(author, start) for author in authors]
+    for ts, post_id in heapq.merge(*streams, reverse=True):
+        post = get_post(post_id)
+        if post is not None:
+            yield post
+
+def iter_timeline_feed(username, start=None, page_size=10):
+    """
+    yields a user's feed newest first from their home timeline, a page at
+    a time. start is a feed cursor to resume from (that post comes first).
+    """
+    before = start[1] + 1 if start is not None else None
+    while True:
+        page = load_feed_page(username, before, page_size)
+        if not page:
+            return
+        yield from page
+        before = page[-1]['id']
+
+def iter_feed(username, start=None):
+    """
+    yields a user's feed newest first. people who follow a lot of accounts
+    get the merged feed, everyone else reads their home timeline.
+    """
+    if len(load_user_data(username).get('following', [])) > FEED_MERGE_THRESHOLD:
+        return iter_merged_feed(username, start)
+    return iter_timeline_feed(username, start)
+
+# the sqlite engine implements the same functions on a single database.
+# importing them last replaces the json versions above.
+if STORAGE_BACKEND == 'sqlite':
+    from sqlite_store import *
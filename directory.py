@@ -0,0 +1,131 @@
+#------------------------------------------------------------------------------
+# directory.py
+#------------------------------------------------------------------------------
+# this file keeps the user directory for the json storage engine.
+# directory.log has one line per account change:
+#
+#   {"username": "mia", "display_name": "mia", "bio": "hey th...", "created": 1729171532}
+#
+# the latest line for a username wins. every process folds the log into an
+# in-memory table sorted by username, reading only what was appended since
+# its last look, so the discover screen can page through accounts without
+# listing the users/ folder or opening anyone's file.
+#------------------------------------------------------------------------------
+
+import os
+import threading
+from bisect import bisect_right
+
+from filestore import locked, append_records, read_records, encode_record, write_atomic, reopen_after_fork
+
+DIRECTORY_PATH = 'directory.log'
+
+# how much of a bio is kept in the directory
+BIO_SNIPPET_LENGTH = 60
+
+_entries = {}      # username -> latest entry
+_sorted = []       # usernames in alphabetical order
+_scanned = 0       # how far into the log this process has read
+_records = 0       # how many lines the scanned part of the log holds
+_reader = None
+_mutex = threading.RLock()
+
+def exists():
+    """
+    checks whether the directory has been built yet.
+    """
+    return os.path.exists(DIRECTORY_PATH)
+
+def make_entry(username, user_data, created):
+    """
+    builds a directory entry from a user's data.
+    """
+    return {
+        'username': username,
+        'display_name': user_data.get('display_name', username),
+        'bio': user_data.get('bio', '')[:BIO_SNIPPET_LENGTH],
+        'created': created,
+    }
+
+def _reset():
+    """
+    forgets everything read so far.
+    """
+    global _sorted, _scanned, _records, _reader
+    _entries.clear()
+    _sorted = []
+    _scanned = 0
+    _records = 0
+    if _reader is not None:
+        _reader.close()
+        _reader = None
+
+def _after_fork():
+    """
+    swaps the directory handle inherited from a zygote parent for the child's own.
+    """
+    global _reader
+    _reader = reopen_after_fork(DIRECTORY_PATH, _reader, _reset)
+
+os.register_at_fork(after_in_child=_after_fork)
+
+def sync():
+    """
+    reads whatever was appended to the directory since the last call.
+    """
+    global _sorted, _scanned, _records, _reader
+    with _mutex:
+        if not exists():
+            return
+        if _reader is not None and os.stat(DIRECTORY_PATH).st_ino != os.fstat(_reader.fileno()).st_ino:
+            _reset()
+        if _reader is None:
+            _reader = open(DIRECTORY_PATH, 'rb')
+        added = False
+        for offset, end, entry in read_records(_reader, _scanned):
+            if entry['username'] not in _entries:
+                added = True
+            _entries[entry['username']] = entry
+            _scanned = end
+            _records += 1
+        if added:
+            _sorted = sorted(_entries)
+
+def rebuild(entries):
+    """
+    replaces the directory with the given entries.
+    """
+    with _mutex:
+        with locked(DIRECTORY_PATH):
+            write_atomic(DIRECTORY_PATH, b''.join(encode_record(entry) for entry in entries))
+            _reset()
+            sync()
+
+def update(entry):
+    """
+    records a new or changed account. the created time of an existing
+    entry is kept, unless it is empty. the log is compacted once it is
+    mostly old lines.
+    """
+    with _mutex:
+        with locked(DIRECTORY_PATH):
+            sync()
+            previous = _entries.get(entry['username'])
+            if previous is not None and previous.get('created'):
+                entry['created'] = previous['created']
+            append_records(DIRECTORY_PATH, [entry])
+            sync()
+            if _records > 2 * len(_entries) + 100:
+                write_atomic(DIRECTORY_PATH, b''.join(encode_record(_entries[name]) for name in _sorted))
+                _reset()
+                sync()
+
+def load_page(after=None, count=10):
+    """
+    returns up to count entries in alphabetical order, starting after the
+    username after (or from the top if after is None).
+    """
+    with _mutex:
+        sync()
+        start = bisect_right(_sorted, after) if after is not None else 0
+        return [_entries[name] for name in _sorted[start:start + count]]
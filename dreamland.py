@@ -8,11 +8,9 @@
 # it uses functions from other modules to keep things organized.
 #------------------------------------------------------------------------------
 
-from getpass import getpass
 import sys
 import os
-import base64
-import bcrypt
+import signal
 
 from helpers import (
     clear_screen,
@@ -22,22 +20,33 @@ from helpers import (
     format_text,
     color_text,
     format_menu_options,
-    current_screen,
-    current_user,
+    input_until,
+)
+from data import (
+    load_user_data,
+    save_user_data,
+    update_user_data,
+    user_exists,
+    update_directory,
+    count_unread_notifications,
 )
-from data import load_user_data, save_user_data
 from chat import direct_messages_screen
 from friends import discover_users_screen, friends_list_screen
 from feed import feed_screen, create_post_screen, my_posts_screen
 from user import edit_profile_screen, user_profile_screen
 from notifications import notifications_screen
+from session import Session
+from config import RESUME_DAYS
+import auth
+import notify
+import signals
 
-def welcome_screen():
+def welcome_screen(session):
     """
     displays the welcome screen where users can log in, register, or exit.
     """
-    clear_screen()
-    print("""
+    clear_screen(session)
+    session.io.print("""
 
    °❀⋆.ೃ࿔*:･°❀⋆.ೃ࿔*:･°❀⋆.ೃ࿔*:･°❀⋆.
   °                               °
@@ -54,59 +63,102 @@ def welcome_screen():
 
   1. login
   2. register
+  3. resume with a code
 
         """)
-    choice = input("  select: ").strip().lower()
+    choice = session.io.input("  select: ").strip().lower()
     if choice == '1':
-        current_screen[0] = "login"
+        session.screen = "login"
     elif choice == '2':
-        current_screen[0] = "register"
+        session.screen = "register"
+    elif choice == '3':
+        session.screen = "resume"
     else:
-        print(("\ninvalid choice."))
-        input(("press enter to continue..."))
-        current_screen[0] = "welcome"
+        session.io.print(("\ninvalid choice."))
+        session.io.input(("press enter to continue..."))
+        session.screen = "welcome"
 
-def login_screen():
+def login_screen(session):
     """
     allows the user to log in by entering their username and password.
     checks the credentials and logs them in if correct.
     """
-    clear_screen()
-    show_header()
-    username = input(("enter your username: ")).strip()
-    password = getpass(("enter your password: ")).strip()
+    clear_screen(session)
+    show_header(session)
+    username = session.io.input(("enter your username: ")).strip()
+    password = session.io.password(("enter your password: ")).strip()
 
-    user_file = os.path.join('users', f'{username}.json')
-
-    if not os.path.exists(user_file):
-        print(("\ninvalid username or password."))
-        input(("press enter to continue..."))
-        current_screen[0] = "welcome"
+    if not user_exists(username):
+        session.io.print(("\ninvalid username or password."))
+        session.io.input(("press enter to continue..."))
+        session.screen = "welcome"
         return
 
     # load user data from file
     user_data = load_user_data(username)
 
-    stored_hash = base64.b64decode(
-        user_data['password_hash'].encode('utf-8'))
+    try:
+        correct = auth.check_password(password, user_data['password_hash'])
+        if correct and auth.needs_rehash(user_data['password_hash']):
+            # hashed at an older, cheaper cost; redo it while we have the password
+            password_hash = auth.hash_password(password)
+            user_data = update_user_data(username,
+                                         lambda user_data: auth.set_password_hash(user_data, password_hash))
+    except auth.Busy:
+        session.io.print(("\nlots of people are logging in right now, try again in a moment."))
+        session.io.input(("press enter to continue..."))
+        session.screen = "welcome"
+        return
 
-    if bcrypt.checkpw(password.encode(), stored_hash):
-        print(("\nlogin successful!"))
-        current_user[0] = username
-        input(("press enter to continue..."))
-        current_screen[0] = "main_menu"
+    if correct:
+        session.io.print(("\nlogin successful!"))
+        session.user = username
+        code = auth.issue_code(username, user_data)
+        session.io.print(f"\nyour resume code is:\n\n  {code}\n\n"
+                         f"pick 3 on the welcome screen and enter\n"
+                         f"it to skip your password for the next\n"
+                         f"{RESUME_DAYS:g} days.\n")
+        session.io.input(("press enter to continue..."))
+        session.screen = "main_menu"
     else:
-        print(("\ninvalid username or password."))
-        input(("press enter to continue..."))
-        current_screen[0] = "welcome"
+        session.io.print(("\ninvalid username or password."))
+        session.io.input(("press enter to continue..."))
+        session.screen = "welcome"
+
+def resume(session, code):
+    """
+    logs a session in with a resume code. returns whether it worked.
+    """
+    username = auth.code_user(code)
+    if not username or not user_exists(username):
+        return False
+    if not auth.check_code(code, load_user_data(username)):
+        return False
+    session.user = username
+    return True
 
-def register_screen():
+def resume_screen(session):
+    """
+    lets a user come back with the resume code they got at login,
+    without typing their password.
+    """
+    clear_screen(session)
+    show_header(session)
+    code = session.io.input(("enter your resume code: ")).strip()
+    if resume(session, code):
+        session.screen = "main_menu"
+    else:
+        session.io.print(("\nthat code is wrong or has expired. log in to get a new one."))
+        session.io.input(("press enter to continue..."))
+        session.screen = "welcome"
+
+def register_screen(session):
     """
     allows a new user to create an account by entering a username and password.
     saves the new user data to a file.
     """
-    clear_screen()
-    print("""
+    clear_screen(session)
+    session.io.print("""
 
    °❀⋆.ೃ࿔*:･°❀⋆.ೃ࿔*:･°❀⋆.ೃ࿔*:･°❀⋆.
   °                               °
@@ -119,63 +171,64 @@ def register_screen():
 ⋆˖⁺‧₊☽◯☾₊‧⁺˖⋆⋆˖⁺‧₊☽◯☾₊‧⁺˖⋆⋆˖⁺‧₊☽◯☾₊‧⁺˖⋆
 
         """)
-    username = input(("choose a username: ")).strip()
-    password = getpass(("choose a password: ")).strip()
-    confirm_password = getpass(("confirm your password:  ")).strip()
+    username = session.io.input(("choose a username: ")).strip()
+    password = session.io.password(("choose a password: ")).strip()
+    confirm_password = session.io.password(("confirm your password:  ")).strip()
 
     if password != confirm_password:
-        print(("passwords do not match."))
-        input(f("press enter to continue..."))
-        current_screen[0] = "welcome"
+        session.io.print(("passwords do not match."))
+        session.io.input(("press enter to continue..."))
+        session.screen = "welcome"
         return
 
-    user_file = os.path.join('users', f'{username}.json')
-
-    if os.path.exists(user_file):
-        print(("username already exists!"))
-        input(("press enter to continue..."))
-        current_screen[0] = "welcome"
+    if user_exists(username):
+        session.io.print(("username already exists!"))
+        session.io.input(("press enter to continue..."))
+        session.screen = "welcome"
         return
 
     # hash the password with bcrypt
-    password_hash = bcrypt.hashpw(password.encode(),
-                                  bcrypt.gensalt())
-    password_hash_encoded = base64.b64encode(
-        password_hash).decode('utf-8')
+    try:
+        password_hash_encoded = auth.hash_password(password)
+    except auth.Busy:
+        session.io.print(("lots of people are logging in right now, try again in a moment."))
+        session.io.input(("press enter to continue..."))
+        session.screen = "welcome"
+        return
 
     # create the user data
     user_data = {
         'password_hash': password_hash_encoded,
-        'display_name': display_name,
+        'display_name': username,
         'bio': '',
         'pronouns': '',
         'age': '',
         'following': [],
-        'notifications': []
     }
 
-    # save user data to file
+    # save user data to file and list the account in discover
     save_user_data(username, user_data)
+    update_directory(username, user_data)
 
-    print(("\nregistration successful! welcome to dreamland :3"))
-    input(("press enter to continue..."))
-    current_screen[0] = "welcome"
+    session.io.print(("\nregistration successful! welcome to dreamland :3"))
+    session.io.input(("press enter to continue..."))
+    session.screen = "welcome"
 
-def main_menu_screen():
+def main_menu_screen(session):
     """
     displays the main menu after the user logs in.
     from here, they can navigate to different parts of the app.
     """
-    clear_screen()
-    show_header(current_user[0])  # pass username to header
+    clear_screen(session)
+    show_header(session)  # the header greets the logged-in user
     # check for notifications
-    user_data = load_user_data(current_user[0])
-    notifications = user_data.get('notifications', [])
+    seen_version = signals.version(session.user, 'notifications')
+    unread = count_unread_notifications(session.user)
     notification_text = ""
-    if notifications:
-        notification_text = color_text(f"you have {len(notifications)} new notifications!", '33')  # yellow text
+    if unread:
+        notification_text = color_text(f"you have {unread} new notifications!", '33')  # yellow text
     menu_text = f"{notification_text}\n"
-    print((menu_text))
+    session.io.print((menu_text))
     options = [
         "1. view feed",         "2. create a post",
         "3. my profile",        "4. messages",
@@ -183,74 +236,124 @@ def main_menu_screen():
         "7. discover",          "8. see friends",
         "9. logout",
     ]
-    print(format_menu_options(options))
-    show_footer()
-    choice = input(("enter your choice: ")).strip()
+    session.io.print(format_menu_options(options))
+    show_footer(session)
+    # redraw by itself when new notifications come in, to update the count
+    choice = input_until(session, "enter your choice: ",
+                         lambda: signals.version(session.user, 'notifications') != seen_version)
+    if choice is None:
+        return
+    choice = choice.strip()
     if choice == '1':
-        current_screen[0] = "feed"
+        session.screen = "feed"
     elif choice == '2':
-        current_screen[0] = "create_post"
+        session.screen = "create_post"
     elif choice == '3':
-        current_screen[0] = "my_posts"
+        session.screen = "my_posts"
     elif choice == '4':
-        current_screen[0] = "direct_messages"
+        session.screen = "direct_messages"
     elif choice == '5':
-        current_screen[0] = "notifications"
+        session.screen = "notifications"
     elif choice == '6':
-        current_screen[0] = "edit_profile"
+        session.screen = "edit_profile"
     elif choice == '7':
-        current_screen[0] = "discover_users"
+        session.screen = "discover_users"
     elif choice == '8':
-        current_screen[0] = "friends_list"
+        session.screen = "friends_list"
     elif choice == '9':
-        current_screen[0] = "logout"
+        session.screen = "logout"
     else:
-        print(("\ninvalid choice."))
-        input(("press enter to continue..."))
-        current_screen[0] = "main_menu"
+        session.io.print(("\ninvalid choice."))
+        session.io.input(("press enter to continue..."))
+        session.screen = "main_menu"
 
-def logout_screen():
+def logout_screen(session):
     """
-    logs the user out and returns to the welcome screen.
+    logs the user out and returns to the welcome screen. their resume
+    codes stop working too, so one left in a url or browser history
+    can't log back in.
     """
-    current_user[0] = None
-    print(("\nyou have been logged out."))
-    input(("press enter to continue..."))
-    current_screen[0] = "welcome"
+    update_user_data(session.user, auth.revoke_codes)
+    session.user = None
+    session.io.print(("\nyou have been logged out."))
+    session.io.input(("press enter to continue..."))
+    session.screen = "welcome"
 
 #------------------------------------------------------------------------------
 # Main Loop
 #------------------------------------------------------------------------------
-if __name__ == '__main__':
+def run(session=None):
+    """
+    runs the app for a session: shows whichever screen is current, over
+    and over. without a session it runs one on this process's terminal.
+    server.py calls this once per connected session.
+    """
+    if session is None:
+        session = Session()
     while True:
-        if current_screen[0] == "splash":
-            show_splash_screen()
-        elif current_screen[0] == "welcome":
-            welcome_screen()
-        elif current_screen[0] == "login":
-            login_screen()
-        elif current_screen[0] == "register":
-            register_screen()
-        elif current_screen[0] == "main_menu":
-            main_menu_screen()
-        elif current_screen[0] == "edit_profile":
-            edit_profile_screen()
-        elif current_screen[0] == "discover_users":
-            discover_users_screen()
-        elif current_screen[0] == "friends_list":
-            friends_list_screen()
-        elif current_screen[0] == "create_post":
-            create_post_screen()
-        elif current_screen[0] == "my_posts":
-            my_posts_screen()
-        elif current_screen[0] == "feed":
-            feed_screen()
-        elif current_screen[0] == "direct_messages":
-            direct_messages_screen()
-        elif current_screen[0] == "notifications":
-            notifications_screen()
-        elif current_screen[0] == "logout":
-            logout_screen()
+        # every screen change is a good moment to write queued notifications
+        notify.flush()
+        if session.screen == "splash":
+            show_splash_screen(session)
+        elif session.screen == "welcome":
+            welcome_screen(session)
+        elif session.screen == "login":
+            login_screen(session)
+        elif session.screen == "register":
+            register_screen(session)
+        elif session.screen == "resume":
+            resume_screen(session)
+        elif session.screen == "main_menu":
+            main_menu_screen(session)
+        elif session.screen == "edit_profile":
+            edit_profile_screen(session)
+        elif session.screen == "discover_users":
+            discover_users_screen(session)
+        elif session.screen == "friends_list":
+            friends_list_screen(session)
+        elif session.screen == "create_post":
+            create_post_screen(session)
+        elif session.screen == "my_posts":
+            my_posts_screen(session)
+        elif session.screen == "feed":
+            feed_screen(session)
+        elif session.screen == "direct_messages":
+            direct_messages_screen(session)
+        elif session.screen == "notifications":
+            notifications_screen(session)
+        elif session.screen == "logout":
+            logout_screen(session)
         else:
             # if the screen is not recognized, go back to welcome
-            current_screen[0] = "welcome"
+            session.screen = "welcome"
+
+def main(argv):
+    """
+    runs a session on this process's terminal. a resume code can come from
+    the command line (--resume CODE) or DREAMLAND_RESUME, e.g. from the page
+    url with gotty --permit-arguments.
+    """
+    code = os.environ.get('DREAMLAND_RESUME', '')
+    if '--resume' in argv[:-1]:
+        code = argv[argv.index('--resume') + 1]
+    # gotty hangs up (SIGHUP) when the tab closes, which skips atexit;
+    # leave through SystemExit instead, so queued notifications are written
+    for signum in (signal.SIGHUP, signal.SIGTERM):
+        signal.signal(signum, _leave)
+    session = Session()
+    if code and resume(session, code):
+        session.screen = "main_menu"
+    try:
+        run(session)
+    finally:
+        notify.flush()
+
+def _leave(signum, frame):
+    """
+    ends the session when the terminal goes away or the process is told
+    to stop.
+    """
+    sys.exit(0)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -15,177 +15,203 @@ from helpers import (
     format_timestamp,
     wrap_text,
     format_menu_options,
-    current_screen,
-    current_user,
 )
-from data import load_posts, save_posts, load_user_data, save_notifications
-from datetime import datetime
+from data import (
+    get_post,
+    iter_feed,
+    feed_cursor,
+    load_feed_cursor,
+    save_feed_cursor,
+    load_user_posts,
+    count_user_posts,
+    load_user_data,
+    load_profiles,
+    append_post,
+    record_like,
+    record_unlike,
+    record_comment,
+    record_edit,
+    record_delete,
+)
+from notify import notify, retract
+import timestamps
+from itertools import islice
+
+# how many of a user's posts profile screens fetch at once
+PROFILE_PAGE_SIZE = 10
 
-def feed_screen():
+def feed_screen(session):
     """
     displays the user's feed with posts from people they follow.
     they can interact with posts by liking, commenting, etc.
     """
-    clear_screen()
-    show_header(current_user[0])
-    print(format_text("your feed\n"))
-    user_data = load_user_data(current_user[0])
-    following = user_data.get('following', [])
-    posts = load_posts()
-    feed_posts = [post for post in posts if post['user'] in following or post['user'] == current_user[0]]
+    clear_screen(session)
+    show_header(session)
+    session.io.print(format_text("your feed\n"))
+    # posts are pulled from the feed one at a time as the user pages through,
+    # starting from wherever they left off last time
+    cursor = load_feed_cursor(session.user)
+    feed = iter_feed(session.user, start=cursor)
+    feed_posts = list(islice(feed, 1))
+    if not feed_posts and cursor is not None:
+        feed = iter_feed(session.user)
+        feed_posts = list(islice(feed, 1))
 
     if not feed_posts:
-        print(format_text("no posts to show. follow users to see their posts."))
-        input(format_text("press enter to continue..."))
-        current_screen[0] = "main_menu"
+        session.io.print(format_text("no posts to show. follow users to see their posts."))
+        session.io.input(format_text("press enter to continue..."))
+        session.screen = "main_menu"
         return
 
-    feed_posts.reverse()  # most recent first
     page = 0
-    total_posts = len(feed_posts)
 
     while True:
-        clear_screen()
-        show_header(current_user[0])
-        print(format_text(f"your feed (post {page + 1} of {total_posts})\n"))
+        clear_screen(session)
+        show_header(session)
+        session.io.print(format_text(f"your feed (post {page + 1})\n"))
 
         post = feed_posts[page]
         hearts_display = display_hearts(post.get('likes', []))
-        timestamp = format_timestamp(post['timestamp'])
-        post_user_data = load_user_data(post['user'])
-        display_name = post_user_data.get('display_name', post['user'])
+        timestamp = format_timestamp(post['ts'])
+        profile = load_profiles([post['user']]).get(post['user'], {})
+        display_name = profile.get('display_name', post['user'])
         post_header = f"{display_name} (@{post['user']}) - {timestamp}\n"
         post_content = wrap_text(post['content'], indent=4)
         post_details = f"{post_header}{post_content}\nlikes: {hearts_display}\n"
-        print(format_text("-" * 50))
-        print(format_text(post_details))
-        print(format_text("-" * 50 + "\n"))
+        session.io.print(format_text("-" * 50))
+        session.io.print(format_text(post_details))
+        session.io.print(format_text("-" * 50 + "\n"))
 
         options = [
             "1. like/unlike",      "2. view likes",
             "3. comment",          "4. view comments",
             "5. repost",           "6. quote post",
             "n. next post",        "p. previous post",
-            "enter: main menu",
+            "t. back to top",      "enter: main menu",
         ]
-        print(format_menu_options(options))
-        show_footer()
-        choice = input(format_text("enter your choice: ")).strip().lower()
+        session.io.print(format_menu_options(options))
+        show_footer(session)
+        choice = session.io.input(format_text("enter your choice: ")).strip().lower()
 
         if choice == '':
-            current_screen[0] = "main_menu"
+            save_feed_cursor(session.user, feed_cursor(post))
+            session.screen = "main_menu"
             return
         elif choice == 'n':
-            if page < total_posts - 1:
+            if page == len(feed_posts) - 1:
+                feed_posts.extend(islice(feed, 1))
+            if page < len(feed_posts) - 1:
                 page += 1
             else:
-                print(format_text("you are on the last post."))
-                input(format_text("press enter to continue..."))
+                session.io.print(format_text("you are on the last post."))
+                session.io.input(format_text("press enter to continue..."))
         elif choice == 'p':
             if page > 0:
                 page -= 1
             else:
-                print(format_text("you are on the first post."))
-                input(format_text("press enter to continue..."))
+                session.io.print(format_text("you are on the first post."))
+                session.io.input(format_text("press enter to continue..."))
+        elif choice == 't':
+            feed = iter_feed(session.user)
+            feed_posts = list(islice(feed, 1)) or feed_posts
+            page = 0
         elif choice == '1':
-            like_unlike_post(post)
+            like_unlike_post(session, post)
         elif choice == '2':
-            view_likes(post)
+            view_likes(session, post)
         elif choice == '3':
-            add_comment(post)
+            add_comment(session, post)
         elif choice == '4':
-            view_comments(post)
+            view_comments(session, post)
         elif choice == '5':
-            repost(post)
+            repost(session, post)
         elif choice == '6':
-            quote_post(post)
+            quote_post(session, post)
         else:
-            print(format_text("invalid choice. please try again."))
-            input(format_text("press enter to continue..."))
+            session.io.print(format_text("invalid choice. please try again."))
+            session.io.input(format_text("press enter to continue..."))
 
-def create_post_screen():
+def create_post_screen(session):
     """
     allows the user to create a new post by entering content.
     saves the new post to the posts file.
     """
-    clear_screen()
-    show_header(current_user[0])
-    print(format_text("create a new post\n"))
-    content = input(format_text("enter your post content (or type 'back' to cancel): ")).strip()
+    clear_screen(session)
+    show_header(session)
+    session.io.print(format_text("create a new post\n"))
+    content = session.io.input(format_text("enter your post content (or type 'back' to cancel): ")).strip()
 
     if content.lower() == 'back':
-        current_screen[0] = "main_menu"
+        session.screen = "main_menu"
         return
 
     if content == '':
-        print(format_text("you cannot post empty content."))
+        session.io.print(format_text("you cannot post empty content."))
     else:
-        posts = load_posts()
         post = {
-            'id': len(posts) + 1,
-            'user': current_user[0],
+            'user': session.user,
             'content': content,
             'likes': [],
             'comments': [],
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            'ts': timestamps.now()
         }
-        posts.append(post)
-        save_posts(posts)
-        print(format_text("post created successfully!"))
+        append_post(post)
+        session.io.print(format_text("post created successfully!"))
 
-    input(format_text("press enter to continue..."))
-    current_screen[0] = "main_menu"
+    session.io.input(format_text("press enter to continue..."))
+    session.screen = "main_menu"
 
-def my_posts_screen():
+def my_posts_screen(session):
     """
     displays the user's own posts.
     allows them to edit or delete their posts.
     """
-    clear_screen()
-    show_header(current_user[0])
-    user_data = load_user_data(current_user[0])
-    display_name = user_data.get('display_name', current_user[0])
+    clear_screen(session)
+    show_header(session)
+    user_data = load_user_data(session.user)
+    display_name = user_data.get('display_name', session.user)
     bio = user_data.get('bio', 'no bio available.')
     pronouns = user_data.get('pronouns', '')
     age = user_data.get('age', '')
 
-    profile_info = f"{display_name} (@{current_user[0]})\npronouns: {pronouns} | age: {age}\nbio: {bio}\n"
-    print(format_text(profile_info))
+    profile_info = f"{display_name} (@{session.user})\npronouns: {pronouns} | age: {age}\nbio: {bio}\n"
+    session.io.print(format_text(profile_info))
 
-    posts = load_posts()
-    user_posts = [post for post in posts if post['user'] == current_user[0]]
-    user_posts.reverse()  # most recent first
+    total_posts = count_user_posts(session.user)
 
-    if not user_posts:
-        print(format_text("you haven't posted anything yet."))
-        input(format_text("press enter to continue..."))
-        current_screen[0] = "main_menu"
+    if total_posts == 0:
+        session.io.print(format_text("you haven't posted anything yet."))
+        session.io.input(format_text("press enter to continue..."))
+        session.screen = "main_menu"
         return
 
     page = 0
-    total_posts = len(user_posts)
+    window = {}
 
     while True:
-        clear_screen()
-        print("""
+        clear_screen(session)
+        session.io.print("""
 ⋆˖⁺‧₊☽◯☾₊‧⁺˖⋆⋆˖⁺‧₊☽◯☾₊‧⁺˖⋆⋆˖⁺‧₊☽◯☾₊‧⁺˖⋆
         """)
-        print('   ' + display_name + ' -- ' + pronouns + ' -- age: ' + age)
-        print("""""")
-        print(format_text('  bio: ' +bio))
-        print("""
+        session.io.print('   ' + display_name + ' -- ' + pronouns + ' -- age: ' + age)
+        session.io.print("""""")
+        session.io.print(format_text('  bio: ' +bio))
+        session.io.print("""
 ⋆˖⁺‧₊☽◯☾₊‧⁺˖⋆⋆˖⁺‧₊☽◯☾₊‧⁺˖⋆⋆˖⁺‧₊☽◯☾₊‧⁺˖⋆
               """)
 
-        post = user_posts[page]
+        post = user_post_at(session.user, page, window)
+        if post is None:
+            session.screen = "main_menu"
+            return
         hearts_display = display_hearts(post.get('likes', []))
-        timestamp = format_timestamp(post['timestamp'])
-        print("""""")
+        timestamp = format_timestamp(post['ts'])
+        session.io.print("""""")
         post_content = wrap_text(post['content'], indent=4)
         post_details = f"{timestamp}\n{post_content}\nlikes: {hearts_display}\n"
-        print(format_text(post_details))
-        print(format_text(f"({page + 1} of {total_posts})\n"))
-        print("""
+        session.io.print(format_text(post_details))
+        session.io.print(format_text(f"({page + 1} of {total_posts})\n"))
+        session.io.print("""
 ⋆˖⁺‧₊☽◯☾₊‧⁺˖⋆⋆˖⁺‧₊☽◯☾₊‧⁺˖⋆⋆˖⁺‧₊☽◯☾₊‧⁺˖⋆
               """)
 
@@ -195,52 +221,53 @@ def my_posts_screen():
             "n. next post",         "p. previous post",
             "enter: main menu",
         ]
-        print(format_menu_options(options))
-        show_footer()
-        choice = input(format_text("enter your choice: ")).strip().lower()
+        session.io.print(format_menu_options(options))
+        show_footer(session)
+        choice = session.io.input(format_text("enter your choice: ")).strip().lower()
 
         if choice == '':
-            current_screen[0] = "main_menu"
+            session.screen = "main_menu"
             return
         elif choice == 'n':
             if page < total_posts - 1:
                 page += 1
             else:
-                print(format_text("you are on the last post."))
-                input(format_text("press enter to continue..."))
+                session.io.print(format_text("you are on the last post."))
+                session.io.input(format_text("press enter to continue..."))
         elif choice == 'p':
             if page > 0:
                 page -= 1
             else:
-                print(format_text("you are on the first post."))
-                input(format_text("press enter to continue..."))
+                session.io.print(format_text("you are on the first post."))
+                session.io.input(format_text("press enter to continue..."))
         elif choice == '1':
-            edit_post(post)
+            edit_post(session, post)
         elif choice == '2':
-            delete_post(post, user_posts, page)
+            delete_post(session, post)
+            window.clear()  # positions after the deleted post have shifted
             total_posts -= 1
             if total_posts == 0:
-                print(format_text("you have no more posts."))
-                input(format_text("press enter to continue..."))
-                current_screen[0] = "main_menu"
+                session.io.print(format_text("you have no more posts."))
+                session.io.input(format_text("press enter to continue..."))
+                session.screen = "main_menu"
                 return
             if page >= total_posts:
                 page = total_posts - 1
         elif choice == '3':
-            view_likes(post)
+            view_likes(session, post)
         elif choice == '4':
-            view_comments(post)
+            view_comments(session, post)
         else:
-            print(format_text("invalid choice. please try again."))
-            input(format_text("press enter to continue..."))
+            session.io.print(format_text("invalid choice. please try again."))
+            session.io.input(format_text("press enter to continue..."))
 
-def view_user_posts(username):
+def view_user_posts(session, username):
     """
     displays the posts of a specific user.
     used when viewing another user's profile.
     """
-    clear_screen()
-    show_header(current_user[0])
+    clear_screen(session)
+    show_header(session)
     user_data = load_user_data(username)
     display_name = user_data.get('display_name', username)
     bio = user_data.get('bio', 'no bio available.')
@@ -248,34 +275,34 @@ def view_user_posts(username):
     age = user_data.get('age', '')
 
     profile_info = f"{display_name} (@{username})\npronouns: {pronouns} | age: {age}\nbio: {bio}\n"
-    print(format_text(profile_info))
+    session.io.print(format_text(profile_info))
 
-    posts = load_posts()
-    user_posts = [post for post in posts if post['user'] == username]
-    user_posts.reverse()  # most recent first
+    total_posts = count_user_posts(username)
 
-    if not user_posts:
-        print(format_text(f"{username} hasn't posted anything yet."))
-        input(format_text("press enter to continue..."))
+    if total_posts == 0:
+        session.io.print(format_text(f"{username} hasn't posted anything yet."))
+        session.io.input(format_text("press enter to continue..."))
         return
 
     page = 0
-    total_posts = len(user_posts)
+    window = {}
 
     while True:
-        clear_screen()
-        show_header(current_user[0])
-        print(format_text(profile_info))
-        print(format_text(f"{username}'s posts (post {page + 1} of {total_posts})\n"))
+        clear_screen(session)
+        show_header(session)
+        session.io.print(format_text(profile_info))
+        session.io.print(format_text(f"{username}'s posts (post {page + 1} of {total_posts})\n"))
 
-        post = user_posts[page]
+        post = user_post_at(username, page, window)
+        if post is None:
+            return
         hearts_display = display_hearts(post.get('likes', []))
-        timestamp = format_timestamp(post['timestamp'])
+        timestamp = format_timestamp(post['ts'])
         post_content = wrap_text(post['content'], indent=4)
         post_details = f"{timestamp}\n{post_content}\nlikes: {hearts_display}\n"
-        print(format_text("-" * 50))
-        print(format_text(post_details))
-        print(format_text("-" * 50 + "\n"))
+        session.io.print(format_text("-" * 50))
+        session.io.print(format_text(post_details))
+        session.io.print(format_text("-" * 50 + "\n"))
 
         options = [
             "1. like/unlike",      "2. view likes",
@@ -283,9 +310,9 @@ def view_user_posts(username):
             "n. next post",        "p. previous post",
             "enter: go back",
         ]
-        print(format_menu_options(options))
-        show_footer()
-        choice = input(format_text("enter your choice: ")).strip().lower()
+        session.io.print(format_menu_options(options))
+        show_footer(session)
+        choice = session.io.input(format_text("enter your choice: ")).strip().lower()
 
         if choice == '':
             return  # go back to the previous screen
@@ -293,195 +320,190 @@ def view_user_posts(username):
             if page < total_posts - 1:
                 page += 1
             else:
-                print(format_text("you are on the last post."))
-                input(format_text("press enter to continue..."))
+                session.io.print(format_text("you are on the last post."))
+                session.io.input(format_text("press enter to continue..."))
         elif choice == 'p':
             if page > 0:
                 page -= 1
             else:
-                print(format_text("you are on the first post."))
-                input(format_text("press enter to continue..."))
+                session.io.print(format_text("you are on the first post."))
+                session.io.input(format_text("press enter to continue..."))
         elif choice == '1':
-            like_unlike_post(post)
+            like_unlike_post(session, post)
         elif choice == '2':
-            view_likes(post)
+            view_likes(session, post)
         elif choice == '3':
-            add_comment(post)
+            add_comment(session, post)
         elif choice == '4':
-            view_comments(post)
+            view_comments(session, post)
         else:
-            print(format_text("invalid choice. please try again."))
-            input(format_text("press enter to continue..."))
+            session.io.print(format_text("invalid choice. please try again."))
+            session.io.input(format_text("press enter to continue..."))
 
-def edit_post(post):
+def user_post_at(username, index, window):
+    """
+    returns a user's post at position index, where 0 is their newest post.
+    posts are fetched from the store a page at a time and the current page
+    is kept in the window dict, so paging only reads that user's posts.
+    returns None if the post is gone (deleted from another session).
+    """
+    start = index - index % PROFILE_PAGE_SIZE
+    if window.get('start') != start:
+        window['start'] = start
+        window['posts'] = load_user_posts(username, start, PROFILE_PAGE_SIZE)
+    posts = window['posts']
+    return posts[index - start] if index - start < len(posts) else None
+
+def edit_post(session, post):
     """
     allows the user to edit the content of their post.
     """
-    new_content = input(format_text("enter new content: ")).strip()
+    new_content = session.io.input(format_text("enter new content: ")).strip()
     if new_content == '':
-        print(format_text("content cannot be empty."))
-        input(format_text("press enter to continue..."))
+        session.io.print(format_text("content cannot be empty."))
+        session.io.input(format_text("press enter to continue..."))
     else:
-        posts = load_posts()
-        for p in posts:
-            if p['id'] == post['id']:
-                p['content'] = new_content
-                break
-        save_posts(posts)
-        print(format_text("post updated successfully!"))
+        record_edit(post['id'], new_content)
+        session.io.print(format_text("post updated successfully!"))
         post['content'] = new_content
-        input(format_text("press enter to continue..."))
+        session.io.input(format_text("press enter to continue..."))
 
-def delete_post(post, user_posts, page):
+def delete_post(session, post):
     """
     allows the user to delete their post.
-    removes it from the posts list and updates the file.
     """
-    posts = load_posts()
-    posts = [p for p in posts if p['id'] != post['id']]
-    save_posts(posts)
-    print(format_text("post deleted successfully!"))
-    input(format_text("press enter to continue..."))
-    user_posts.pop(page)
-
-def like_unlike_post(post):
+    record_delete(post['id'])
+    session.io.print(format_text("post deleted successfully!"))
+    session.io.input(format_text("press enter to continue..."))
+
+def like_unlike_post(session, post):
     """
     toggles a like on a post.
     if the user has already liked the post, it unlikes it.
     otherwise, it likes the post and notifies the post owner.
     """
-    if 'likes' not in post:
-        post['likes'] = []
+    # start from the stored likes, other people may have liked it meanwhile
+    current = get_post(post['id'])
+    if current is None:
+        session.io.print(format_text("this post has been deleted."))
+        session.io.input(format_text("press enter to continue..."))
+        return
+    post['likes'] = current.get('likes', [])
 
-    if current_user[0] in post['likes']:
-        post['likes'].remove(current_user[0])
-        print(format_text("you unliked the post."))
+    if session.user in post['likes']:
+        post['likes'].remove(session.user)
+        record_unlike(post['id'], session.user)
+        retract(post['user'], 'like', session.user, post['id'])
+        session.io.print(format_text("you unliked the post."))
     else:
-        post['likes'].append(current_user[0])
-        print(format_text("you liked the post."))
-        if current_user[0] != post['user']:
-            notification = f"{current_user[0]} liked your post."
-            save_notifications(post['user'], notification)
-
-    posts = load_posts()
-    for p in posts:
-        if p['id'] == post['id']:
-            p['likes'] = post['likes']
-            break
-    save_posts(posts)
-    input(format_text("press enter to continue..."))
-
-def view_likes(post):
+        post['likes'].append(session.user)
+        record_like(post['id'], session.user)
+        session.io.print(format_text("you liked the post."))
+        notify(post['user'], 'like', session.user, post['id'])
+
+    session.io.input(format_text("press enter to continue..."))
+
+def view_likes(session, post):
     """
     shows a list of users who have liked the post.
     """
-    clear_screen()
-    show_header(current_user[0])
-    print(format_text("users who liked this post:\n"))
+    post = get_post(post['id']) or post
+    clear_screen(session)
+    show_header(session)
+    session.io.print(format_text("users who liked this post:\n"))
     if not post.get('likes'):
-        print(format_text("no likes yet."))
+        session.io.print(format_text("no likes yet."))
     else:
+        profiles = load_profiles(post['likes'])
         for user in post['likes']:
-            user_data = load_user_data(user)
-            display_name = user_data.get('display_name', user)
-            print(format_text(f"- {display_name} (@{user})"))
-    show_footer()
-    input(format_text("press enter to go back."))
+            display_name = profiles.get(user, {}).get('display_name', user)
+            session.io.print(format_text(f"- {display_name} (@{user})"))
+    show_footer(session)
+    session.io.input(format_text("press enter to go back."))
 
-def add_comment(post):
+def add_comment(session, post):
     """
     allows the user to add a comment to a post.
     notifies the post owner about the comment.
     """
-    comment = input(format_text("enter your comment: ")).strip()
+    comment = session.io.input(format_text("enter your comment: ")).strip()
     if comment == '':
-        print(format_text("comment cannot be empty."))
-        input(format_text("press enter to continue..."))
+        session.io.print(format_text("comment cannot be empty."))
+        session.io.input(format_text("press enter to continue..."))
     else:
-        if 'comments' not in post:
-            post['comments'] = []
-        post['comments'].append({
-            'user': current_user[0],
+        current = get_post(post['id'])
+        if current is None:
+            session.io.print(format_text("this post has been deleted."))
+            session.io.input(format_text("press enter to continue..."))
+            return
+        post['comments'] = current.get('comments', [])
+        new_comment = {
+            'user': session.user,
             'comment': comment,
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        })
-        posts = load_posts()
-        for p in posts:
-            if p['id'] == post['id']:
-                p['comments'] = post['comments']
-                break
-        save_posts(posts)
-        print(format_text("comment added successfully!"))
-        if current_user[0] != post['user']:
-            notification = f"{current_user[0]} commented on your post."
-            save_notifications(post['user'], notification)
-        input(format_text("press enter to continue..."))
-
-def view_comments(post):
+            'ts': timestamps.now()
+        }
+        post['comments'].append(new_comment)
+        record_comment(post['id'], new_comment)
+        session.io.print(format_text("comment added successfully!"))
+        notify(post['user'], 'comment', session.user, post['id'])
+        session.io.input(format_text("press enter to continue..."))
+
+def view_comments(session, post):
     """
     displays all comments on a post.
     """
-    clear_screen()
-    show_header(current_user[0])
-    print(format_text("comments:\n"))
+    post = get_post(post['id']) or post
+    clear_screen(session)
+    show_header(session)
+    session.io.print(format_text("comments:\n"))
     if 'comments' not in post or not post['comments']:
-        print(format_text("no comments yet."))
+        session.io.print(format_text("no comments yet."))
     else:
+        profiles = load_profiles([comment['user'] for comment in post['comments']])
         for idx, comment in enumerate(post['comments'], start=1):
-            timestamp = format_timestamp(comment['timestamp'])
-            user_data = load_user_data(comment['user'])
-            display_name = user_data.get('display_name', comment['user'])
+            timestamp = format_timestamp(comment['ts'])
+            display_name = profiles.get(comment['user'], {}).get('display_name', comment['user'])
             comment_text = wrap_text(comment['comment'], indent=4)
             comment_info = f"{display_name} (@{comment['user']}) - {timestamp}\n{comment_text}\n"
-            print(format_text(comment_info))
-    show_footer()
-    input(format_text("press enter to go back."))
+            session.io.print(format_text(comment_info))
+    show_footer(session)
+    session.io.input(format_text("press enter to go back."))
 
-def repost(post):
+def repost(session, post):
     """
     allows the user to repost someone else's post.
     creates a new post with the original content and credits the original user.
     """
-    posts = load_posts()
     new_post = {
-        'id': len(posts) + 1,
-        'user': current_user[0],
+        'user': session.user,
         'content': f"reposted from {post['user']}: {post['content']}",
         'likes': [],
         'comments': [],
-        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        'ts': timestamps.now()
     }
-    posts.append(new_post)
-    save_posts(posts)
-    print(format_text("post reposted successfully!"))
-    if current_user[0] != post['user']:
-        notification = f"{current_user[0]} reposted your post."
-        save_notifications(post['user'], notification)
-    input(format_text("press enter to continue..."))
-
-def quote_post(post):
+    append_post(new_post)
+    session.io.print(format_text("post reposted successfully!"))
+    notify(post['user'], 'repost', session.user, post['id'])
+    session.io.input(format_text("press enter to continue..."))
+
+def quote_post(session, post):
     """
     allows the user to quote a post and add their own comment.
     creates a new post with the quote and the original content.
     """
-    quote = input(format_text("enter your comment on the post: ")).strip()
+    quote = session.io.input(format_text("enter your comment on the post: ")).strip()
     if quote == '':
-        print(format_text("you cannot post an empty quote."))
-        input(format_text("press enter to continue..."))
+        session.io.print(format_text("you cannot post an empty quote."))
+        session.io.input(format_text("press enter to continue..."))
     else:
-        posts = load_posts()
         new_post = {
-            'id': len(posts) + 1,
-            'user': current_user[0],
+            'user': session.user,
             'content': f"{quote}\nquoted from {post['user']}: {post['content']}",
             'likes': [],
             'comments': [],
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            'ts': timestamps.now()
         }
-        posts.append(new_post)
-        save_posts(posts)
-        print(format_text("quote posted successfully!"))
-        if current_user[0] != post['user']:
-            notification = f"{current_user[0]} quoted your post."
-            save_notifications(post['user'], notification)
-        input(format_text("press enter to continue..."))
+        append_post(new_post)
+        session.io.print(format_text("quote posted successfully!"))
+        notify(post['user'], 'quote', session.user, post['id'])
+        session.io.input(format_text("press enter to continue..."))
@@ -0,0 +1,134 @@
+#------------------------------------------------------------------------------
+# filestore.py
+#------------------------------------------------------------------------------
+# this file has the low-level file helpers the json storage engine is built on.
+# many dreamland processes share the same files, so every write goes through
+# a lock, appends are a single write() call, and whole-file rewrites go to a
+# temporary file first and are swapped in with os.replace.
+#------------------------------------------------------------------------------
+
+import os
+import json
+import fcntl
+import tempfile
+from contextlib import contextmanager
+
+# the umask new files get; os.umask can only be read by setting it, so
+# it is read once, at import
+_umask = os.umask(0)
+os.umask(_umask)
+
+@contextmanager
+def locked(path):
+    """
+    holds an exclusive lock tied to path while the with block runs.
+    the lock lives in a separate .lock file so it survives the data file
+    being replaced.
+    """
+    with open(path + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def encode_record(record):
+    """
+    turns a record into one compact line of json.
+    """
+    return (json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8')
+
+def append_records(path, records):
+    """
+    appends records to a json lines file in a single write.
+    the caller must hold the lock for path.
+    returns the offset of each record in the file.
+    """
+    lines = [encode_record(record) for record in records]
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        offset = os.lseek(fd, 0, os.SEEK_END)
+        os.write(fd, b''.join(lines))
+    finally:
+        os.close(fd)
+    offsets = []
+    for line in lines:
+        offsets.append(offset)
+        offset += len(line)
+    return offsets
+
+def read_records(f, offset=0):
+    """
+    reads json lines from an open binary file, starting at offset.
+    yields (offset, end, record) for each line and stops at a half-written
+    last line, so end is always a safe place to resume from.
+    """
+    f.seek(offset)
+    for line in f:
+        if not line.endswith(b'\n'):
+            break
+        end = offset + len(line)
+        yield offset, end, json.loads(line)
+        offset = end
+
+def reopen_after_fork(path, reader, reset):
+    """
+    gives a forked child (see zygote.py) its own handle on the log at path,
+    which the parent had open as reader. the parent's handle would share its
+    read position with every other child. if the log was replaced or removed
+    since the parent read it, reset is called to forget what was read and
+    None is returned. returns the handle the child should read with.
+    """
+    if reader is None:
+        return None
+    try:
+        fresh = open(path, 'rb')
+    except FileNotFoundError:
+        reset()
+        return None
+    if os.fstat(fresh.fileno()).st_ino != os.fstat(reader.fileno()).st_ino:
+        fresh.close()
+        reset()
+        return None
+    reader.close()
+    return fresh
+
+def write_atomic(path, data):
+    """
+    replaces the contents of path with data (bytes) so that readers see
+    either the old file or the new one, never half of each.
+    """
+    write_atomic_stream(path, [data])
+
+def write_atomic_stream(path, chunks):
+    """
+    like write_atomic, but writes chunks (bytes) one at a time, so a file
+    that is rewritten record by record never has to fit in memory.
+    """
+    # a temporary file of its own, so two threads of one process (server.py
+    # runs a thread per session) never write into the same one
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.tmp.',
+                                    dir=os.path.dirname(path) or '.')
+    try:
+        with open(fd, 'wb') as f:
+            # mkstemp makes the file private; keep the mode files had before
+            os.fchmod(f.fileno(), _mode(path))
+            for chunk in chunks:
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+def _mode(path):
+    """
+    returns the permissions to give a new version of path: the old
+    version's, or what a plain open() would have given it.
+    """
+    try:
+        return os.stat(path).st_mode & 0o777
+    except FileNotFoundError:
+        return 0o666 & ~_umask
@@ -0,0 +1,78 @@
+#------------------------------------------------------------------------------
+# follows.py
+#------------------------------------------------------------------------------
+# this file keeps the follower index for the json storage engine.
+# a user's own file only says who they follow, so "who follows me" would
+# mean opening every account. instead every user has followers/<username>.json:
+#
+#   {"followers": ["mia", "sam"], "following_count": 12}
+#
+# which is updated together with the user's following list whenever someone
+# follows or unfollows. all changes go through one lock, so the two sides of
+# a follow can never disagree. the index is built from the user files the
+# first time it is needed.
+#------------------------------------------------------------------------------
+
+import os
+import json
+
+from filestore import locked, write_atomic
+
+FOLLOWERS_DIR = 'followers'
+
+# one lock for every follow change; it guards the followers/ files and the
+# following lists in users/
+FOLLOWS_LOCK = os.path.join(FOLLOWERS_DIR, 'index')
+
+# written once the index has been built from the user files
+BUILT_MARKER = os.path.join(FOLLOWERS_DIR, '.built')
+
+def _path(username):
+    """
+    returns the path of a user's follower file.
+    """
+    return os.path.join(FOLLOWERS_DIR, f'{username}.json')
+
+def exists():
+    """
+    checks whether the follower index has been built yet.
+    """
+    return os.path.exists(BUILT_MARKER)
+
+def read(username):
+    """
+    returns a user's entry: {'followers': [...], 'following_count': n}.
+    """
+    try:
+        with open(_path(username), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'followers': [], 'following_count': 0}
+
+def write(username, entry):
+    """
+    replaces a user's entry. the caller must hold FOLLOWS_LOCK.
+    """
+    write_atomic(_path(username), json.dumps(entry).encode('utf-8'))
+
+def rebuild(following_lists):
+    """
+    builds the index from scratch out of {username: following list}.
+    the caller must hold FOLLOWS_LOCK.
+    """
+    entries = {username: {'followers': [], 'following_count': len(following)}
+               for username, following in following_lists.items()}
+    for username, following in following_lists.items():
+        for followee in following:
+            entries.setdefault(followee, {'followers': [], 'following_count': 0})
+            entries[followee]['followers'].append(username)
+    for username, entry in entries.items():
+        write(username, entry)
+    write_atomic(BUILT_MARKER, b'')
+
+def lock():
+    """
+    returns the lock every follow change must hold.
+    """
+    os.makedirs(FOLLOWERS_DIR, exist_ok=True)
+    return locked(FOLLOWS_LOCK)
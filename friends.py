@@ -13,115 +13,131 @@ from helpers import (
     wrap_text,
     format_menu_options,
     color_text,
-    current_screen,
-    current_user,
 )
-from data import load_user_data
+from data import load_user_data, load_profiles, load_directory_page
 from user import user_profile_screen
-import os
 
-def discover_users_screen():
+# how many accounts the discover screen shows at once
+DISCOVER_PAGE_SIZE = 5
+
+def discover_users_screen(session):
     """
     allows the user to discover new users.
-    displays a list of all users with options to view profiles.
+    lists accounts a page at a time with options to view profiles.
     """
+    cursors = [None]  # the username each visited page starts after
     while True:
-        clear_screen()
-        show_header(current_user[0])
-        print(format_text("discover users\n"))
-        user_files = os.listdir('users')
-        all_users = [user_file[:-5] for user_file in user_files if user_file.endswith('.json')]
+        clear_screen(session)
+        show_header(session)
+        session.io.print(format_text("discover users\n"))
+        # fetch one extra entry to find out whether there is a next page
+        fetched = load_directory_page(cursors[-1], DISCOVER_PAGE_SIZE + 1)
+        page_entries = fetched[:DISCOVER_PAGE_SIZE]
+        has_next = len(fetched) > DISCOVER_PAGE_SIZE
+        entries = [e for e in page_entries if e['username'] != session.user]  # skip the current user
 
-        if not all_users:
-            print(format_text("no users found."))
-            input(format_text("press enter to continue..."))
-            current_screen[0] = "main_menu"
+        if not entries and len(cursors) == 1 and not has_next:
+            session.io.print(format_text("no users found."))
+            session.io.input(format_text("press enter to continue..."))
+            session.screen = "main_menu"
             return
-        else:
-            user_data = load_user_data(current_user[0])
-            following = user_data.get('following', [])
 
-            index = 1
-            for user in all_users:
-                if user == current_user[0]:
-                    continue  # skip the current user
-                user_info = load_user_data(user)
-                display_name = user_info.get('display_name', user)
-                bio = user_info.get('bio', 'no bio available.')
-                if user in following:
-                    username_display = color_text(user, '32')  # green if following
-                else:
-                    username_display = color_text(user, '34')  # blue otherwise
-                user_text = f"{index}. {display_name} (@{username_display})\nbio: {bio}\n"
-                print(format_text("-" * 50))
-                print(format_text(user_text))
-                print(format_text("-" * 50 + "\n"))
-                index += 1
+        user_data = load_user_data(session.user)
+        following = user_data.get('following', [])
+
+        for index, entry in enumerate(entries, start=1):
+            user = entry['username']
+            display_name = entry.get('display_name', user)
+            bio = entry.get('bio') or 'no bio available.'
+            if user in following:
+                username_display = color_text(user, '32')  # green if following
+            else:
+                username_display = color_text(user, '34')  # blue otherwise
+            user_text = f"{index}. {display_name} (@{username_display})\nbio: {bio}\n"
+            session.io.print(format_text("-" * 50))
+            session.io.print(format_text(user_text))
+            session.io.print(format_text("-" * 50 + "\n"))
 
-            print(format_text("enter the number of a user to view their profile."))
-            print(format_text("type 'back' to return to the main menu.\n"))
-            choice = input(format_text("enter your choice: ")).strip()
+        session.io.print(format_text(f"page {len(cursors)}"))
+        session.io.print(format_text("enter the number of a user to view their profile."))
+        session.io.print(format_text("n: next page, p: previous page."))
+        session.io.print(format_text("type 'back' to return to the main menu.\n"))
+        choice = session.io.input(format_text("enter your choice: ")).strip()
 
-            if choice.lower() == 'back':
-                current_screen[0] = "main_menu"
-                return
+        if choice.lower() == 'back':
+            session.screen = "main_menu"
+            return
+        elif choice.lower() == 'n':
+            if has_next:
+                cursors.append(page_entries[-1]['username'])
+            else:
+                session.io.print(format_text("you are on the last page."))
+                session.io.input(format_text("press enter to continue..."))
+            continue
+        elif choice.lower() == 'p':
+            if len(cursors) > 1:
+                cursors.pop()
+            else:
+                session.io.print(format_text("you are on the first page."))
+                session.io.input(format_text("press enter to continue..."))
+            continue
 
-            try:
-                choice = int(choice)
-                selected_users = [u for u in all_users if u != current_user[0]]
-                if 1 <= choice <= len(selected_users):
-                    selected_user = selected_users[choice - 1]
-                    user_profile_screen(selected_user)
-                else:
-                    print(format_text("invalid choice. please try again."))
-                    input(format_text("press enter to continue..."))
-            except ValueError:
-                print(format_text("invalid input. please try again."))
-                input(format_text("press enter to continue..."))
+        try:
+            choice = int(choice)
+            if 1 <= choice <= len(entries):
+                selected_user = entries[choice - 1]['username']
+                user_profile_screen(session, selected_user)
+            else:
+                session.io.print(format_text("invalid choice. please try again."))
+                session.io.input(format_text("press enter to continue..."))
+        except ValueError:
+            session.io.print(format_text("invalid input. please try again."))
+            session.io.input(format_text("press enter to continue..."))
 
-def friends_list_screen():
+def friends_list_screen(session):
     """
     displays the list of users that the current user is following.
     allows the user to view their profiles.
     """
     while True:
-        clear_screen()
-        show_header(current_user[0])
-        print(format_text("your friends\n"))
-        user_data = load_user_data(current_user[0])
+        clear_screen(session)
+        show_header(session)
+        session.io.print(format_text("your friends\n"))
+        user_data = load_user_data(session.user)
         following = user_data.get('following', [])
 
         if not following:
-            print(format_text("you are not following anyone yet."))
-            input(format_text("press enter to continue..."))
-            current_screen[0] = "main_menu"
+            session.io.print(format_text("you are not following anyone yet."))
+            session.io.input(format_text("press enter to continue..."))
+            session.screen = "main_menu"
             return
 
+        profiles = load_profiles(following)
         for idx, friend in enumerate(following, start=1):
-            friend_data = load_user_data(friend)
+            friend_data = profiles.get(friend, {})
             display_name = friend_data.get('display_name', friend)
             bio = friend_data.get('bio', 'no bio available.')
             friend_info = f"{idx}. {display_name} (@{friend})\nbio: {bio}\n"
-            print(format_text("-" * 50))
-            print(format_text(friend_info))
-            print(format_text("-" * 50 + "\n"))
+            session.io.print(format_text("-" * 50))
+            session.io.print(format_text(friend_info))
+            session.io.print(format_text("-" * 50 + "\n"))
 
-        print(format_text("enter the number of a friend to view their profile."))
-        print(format_text("type 'back' to return to the main menu.\n"))
-        choice = input(format_text("enter your choice: ")).strip()
+        session.io.print(format_text("enter the number of a friend to view their profile."))
+        session.io.print(format_text("type 'back' to return to the main menu.\n"))
+        choice = session.io.input(format_text("enter your choice: ")).strip()
 
         if choice.lower() == 'back':
-            current_screen[0] = "main_menu"
+            session.screen = "main_menu"
             return
 
         try:
             choice = int(choice)
             if 1 <= choice <= len(following):
                 selected_friend = following[choice - 1]
-                user_profile_screen(selected_friend)
+                user_profile_screen(session, selected_friend)
             else:
-                print(format_text("invalid choice. please try again."))
-                input(format_text("press enter to continue..."))
+                session.io.print(format_text("invalid choice. please try again."))
+                session.io.input(format_text("press enter to continue..."))
         except ValueError:
-            print(format_text("invalid input. please try again."))
-            input(format_text("press enter to continue..."))
+            session.io.print(format_text("invalid input. please try again."))
+            session.io.input(format_text("press enter to continue..."))
@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+
+#------------------------------------------------------------------------------
+# gen_dataset.py
+#------------------------------------------------------------------------------
+# this file builds a synthetic dreamland data directory, so screens can be
+# tried and timed at sizes the checked-in sample data never reaches.
+#
+# it aims to look like a real community rather than uniform noise: a few
+# accounts are followed, liked and messaged far more than the rest (a power
+# law), most people follow a couple of dozen accounts while some follow
+# hundreds, and most conversations are a few messages long while a few run
+# into the thousands. posts spread over the last POST_DAYS days.
+#
+# everything is written in the json engine's current layout (users/,
+# posts.log, conversations/, inbox/, notifications/) with the stores' own
+# helpers. the sqlite engine imports it the first time it opens the
+# directory. every account's password is the one given with --password.
+# dataset.json lists some popular and typical accounts for benchmarks to
+# log in as.
+#
+#   python3 gen_dataset.py /tmp/dl-10k --users 10000
+#   python3 gen_dataset.py /tmp/dl-100k --users 100000 --posts 2000000
+#------------------------------------------------------------------------------
+
+import os
+import sys
+import json
+import time
+import base64
+import random
+import argparse
+from bisect import bisect_left
+from itertools import accumulate
+
+import bcrypt
+
+from filestore import encode_record, write_atomic
+import postlog
+import conversations
+import notification_log
+
+WORDS = ('dream land post like comment reply wow love this so much honestly '
+         'tomorrow maybe never again cute cat picture sunset coffee rain night '
+         'music playlist garden moon sleepy hello friend weekend').split()
+
+# how far back posts and messages go
+POST_DAYS = 90
+
+# posts this recent leave their author unread notifications
+NOTIFY_DAYS = 7
+
+# how many accounts of each kind dataset.json lists
+SAMPLE_SIZE = 20
+
+def _text(rng, low, high):
+    """
+    returns between low and high random words.
+    """
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+def _heavy_tail(rng, alpha, cap):
+    """
+    returns a count from a pareto distribution (mostly 0 to 2, now and then
+    far more), at most cap.
+    """
+    return min(int(rng.paretovariate(alpha)) - 1, cap)
+
+class _Picker:
+    """
+    picks usernames with power-law odds: the account ranked r is chosen
+    in proportion to 1 / r ** alpha. ranks are shuffled, so being popular
+    isn't tied to the name.
+    """
+    def __init__(self, rng, names, alpha):
+        self.rng = rng
+        self.names = list(names)
+        rng.shuffle(self.names)
+        self.cumulative = list(accumulate(1 / (rank + 1) ** alpha for rank in range(len(self.names))))
+
+    def pick(self):
+        point = self.rng.random() * self.cumulative[-1]
+        return self.names[min(bisect_left(self.cumulative, point), len(self.names) - 1)]
+
+    def top(self, count):
+        return self.names[:count]
+
+def build(directory, users, posts, threads, password='dreamland', alpha=1.0, seed=1, log=None):
+    """
+    writes a dataset into directory (which must not exist yet) and returns
+    its manifest (what dataset.json holds).
+    """
+    os.makedirs(directory)
+    cwd = os.getcwd()
+    os.chdir(directory)  # the stores use paths relative to the data dir
+    try:
+        return _build(users, posts, threads, password, alpha, seed, log or (lambda text: None))
+    finally:
+        os.chdir(cwd)
+
+def _build(users, posts, threads, password, alpha, seed, log):
+    """
+    does the work of build() inside the data directory.
+    """
+    rng = random.Random(seed)
+    names = [f"user{i}" for i in range(users)]
+    now = int(time.time())
+    start = now - POST_DAYS * 86400
+    # everyone shares one hash, made at a low cost so logging in stays cheap
+    # (dreamland upgrades it on each account's first login)
+    password_hash = base64.b64encode(bcrypt.hashpw(password.encode(), bcrypt.gensalt(4))).decode('utf-8')
+
+    popular = _Picker(rng, names, alpha)   # who posts, gets followed and messaged
+    active = _Picker(rng, names, alpha)    # who likes, comments and writes
+
+    # users and the follow graph
+    log(f"writing {users} users")
+    os.makedirs('users')
+    following_counts = []
+    for name in names:
+        count = min(int(rng.lognormvariate(3, 1)), users - 1, 2000)
+        following = set()
+        for _ in range(count * 2):
+            if len(following) >= count:
+                break
+            other = popular.pick()
+            if other != name:
+                following.add(other)
+        following_counts.append(len(following))
+        user_data = {
+            'password_hash': password_hash,
+            'display_name': name.replace('user', 'dreamer '),
+            'bio': _text(rng, 0, 20),
+            'pronouns': rng.choice(['', 'she/her', 'he/him', 'they/them']),
+            'age': '',
+            'following': sorted(following),
+        }
+        with open(os.path.join('users', f'{name}.json'), 'w') as f:
+            json.dump(user_data, f, indent=4)
+
+    # posts, with the notifications their recent likes and comments left
+    log(f"writing {posts} posts")
+    events = {}
+    with open(postlog.LOG_PATH, 'wb') as f:
+        for post_id in range(1, posts + 1):
+            ts = start + (now - start) * post_id // (posts + 1)
+            author = popular.pick()
+            likes = {active.pick() for _ in range(_heavy_tail(rng, 1.3, 500))}
+            likes.discard(author)
+            comments = [{'user': active.pick(), 'comment': _text(rng, 1, 40), 'ts': ts + rng.randint(60, 86400)}
+                        for _ in range(_heavy_tail(rng, 1.8, 200))]
+            post = {
+                'id': post_id,
+                'user': author,
+                'content': _text(rng, 3, 60),
+                'likes': sorted(likes),
+                'comments': comments,
+                'ts': ts,
+            }
+            f.write(encode_record({'op': 'put', 'post': post}))
+            if ts > now - NOTIFY_DAYS * 86400:
+                for kind, actors in (('like', sorted(likes)), ('comment', [c['user'] for c in comments])):
+                    if actors:
+                        events.setdefault(author, []).append(
+                            {'kind': kind, 'actors': actors[:5], 'post': post_id,
+                             'count': len(actors), 'ts': ts})
+    write_atomic(postlog.SEQ_PATH, f"{posts}\n".encode('utf-8'))
+
+    log(f"writing notifications for {len(events)} users")
+    for name, user_events in events.items():
+        with notification_log.lock(name):
+            notification_log.create(name, user_events)
+
+    # conversations and inboxes
+    log(f"writing {threads} conversations")
+    os.makedirs(conversations.CONVERSATION_DIR)
+    inboxes = {}
+    pairs = set()
+    message_count = 0
+    for _ in range(threads):
+        user_a = active.pick()
+        user_b = popular.pick()
+        if user_a == user_b or conversations.key(user_a, user_b) in pairs:
+            continue
+        pairs.add(conversations.key(user_a, user_b))
+        length = _heavy_tail(rng, 1.2, 5000) + 1
+        ts = rng.randint(start, now - 3600)
+        step = max(1, (now - ts) // (length + 1))
+        thread = []
+        for message_id in range(1, length + 1):
+            ts += rng.randint(1, step)
+            thread.append({'id': message_id, 'sender': rng.choice((user_a, user_b)),
+                           'message': _text(rng, 1, 25), 'ts': ts})
+        message_count += length
+        with open(conversations._path(user_a, user_b), 'wb') as f:
+            f.write(b''.join(encode_record(msg) for msg in thread))
+        for owner, partner in ((user_a, user_b), (user_b, user_a)):
+            read_id = max(0, length - _heavy_tail(rng, 1.5, 20))
+            inboxes.setdefault(owner, {})[partner] = conversations.build_summary(owner, thread, read_id)
+    os.makedirs(conversations.INBOX_DIR)
+    for owner, inbox in inboxes.items():
+        write_atomic(conversations._inbox_path(owner), json.dumps(inbox).encode('utf-8'))
+    write_atomic(conversations.MIGRATED_MARKER, b'')
+
+    order = sorted(range(users), key=lambda i: following_counts[i])
+    manifest = {
+        'users': users,
+        'posts': posts,
+        'conversations': len(pairs),
+        'messages': message_count,
+        'password': password,
+        'popular': popular.top(SAMPLE_SIZE),
+        'typical': [names[i] for i in order[len(order) // 2:][:SAMPLE_SIZE]],
+        'busiest_inboxes': sorted(inboxes, key=lambda name: -len(inboxes[name]))[:SAMPLE_SIZE],
+    }
+    with open('dataset.json', 'w') as f:
+        json.dump(manifest, f, indent=4)
+    return manifest
+
+def main():
+    parser = argparse.ArgumentParser(description='build a synthetic dreamland dataset')
+    parser.add_argument('directory', help='where to write it (must not exist yet)')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--posts', type=int, help='default: 10 per user')
+    parser.add_argument('--conversations', type=int, help='default: 1 per 2 users')
+    parser.add_argument('--password', default='dreamland', help='password of every account')
+    parser.add_argument('--alpha', type=float, default=1.0, help='how lopsided popularity is')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    manifest = build(os.path.abspath(args.directory), args.users,
+                     args.posts if args.posts is not None else args.users * 10,
+                     args.conversations if args.conversations is not None else args.users // 2,
+                     args.password, args.alpha, args.seed,
+                     log=lambda text: print(f"  {text}", file=sys.stderr))
+    print(f"{manifest['users']} users, {manifest['posts']} posts, {manifest['conversations']} conversations "
+          f"({manifest['messages']} messages) in {time.perf_counter() - started:.1f}s")
+
+if __name__ == '__main__':
+    main()
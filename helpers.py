@@ -3,30 +3,31 @@
 #------------------------------------------------------------------------------
 # this file contains helper functions that are used throughout the application.
 # these functions handle tasks like clearing the screen, displaying headers and footers,
-# formatting text, and managing global variables like the current screen and user.
+# and formatting text. the ones that show something take the session to show it on.
 #------------------------------------------------------------------------------
 
-import os
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from functools import lru_cache
 import textwrap
+import time
 
-# global variables to keep track of the current screen and user
-current_screen = ["splash"]  # we start with the splash screen
-current_user = [None]        # this will hold the username of the logged-in user
+from config import POLL_SECONDS, SCREEN_WIDTH, LAYOUT_CACHE_SIZE
+import timestamps
 
-def clear_screen():
+def clear_screen(session):
     """
     clears the terminal screen.
     this makes the output cleaner by removing previous text.
+    the screen is sent as one frame once it is drawn (see session.py).
     """
-    os.system('cls' if os.name == 'nt' else 'clear')
+    session.io.clear()
 
-def show_splash_screen():
+def show_splash_screen(session):
     """
     displays the splash screen with some ascii art.
     waits for the user to press enter before moving to the welcome screen.
     """
-    clear_screen()
+    clear_screen(session)
     art = r"""
       
   ▓█████▄  ██▀███  ▓█████ ▄▄▄       ███▄ ▄███▓
@@ -51,42 +52,56 @@ def show_splash_screen():
 
 
     """
-    print(art)
-    print(format_text("press enter to continue", indent=12))
-    input()
-    current_screen[0] = "welcome"  # move to the welcome screen
+    session.io.print(art)
+    session.io.print(format_text("press enter to continue", indent=12))
+    session.io.input()
+    session.screen = "welcome"  # move to the welcome screen
 
-def show_header(username=None):
+def show_header(session):
     """
     displays the header with a welcome message.
-    if a username is provided, it personalizes the message.
+    if a user is logged in, it personalizes the message.
     the username is displayed in a different color.
     """
     art = r"""~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~"""
-    if username:
-        welcome_text = f"welcome to dreamland, {color_text(username, '35')}"
+    if session.user:
+        welcome_text = f"welcome to dreamland, {color_text(session.user, '35')}"
     else:
         welcome_text = "welcome to dreamland"
     centered_text = welcome_text.center(35)
-    print(art)
-    print(centered_text)
-    print(art)
-    print('\n')
+    session.io.print(art)
+    session.io.print(centered_text)
+    session.io.print(art)
+    session.io.print('\n')
 
-def show_footer():
+def show_footer(session):
     """
     displays a footer line to separate content.
     """
-    print("\n" + "~" * 35)
+    session.io.print("\n" + "~" * 35)
 
 def format_text(text, indent=1):
     """
     formats text to ensure it wraps properly and is indented.
     this makes the output look neat within the terminal width.
     """
-    wrapper = textwrap.TextWrapper(width=40 - indent, subsequent_indent=' ' * indent)
-    indented_text = wrapper.fill(text)
-    indented_lines = [" " * indent + line for line in indented_text.split('\n')]
+    return _layout(text, SCREEN_WIDTH, indent)
+
+@lru_cache(maxsize=None)
+def _wrapper(width, indent):
+    """
+    returns the text wrapper for a width and indent, made once and reused.
+    """
+    return textwrap.TextWrapper(width=width - indent, subsequent_indent=' ' * indent)
+
+@lru_cache(maxsize=LAYOUT_CACHE_SIZE)
+def _layout(text, width, indent):
+    """
+    wraps and indents text. the same post or comment is laid out again on
+    every redraw, so recent results are kept.
+    """
+    wrapped_text = _wrapper(width, indent).fill(text)
+    indented_lines = [" " * indent + line for line in wrapped_text.split('\n')]
     return '\n'.join(indented_lines)
 
 def color_text(text, color_code):
@@ -112,47 +127,72 @@ def display_hearts(hearts_list):
         heart_string += f" +{total_hearts - 10}"
     return heart_string
 
-def format_timestamp(timestamp_str):
+# local midnight today, yesterday and tomorrow as 'ts' values
+_days = [0, 0, 0]
+
+def _day_bounds():
+    """
+    returns the starts of today, yesterday and tomorrow, worked out again
+    after midnight.
+    """
+    now = time.time()
+    if not _days[0] <= now < _days[2]:
+        midnight = datetime.combine(date.today(), datetime.min.time())
+        _days[:] = [int(midnight.timestamp()),
+                    int((midnight - timedelta(days=1)).timestamp()),
+                    int((midnight + timedelta(days=1)).timestamp())]
+    return tuple(_days)
+
+@lru_cache(maxsize=4096)
+def _format_minute(minute, day):
     """
-    formats a timestamp string into a more readable form.
+    formats one minute, given as 'ts' // 60. day is 'today', 'yesterday'
+    or None for the date.
+    """
+    when = datetime.fromtimestamp(minute * 60)
+    return f"{day or when.strftime('%-m/%-d')} at {when.strftime('%I:%M%p').lstrip('0').lower()}"
+
+def format_timestamp(ts):
+    """
+    formats a 'ts' (seconds since the epoch) into a more readable form.
     shows 'today', 'yesterday', or the date and time.
     """
-    if not timestamp_str:
+    if isinstance(ts, str):
+        ts = timestamps.parse(ts)
+    if not ts:
         return "unknown time"
-    try:
-        timestamp = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
-    except ValueError:
-        return "invalid time format"
-    now = datetime.now()
-    today = now.date()
-    time_format = "%I:%M%p"
-    if timestamp.date() == today:
-        return f"today at {timestamp.strftime(time_format).lstrip('0').lower()}"
-    elif timestamp.date() == today - timedelta(days=1):
-        return f"yesterday at {timestamp.strftime(time_format).lstrip('0').lower()}"
+    today, yesterday, tomorrow = _day_bounds()
+    if today <= ts < tomorrow:
+        day = 'today'
+    elif yesterday <= ts < today:
+        day = 'yesterday'
     else:
-        return f"{timestamp.strftime('%-m/%-d')} at {timestamp.strftime(time_format).lstrip('0').lower()}"
+        day = None
+    return _format_minute(ts // 60, day)
 
 def wrap_text(text, indent=5):
     """
     wraps text to fit within the terminal width, with indentation.
     useful for displaying long pieces of text like posts or comments.
     """
-    wrapper = textwrap.TextWrapper(width=40 - indent, subsequent_indent=' ' * indent)
-    wrapped_text = wrapper.fill(text)
-    indented_lines = [" " * indent + line for line in wrapped_text.split('\n')]
-    return '\n'.join(indented_lines)
+    return _layout(text, SCREEN_WIDTH, indent)
 
 def format_menu_options(options):
     """
     formats menu options to display them in two columns and centered.
     this makes the menu look organized and easy to read.
     """
+    return _menu_layout(tuple(options), SCREEN_WIDTH)
+
+@lru_cache(maxsize=LAYOUT_CACHE_SIZE)
+def _menu_layout(options, max_width):
+    """
+    lays out a menu; screens show the same few menus over and over.
+    """
     half = (len(options) + 1) // 2
     col1 = options[:half]
     col2 = options[half:]
     formatted_lines = []
-    max_width = 40
     for i in range(len(col1)):
         left = col1[i]
         right = col2[i] if i < len(col2) else ''
@@ -160,3 +200,16 @@ def format_menu_options(options):
         centered_line = line.center(max_width)
         formatted_lines.append(centered_line)
     return '\n'.join(formatted_lines)
+
+def input_until(session, prompt, changed):
+    """
+    works like input(), but stops waiting and returns None as soon as
+    changed() returns True, so the screen can redraw with new data.
+    changed is checked every POLL_SECONDS.
+    """
+    session.io.write(prompt)
+    while True:
+        if session.io.wait(POLL_SECONDS):
+            return session.io.readline()
+        if changed():
+            return None
@@ -0,0 +1,692 @@
+#!/usr/bin/env python
+
+#------------------------------------------------------------------------------
+# loadtest.py
+#------------------------------------------------------------------------------
+# this file puts dreamland under the kind of load production sees: many
+# sessions at once, all changing the same files. each session is a made-up
+# visitor on their own terminal (a pty running dreamland.py, the way gotty
+# starts it, or a connection to server.py) who logs in and then plays a
+# persona over and over until time is up:
+#
+#   scroller   opens the feed and pages through it
+#   liker      likes (or unlikes) posts in the feed
+#   commenter  comments on a post in the feed
+#   poster     writes a post
+#   messenger  sends messages in their newest conversation
+#   follower   follows (or unfollows) someone from discover
+#   editor     changes their bio
+#
+# every action is timed from the moment its line is typed until the next
+# screen waits for input, and the run reports throughput and p50/p99 for
+# each kind of action.
+#
+# everything a visitor writes carries a word nobody else uses, and every
+# change a screen confirmed ("post created successfully!", "you liked the
+# post.") is remembered. once the sessions have logged out, the data is
+# read back through data.py (so either engine can be checked) and each
+# confirmed change that is missing, or there twice, counts as a lost
+# update: posts and comments in the post log, likes on their posts,
+# messages in their conversation and both inboxes, follows in the user
+# file and the follower index, and bios in the user files.
+#
+# it exits with status 1 if an update was lost, a session failed, or an
+# action's p99 went over its --max-p99 limit, so it can gate a change:
+#
+#   python3 loadtest.py --sessions 20 --duration 30
+#   python3 loadtest.py --data /tmp/dl-10k --sessions 50 --backend sqlite
+#   python3 loadtest.py --sessions 50 --zygote
+#   python3 loadtest.py --server localhost:2323 --data /srv/dreamland
+#   python3 loadtest.py --max-p99 like=500 --max-p99 send=500
+#
+# --data is a dataset made by gen_dataset.py (it reads the accounts and
+# their password from dataset.json). it is copied first, except with
+# --server, where it must be the directory the server is running in.
+#------------------------------------------------------------------------------
+
+import os
+import re
+import sys
+import json
+import time
+import codecs
+import random
+import select
+import shutil
+import socket
+import secrets
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections import Counter
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+PERSONAS = ('scroller', 'liker', 'commenter', 'poster', 'messenger', 'follower', 'editor')
+
+# every timed action, in the order the report lists them
+ACTIONS = ('start', 'login', 'menu', 'feed', 'next', 'like', 'comment', 'post', 'inbox',
+           'conversation', 'send', 'discover', 'profile', 'follow', 'edit', 'logout')
+
+# what the kinds of lost update are reported as
+CHECKS = ('posts', 'comments', 'likes', 'messages', 'follows', 'bios')
+
+# the last thing each screen prints before it waits for a line (squashed,
+# see _squash)
+PROMPTS = ('enter your choice:', 'press enter to continue...', 'press enter to continue',
+           'select:', 'enter your username:', 'enter your password:', 'enter your comment:',
+           "enter your post content (or type 'back' to cancel):", 'enter your message:', ']:')
+
+# shows the main menu is up
+MENU = '1. view feed'
+
+_ESCAPES = re.compile(r'\x1b\[[0-9;?]*[A-Za-z]')
+
+def _squash(text):
+    """
+    returns what a screen says, without colors or cursor movement and with
+    every run of whitespace made one space, so wrapped lines read the same
+    at any width.
+    """
+    return ' '.join(_ESCAPES.sub('', text).split())
+
+def _post_on(screen):
+    """
+    returns (author, text) for the post a feed screen shows, where text is
+    its timestamp followed by its content, or None.
+    """
+    match = re.search(r'your feed \(post \d+\) .*?\(@(\S+)\) - (.*?) likes:', screen)
+    return match.groups() if match else None
+
+class Failed(Exception):
+    """
+    raised when a session doesn't show what its script expected.
+    """
+
+class Connection:
+    """
+    a visitor's end of one session: lines go in, screens come out.
+    """
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.output = ''  # everything shown since the last line was typed
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+    def type(self, line):
+        self.output = ''
+        self.send((line + '\n').encode('utf-8'))
+
+    def wait_for(self, *markers):
+        """
+        reads until the session is waiting for a line again with one of
+        markers on screen. returns (the first of markers shown, the squashed
+        screen).
+        """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            screen = _squash(self.output)
+            if screen.endswith(PROMPTS):
+                for marker in markers:
+                    if marker in screen:
+                        return marker, screen
+            left = deadline - time.monotonic()
+            if left <= 0:
+                raise Failed(f"waited {self.timeout:g}s for {' or '.join(map(repr, markers))}, "
+                             f"screen ends: {screen[-1200:]!r}")
+            data = self.receive(left)
+            if data == b'':
+                raise Failed(f"the session ended, screen ends: {screen[-1200:]!r}")
+            if data:
+                self.output += self._decoder.decode(data)
+
+    def send(self, data):
+        raise NotImplementedError
+
+    def receive(self, timeout):
+        """
+        returns what arrived within timeout seconds: None if nothing did,
+        b'' once the session is over.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+class PtyConnection(Connection):
+    """
+    a session running on a new terminal, the way gotty starts them.
+    """
+    def __init__(self, command, cwd, env, timeout):
+        super().__init__(timeout)
+        self.master, slave = os.openpty()
+        self.process = subprocess.Popen(command, cwd=cwd, env=env, stdin=slave, stdout=slave,
+                                        stderr=slave, start_new_session=True)
+        os.close(slave)
+
+    def send(self, data):
+        os.write(self.master, data)
+
+    def receive(self, timeout):
+        if not select.select([self.master], [], [], timeout)[0]:
+            return None
+        try:
+            return os.read(self.master, 65536)
+        except OSError:
+            return b''  # the process is gone
+
+    def close(self):
+        os.close(self.master)
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+class SocketConnection(Connection):
+    """
+    a session on a running server.py.
+    """
+    def __init__(self, address, timeout):
+        super().__init__(timeout)
+        self.sock = socket.create_connection(address, timeout=timeout)
+
+    def send(self, data):
+        self.sock.sendall(data)
+
+    def receive(self, timeout):
+        if not select.select([self.sock], [], [], timeout)[0]:
+            return None
+        try:
+            return self.sock.recv(65536)
+        except OSError:
+            return b''
+
+    def close(self):
+        self.sock.close()
+
+class Results:
+    """
+    what the sessions timed and every change their screens confirmed,
+    shared by all the session threads.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.times = {}
+        self.expected = {kind: [] for kind in CHECKS}
+        self.errors = []
+
+    def time(self, action, seconds):
+        with self.lock:
+            self.times.setdefault(action, []).append(seconds)
+
+    def expect(self, kind, item):
+        with self.lock:
+            self.expected[kind].append(item)
+
+    def fail(self, text):
+        with self.lock:
+            self.errors.append(text)
+
+class Visitor:
+    """
+    one made-up user: logs in, then plays their persona until time is up.
+    each visitor has an account of their own, so whatever they liked or
+    followed last is what the data should say afterwards.
+    """
+    def __init__(self, number, username, persona, connect, results, manifest, tag, think, seed):
+        self.number = number
+        self.username = username
+        self.persona = persona
+        self.connect = connect
+        self.results = results
+        self.password = manifest['password']
+        self.tag = tag
+        self.think = think
+        self.rng = random.Random(seed)
+        self.written = 0
+        self.connection = None
+
+    def marker(self):
+        """
+        returns a word nobody else will write, to find a change by later.
+        """
+        self.written += 1
+        return f"lt{self.tag}s{self.number}n{self.written}"
+
+    def step(self, action, line, *markers):
+        """
+        types a line and waits for the screen that follows, timing it as
+        action (unless that is None). returns what wait_for() does.
+        """
+        started = time.perf_counter()
+        self.connection.type(line)
+        found = self.connection.wait_for(*markers)
+        if action:
+            self.results.time(action, time.perf_counter() - started)
+        return found
+
+    def run(self, deadline):
+        started = time.perf_counter()
+        try:
+            self.connection = self.connect()
+            self.connection.wait_for('press enter to continue')
+            self.results.time('start', time.perf_counter() - started)
+            self.login()
+            while time.monotonic() < deadline:
+                getattr(self, self.persona)()
+                if self.think:
+                    time.sleep(self.rng.uniform(0, 2 * self.think))
+            self.step('logout', '9', 'you have been logged out')
+        except (Failed, OSError) as e:
+            self.results.fail(f"{self.username} ({self.persona}): {e}")
+        finally:
+            if self.connection:
+                self.connection.close()
+
+    def login(self):
+        self.step(None, '', 'select:')
+        while True:
+            self.step(None, '1', 'enter your username:')
+            self.step(None, self.username, 'enter your password:')
+            found, _ = self.step('login', self.password, 'login successful!',
+                                 'lots of people are logging in', 'invalid username or password')
+            if found == 'login successful!':
+                break
+            if found == 'invalid username or password':
+                raise Failed("the dataset's password didn't work")
+            self.step(None, '', 'select:')  # every password check slot was busy, try again
+        self.step('menu', '', MENU)
+
+    def open_feed(self):
+        """
+        opens the feed and returns its screen, or None if it's empty (and
+        the main menu is back).
+        """
+        found, screen = self.step('feed', '1', 'no posts to show', 'your feed (post')
+        if found == 'no posts to show':
+            self.step('menu', '', MENU)
+            return None
+        return screen
+
+    def next_post(self):
+        """
+        moves the feed on a post and returns its screen.
+        """
+        found, screen = self.step('next', 'n', 'you are on the last post', 'your feed (post')
+        if found == 'you are on the last post':
+            found, screen = self.step(None, '', 'your feed (post')
+        return screen
+
+    def scroller(self):
+        if self.open_feed() is None:
+            return
+        for _ in range(5):
+            self.next_post()
+        self.step('menu', '', MENU)
+
+    def liker(self):
+        screen = self.open_feed()
+        if screen is None:
+            return
+        for _ in range(3):
+            found, _ = self.step('like', '1', 'this post has been deleted',
+                                 'you liked the post', 'you unliked the post')
+            post = _post_on(screen)
+            if post and found != 'this post has been deleted':
+                self.results.expect('likes', [self.username, *post, found == 'you liked the post'])
+            self.step(None, '', 'your feed (post')
+            screen = self.next_post()
+        self.step('menu', '', MENU)
+
+    def commenter(self):
+        if self.open_feed() is None:
+            return
+        self.step(None, '3', 'enter your comment:')
+        text = self.marker()
+        found, _ = self.step('comment', f"{text} sweet dreams", 'this post has been deleted',
+                             'comment added successfully')
+        if found == 'comment added successfully':
+            self.results.expect('comments', text)
+        self.step(None, '', 'your feed (post')
+        self.next_post()
+        self.step('menu', '', MENU)
+
+    def poster(self):
+        self.step(None, '2', 'create a new post')
+        text = self.marker()
+        self.step('post', f"{text} posted under load", 'post created successfully')
+        self.results.expect('posts', text)
+        self.step('menu', '', MENU)
+
+    def messenger(self):
+        self.step('inbox', '4', 'direct messages')
+        found, screen = self.step('conversation', '1', 'invalid choice', 'conversation with')
+        if found == 'invalid choice':
+            self.step(None, '', 'direct messages')  # nobody to talk to yet
+        else:
+            partner = re.search(r'conversation with (\S+)', screen).group(1)
+            for _ in range(3):
+                text = self.marker()
+                self.step('send', text, text)
+                self.results.expect('messages', [self.username, partner, text])
+            self.step(None, 'back', 'direct messages')
+        self.step('menu', '', MENU)
+
+    def follower(self):
+        self.step('discover', '7', 'discover users')
+        found, screen = self.step('profile', str(self.rng.randint(1, 5)), 'invalid',
+                                  'you are viewing your own profile', 'followers:')
+        if found == 'followers:':
+            found, screen = self.step('follow', '1', 'you are now following', 'you have unfollowed')
+            target = re.search(rf'{found} (\S+)\. press enter', screen).group(1)
+            self.results.expect('follows', [self.username, target, found == 'you are now following'])
+            self.step(None, '', 'followers:')
+        self.step(None, '', 'discover users')
+        self.step('menu', 'back', MENU)
+
+    def editor(self):
+        self.step(None, '6', 'display name [')
+        self.step(None, '', 'bio [')
+        bio = f"{self.marker()} dreaming under load"
+        self.step(None, bio, 'pronouns [')
+        self.step(None, '', 'age [')
+        self.step('edit', '', 'profile updated successfully')
+        self.results.expect('bios', [self.username, bio])
+        self.step('menu', '', MENU)
+
+def pick_accounts(manifest, personas, count, rng):
+    """
+    returns a (username, persona) pair per session. messengers get the
+    busiest inboxes, everyone else typical and popular accounts, then
+    anyone. no account gets two sessions.
+    """
+    if count > manifest['users']:
+        raise SystemExit(f"the dataset only has {manifest['users']} users")
+    taken = set()
+
+    def take(preferred):
+        for name in preferred:
+            if name not in taken:
+                taken.add(name)
+                return name
+        while True:
+            name = f"user{rng.randrange(manifest['users'])}"
+            if name not in taken:
+                taken.add(name)
+                return name
+
+    accounts = []
+    for number in range(count):
+        persona = personas[number % len(personas)]
+        if persona == 'messenger':
+            accounts.append((take(manifest['busiest_inboxes']), persona))
+        else:
+            accounts.append((take(manifest['typical'] + manifest['popular']), persona))
+    return accounts
+
+def open_store():
+    """
+    runs in the data directory before the sessions start. opens the store
+    once, so they don't all build its indexes (or import the dataset into
+    sqlite) at the same moment.
+    """
+    import data
+    with open('dataset.json', 'r') as f:
+        someone = json.load(f)['popular'][0]
+    data.load_directory_page()
+    data.load_follow_counts(someone)
+    data.count_user_posts(someone)
+
+def check(expected):
+    """
+    runs in the data directory, with the engine that was tested. reads
+    back every change the sessions saw confirmed and prints, as a single
+    json line, how many of each kind were checked and lost.
+    """
+    import data
+
+    report = {kind: {'checked': 0, 'lost': 0, 'unverified': 0, 'examples': []} for kind in CHECKS}
+    marker = re.compile(rf"lt{expected['tag']}s\d+n\d+")
+
+    def lost(kind, text):
+        report[kind]['lost'] += 1
+        if len(report[kind]['examples']) < 5:
+            report[kind]['examples'].append(text)
+
+    # posts, comments and likes, in one pass over the posts
+    posts = data.load_posts()
+    for post_id, uses in Counter(post['id'] for post in posts).items():
+        if uses > 1:
+            lost('posts', f"post id {post_id} is used by {uses} posts")
+    authors = {author for user, author, text, liked in expected['likes']}
+    posted, commented, by_author = Counter(), Counter(), {}
+    for post in posts:
+        posted.update(marker.findall(post['content']))
+        for comment in post.get('comments', []):
+            commented.update(marker.findall(comment['comment']))
+        if post['user'] in authors:
+            by_author.setdefault(post['user'], []).append(post)
+    for kind, found in (('posts', posted), ('comments', commented)):
+        for text in expected[kind]:
+            report[kind]['checked'] += 1
+            if found[text] != 1:
+                lost(kind, f"{text} is stored {found[text]} times")
+
+    # only the last like or unlike of a post by each visitor counts
+    likes = {(user, author, text): liked for user, author, text, liked in expected['likes']}
+    for (user, author, text), liked in likes.items():
+        # the screen showed the author and timestamp + content, not the id
+        matches = [post for post in by_author.get(author, [])
+                   if text.endswith(' ' + _squash(post['content']))]
+        if len(matches) != 1:
+            report['likes']['unverified'] += 1
+            continue
+        report['likes']['checked'] += 1
+        if (user in matches[0].get('likes', [])) != liked:
+            lost('likes', f"{user} {'liked' if liked else 'unliked'} post {matches[0]['id']}, "
+                          f"it says otherwise")
+
+    # messages, and the inbox summaries on both sides
+    threads = {}
+    for user, partner, text in expected['messages']:
+        pair = tuple(sorted((user, partner)))
+        if pair not in threads:
+            thread = data.load_conversation(user, partner)
+            ids = [message['id'] for message in thread]
+            if len(set(ids)) != len(ids):
+                lost('messages', f"{user} and {partner} have messages with the same id")
+            for owner, other in (pair, pair[::-1]):
+                summary = data.load_inbox(owner).get(other)
+                if ids and (summary is None or summary['last_id'] != max(ids)):
+                    lost('messages', f"{owner}'s inbox is behind on {other}")
+            threads[pair] = Counter(found for message in thread
+                                    for found in marker.findall(message['message']))
+        report['messages']['checked'] += 1
+        if threads[pair][text] != 1:
+            lost('messages', f"{text} from {user} to {partner} is stored {threads[pair][text]} times")
+
+    # follows live in the follower's user file and the follower index
+    follows = {(user, target): following for user, target, following in expected['follows']}
+    for (user, target), following in follows.items():
+        report['follows']['checked'] += 1
+        try:
+            in_file = target in data.load_user_data(user).get('following', [])
+        except ValueError:
+            lost('follows', f"{user}'s user file can't be read")
+            continue
+        in_index = user in data.load_followers(target)
+        if in_file != following or in_index != following:
+            lost('follows', f"{user} {'followed' if following else 'unfollowed'} {target}, "
+                            f"user file says {in_file}, index says {in_index}")
+
+    bios = {user: bio for user, bio in expected['bios']}
+    for user, bio in bios.items():
+        report['bios']['checked'] += 1
+        try:
+            stored = data.load_user_data(user).get('bio')
+        except ValueError:
+            lost('bios', f"{user}'s user file can't be read")
+            continue
+        if stored != bio:
+            lost('bios', f"{user}'s bio is {stored!r}, not {bio!r}")
+
+    print(json.dumps(report))
+
+def summarize(times):
+    """
+    returns the median, 99th percentile and slowest time in milliseconds.
+    """
+    times = sorted(times)
+    return (times[len(times) // 2] * 1000, times[min(int(len(times) * 0.99), len(times) - 1)] * 1000,
+            times[-1] * 1000)
+
+def main():
+    parser = argparse.ArgumentParser(description='run many sessions at once and check no update was lost')
+    parser.add_argument('--sessions', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=30, help='seconds the sessions keep going')
+    parser.add_argument('--personas', nargs='+', choices=PERSONAS, default=list(PERSONAS),
+                        help='handed out to the sessions in turn')
+    parser.add_argument('--think', type=float, default=0,
+                        help='average seconds a visitor pauses between rounds')
+    parser.add_argument('--data', help='dataset made by gen_dataset.py (default: build one)')
+    parser.add_argument('--users', type=int, default=1000, help='users in the dataset built without --data')
+    parser.add_argument('--backend', choices=['json', 'sqlite'], default='json')
+    parser.add_argument('--zygote', action='store_true', help='start the sessions through zygote.py')
+    parser.add_argument('--server', metavar='HOST:PORT',
+                        help='use a running server.py instead of ptys (--data is its directory)')
+    parser.add_argument('--timeout', type=float, default=30, help='seconds to wait for any screen')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--max-p99', action='append', default=[], metavar='ACTION=MS',
+                        help="fail if the action's p99 is slower than this")
+    parser.add_argument('--max-lost', type=int, default=0, help='lost updates allowed')
+    parser.add_argument('--max-errors', type=int, default=0, help='failed sessions allowed')
+    parser.add_argument('--open', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--check', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.open:
+        open_store()
+        return
+    if args.check:
+        check(json.load(sys.stdin))
+        return
+
+    limits = {}
+    for limit in args.max_p99:
+        action, _, ms = limit.partition('=')
+        if action not in ACTIONS or not ms:
+            parser.error(f"--max-p99 takes ACTION=MS, with ACTION one of {', '.join(ACTIONS)}")
+        limits[action] = float(ms)
+    if args.server and not args.data:
+        parser.error('--server needs --data, the directory the server runs in')
+
+    python = sys.executable
+    workdir = tempfile.mkdtemp(prefix='dreamland-load-')
+    env = dict(os.environ, DREAMLAND_STORAGE=args.backend, PYTHONPATH=HERE, TERM='xterm',
+               DREAMLAND_ZYGOTE=os.path.join(workdir, 'zygote.sock'))
+    zygote = None
+    try:
+        if args.server:
+            data_dir = args.data
+        else:
+            data_dir = os.path.join(workdir, 'data')
+            if args.data:
+                shutil.copytree(args.data, data_dir,
+                                ignore=shutil.ignore_patterns('*.py', '__pycache__', '.git', '*.sock'))
+            else:
+                import gen_dataset
+                gen_dataset.build(data_dir, args.users, args.users * 10, args.users // 2)
+        with open(os.path.join(data_dir, 'dataset.json'), 'r') as f:
+            manifest = json.load(f)
+
+        if args.server:
+            host, _, port = args.server.rpartition(':')
+            connect = lambda: SocketConnection((host or 'localhost', int(port)), args.timeout)
+        else:
+            subprocess.run([python, os.path.abspath(__file__), '--open'], cwd=data_dir, env=env, check=True)
+            command = [python, os.path.join(HERE, 'dreamland.py')]
+            if args.zygote:
+                zygote = subprocess.Popen([python, os.path.join(HERE, 'zygote.py')], cwd=data_dir, env=env,
+                                          stdin=subprocess.DEVNULL, stdout=subprocess.PIPE)
+                zygote.stdout.readline()  # "zygote ready on ..."
+                command = [python, '-S', os.path.join(HERE, 'zygote.py'), '--connect']
+            connect = lambda: PtyConnection(command, data_dir, env, args.timeout)
+
+        results = Results()
+        tag = secrets.token_hex(3)  # tells this run's writing apart from earlier runs'
+        rng = random.Random(args.seed)
+        visitors = [Visitor(number, username, persona, connect, results, manifest, tag, args.think,
+                            args.seed * 1000 + number)
+                    for number, (username, persona)
+                    in enumerate(pick_accounts(manifest, args.personas, args.sessions, rng))]
+        started = time.monotonic()
+        threads = [threading.Thread(target=visitor.run, args=(started + args.duration,))
+                   for visitor in visitors]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+        if zygote:
+            zygote.terminate()
+            zygote.wait()
+            zygote = None
+
+        expected = dict(results.expected, tag=tag)
+        output = subprocess.run([python, os.path.abspath(__file__), '--check'], cwd=data_dir, env=env,
+                                input=json.dumps(expected), stdout=subprocess.PIPE, text=True,
+                                check=True).stdout
+        report = json.loads(output.strip().splitlines()[-1])
+    finally:
+        if zygote:
+            zygote.terminate()
+            zygote.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    mode = f"server {args.server}" if args.server else ('ptys via zygote' if args.zygote else 'ptys')
+    print(f"\n{len(visitors)} sessions for {elapsed:.1f}s on {args.backend} ({mode}), "
+          f"{manifest['users']} users\n")
+    print(f"{'action':<13} {'count':>7} {'per sec':>8} {'p50':>9} {'p99':>9} {'max':>9}")
+    failures = []
+    total = 0
+    for action in ACTIONS:
+        times = results.times.get(action)
+        if not times:
+            continue
+        total += len(times)
+        p50, p99, slowest = summarize(times)
+        print(f"{action:<13} {len(times):>7} {len(times) / elapsed:>8.1f} {p50:>7.1f}ms "
+              f"{p99:>7.1f}ms {slowest:>7.1f}ms")
+        if action in limits and p99 > limits[action]:
+            failures.append(f"{action} p99 {p99:.1f}ms is over {limits[action]:g}ms")
+    print(f"{'all':<13} {total:>7} {total / elapsed:>8.1f}")
+
+    print(f"\n{'lost updates':<13} {'checked':>7} {'lost':>8}")
+    lost = 0
+    for kind in CHECKS:
+        row = report[kind]
+        lost += row['lost']
+        unverified = f"   ({row['unverified']} not found to check)" if row['unverified'] else ''
+        print(f"{kind:<13} {row['checked']:>7} {row['lost']:>8}{unverified}")
+        for example in row['examples']:
+            print(f"    {example}")
+    if lost > args.max_lost:
+        failures.append(f"{lost} lost updates (at most {args.max_lost} allowed)")
+
+    if results.errors:
+        print(f"\n{len(results.errors)} sessions failed")
+        for error in results.errors[:10]:
+            print(f"    {error}")
+    if len(results.errors) > args.max_errors:
+        failures.append(f"{len(results.errors)} sessions failed (at most {args.max_errors} allowed)")
+
+    if failures:
+        print()
+        for failure in failures:
+            print(f"FAILED: {failure}")
+        sys.exit(1)
+    print("\npassed")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+
+#------------------------------------------------------------------------------
+# migrate_timestamps.py
+#------------------------------------------------------------------------------
+# this file rewrites stored 'timestamp' strings as 'ts' epoch seconds (see
+# timestamps.py). dreamland reads both, so this can run at any time, but
+# after it has run nothing has to parse old strings again.
+#
+# only posts.json, messages.json and the post log (which starts out as a
+# copy of posts.json) can hold old strings. they are streamed a record at
+# a time, so a big file never has to fit in memory, and each one is
+# swapped in with filestore.write_atomic_stream while its lock is held.
+# the sqlite engine converts them as it imports the json files, so with
+# it this only opens the database.
+#
+#   python3 migrate_timestamps.py
+#------------------------------------------------------------------------------
+
+import os
+import json
+import argparse
+
+from config import STORAGE_BACKEND
+from filestore import locked, read_records, encode_record, write_atomic_stream
+import timestamps
+import postlog
+
+# how much of a legacy json file is read at a time
+CHUNK_SIZE = 1 << 20
+
+def _iter_json(f, opening):
+    """
+    yields the items of a json array (opening '[') or the (key, value)
+    pairs of a json object (opening '{') from an open text file, reading
+    it in chunks.
+    """
+    decoder = json.JSONDecoder()
+    buf = f.read(CHUNK_SIZE).lstrip()
+    if not buf.startswith(opening):
+        raise ValueError(f"expected a json {'array' if opening == '[' else 'object'}")
+    pos = 1
+    closing = ']' if opening == '[' else '}'
+    eof = False
+
+    def decode():
+        # one value from buf at pos, reading more of the file as needed
+        nonlocal buf, pos, eof
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n,:':
+                pos += 1
+            if pos < len(buf) and buf[pos] == closing:
+                return closing, None
+            try:
+                value, pos = decoder.raw_decode(buf, pos)
+                return None, value
+            except ValueError:
+                if eof:
+                    raise
+                more = f.read(CHUNK_SIZE)
+                eof = not more
+                buf, pos = buf[pos:] + more, 0
+
+    while True:
+        end, value = decode()
+        if end:
+            return
+        if opening == '[':
+            yield value
+        else:
+            end, item = decode()
+            yield value, item
+
+def _upgrade_json_file(path, opening, upgrade):
+    """
+    streams a legacy json file through upgrade, item by item.
+    """
+    if not os.path.exists(path):
+        return
+    with locked(path):
+        with open(path, 'r') as f:
+            def lines():
+                yield (opening + '\n').encode('utf-8')
+                for index, item in enumerate(_iter_json(f, opening)):
+                    if opening == '[':
+                        text = json.dumps(upgrade(item))
+                    else:
+                        text = f"{json.dumps(item[0])}: {json.dumps(upgrade(item[1]))}"
+                    yield ((',\n' if index else '') + text).encode('utf-8')
+                yield ('\n' + (']' if opening == '[' else '}') + '\n').encode('utf-8')
+            write_atomic_stream(path, lines())
+    print(f"upgraded {path}")
+
+def _upgrade_partners(partners):
+    """
+    upgrades one user's entry in messages.json.
+    """
+    for msgs in partners.values():
+        for msg in msgs:
+            timestamps.upgrade(msg)
+    return partners
+
+def _upgrade_log(path, upgrade):
+    """
+    streams a json lines file through upgrade, record by record.
+    """
+    with locked(path):
+        with open(path, 'rb') as f:
+            write_atomic_stream(path, (encode_record(upgrade(record)) for offset, end, record in read_records(f)))
+
+def _upgrade_post_record(record):
+    """
+    upgrades one posts.log record.
+    """
+    if record['op'] == 'put':
+        timestamps.upgrade_post(record['post'])
+    elif record['op'] == 'comment':
+        timestamps.upgrade(record['comment'])
+    return record
+
+def migrate_json():
+    """
+    upgrades the json engine's files that can hold 'timestamp' strings.
+    """
+    _upgrade_json_file('posts.json', '[', timestamps.upgrade_post)
+    _upgrade_json_file('messages.json', '{', _upgrade_partners)
+    if os.path.exists(postlog.LOG_PATH):
+        _upgrade_log(postlog.LOG_PATH, _upgrade_post_record)
+        print(f"upgraded {postlog.LOG_PATH}")
+
+def main():
+    parser = argparse.ArgumentParser(description="rewrite stored 'timestamp' strings as epoch seconds")
+    parser.parse_args()
+    if STORAGE_BACKEND == 'sqlite':
+        import sqlite_store
+        sqlite_store._db()
+        print("sqlite database is up to date")
+    else:
+        migrate_json()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+#------------------------------------------------------------------------------
+# notification_log.py
+#------------------------------------------------------------------------------
+# this file stores notifications for the json storage engine.
+# every user has two files in notifications/:
+#
+#   <username>.log   one line per notification, appended by other sessions
+#   <username>.meta  {"unread": 3, "read_offset": 1024, "generation": 0}
+#
+# sending a notification appends a line and bumps the unread counter, so it
+# never touches the recipient's user file. the owner reads everything after
+# read_offset and then moves the cursor past what they saw. once enough has
+# been read, the log is cut down to the unread tail and the generation goes
+# up, so a cursor handed out before that is ignored.
+#------------------------------------------------------------------------------
+
+import os
+import json
+
+from filestore import locked, append_records, read_records, write_atomic
+
+NOTIFICATION_DIR = 'notifications'
+
+# the log is rewritten without its read part once that part is this big
+COMPACT_BYTES = 64 * 1024
+
+def _path(username):
+    """
+    returns the path of a user's notification log.
+    """
+    return os.path.join(NOTIFICATION_DIR, f'{username}.log')
+
+def _meta_path(username):
+    """
+    returns the path of the file holding a user's counter and read cursor.
+    """
+    return os.path.join(NOTIFICATION_DIR, f'{username}.meta')
+
+def exists(username):
+    """
+    checks whether a user's notification store has been set up yet.
+    """
+    return os.path.exists(_meta_path(username))
+
+def _read_meta(username):
+    """
+    returns a user's {'unread': n, 'read_offset': b, 'generation': g}.
+    """
+    try:
+        with open(_meta_path(username), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'unread': 0, 'read_offset': 0, 'generation': 0}
+
+def _write_meta(username, meta):
+    """
+    replaces a user's counter and cursor. the caller must hold the lock.
+    """
+    write_atomic(_meta_path(username), json.dumps(meta).encode('utf-8'))
+
+def lock(username):
+    """
+    returns the lock for a user's notification files.
+    """
+    os.makedirs(NOTIFICATION_DIR, exist_ok=True)
+    return locked(_path(username))
+
+def create(username, notifications):
+    """
+    sets up a user's store holding the given unread notifications.
+    the caller must hold the lock.
+    """
+    if notifications:
+        append_records(_path(username), notifications)
+    _write_meta(username, {'unread': len(notifications), 'read_offset': 0, 'generation': 0})
+
+def append(username, notifications):
+    """
+    adds notifications to a user's log and counts them as unread.
+    """
+    with lock(username):
+        meta = _read_meta(username)
+        append_records(_path(username), notifications)
+        meta['unread'] += len(notifications)
+        _write_meta(username, meta)
+
+def unread_count(username):
+    """
+    returns how many notifications a user hasn't seen yet.
+    """
+    return _read_meta(username)['unread']
+
+def read_unread(username):
+    """
+    returns (notifications, cursor) for everything after the read cursor.
+    pass the cursor to mark_read once they have been shown. the lock keeps
+    a compaction from swapping the log between reading meta and the log.
+    """
+    notifications = []
+    with lock(username):
+        meta = _read_meta(username)
+        end = meta['read_offset']
+        try:
+            with open(_path(username), 'rb') as f:
+                for offset, end, notification in read_records(f, meta['read_offset']):
+                    notifications.append(notification)
+        except FileNotFoundError:
+            pass
+    return notifications, (meta['generation'], end)
+
+def mark_read(username, cursor):
+    """
+    moves the read cursor past the notifications returned with cursor.
+    """
+    generation, end = cursor
+    with lock(username):
+        meta = _read_meta(username)
+        if generation != meta['generation'] or end <= meta['read_offset']:
+            return
+        with open(_path(username), 'rb') as f:
+            # count what is newly read here, another session may have
+            # already moved the cursor part of the way
+            seen = 0
+            for offset, record_end, notification in read_records(f, meta['read_offset']):
+                if record_end > end:
+                    break
+                seen += 1
+            meta['unread'] = max(0, meta['unread'] - seen)
+            meta['read_offset'] = end
+            if end >= COMPACT_BYTES:
+                f.seek(end)
+                write_atomic(_path(username), f.read())
+                meta['read_offset'] = 0
+                meta['generation'] += 1
+        _write_meta(username, meta)
@@ -2,7 +2,7 @@
 # notifications.py
 #------------------------------------------------------------------------------
 # this file handles displaying notifications to the user.
-# users can view their notifications and then they are cleared.
+# users can view their new notifications, which are then marked as seen.
 #------------------------------------------------------------------------------
 
 from helpers import (
@@ -10,29 +10,26 @@ from helpers import (
     show_header,
     show_footer,
     format_text,
-    current_screen,
-    current_user,
 )
-from data import load_user_data, save_user_data
+from data import load_new_notifications, mark_notifications_read
+from notify import describe
 
-def notifications_screen():
+def notifications_screen(session):
     """
     displays the user's notifications.
-    after viewing, notifications are cleared.
+    after viewing, notifications are marked as seen.
     """
-    clear_screen()
-    show_header(current_user[0])
-    print(format_text("notifications\n"))
-    user_data = load_user_data(current_user[0])
-    notifications = user_data.get('notifications', [])
+    clear_screen(session)
+    show_header(session)
+    session.io.print(format_text("notifications\n"))
+    notifications, cursor = load_new_notifications(session.user)
     if not notifications:
-        print(format_text("no new notifications."))
+        session.io.print(format_text("no new notifications."))
     else:
-        for idx, note in enumerate(notifications, start=1):
-            print(format_text(f"{idx}. {note}"))
-        # clear notifications after viewing
-        user_data['notifications'] = []
-        save_user_data(current_user[0], user_data)
-    show_footer()
-    input(format_text("press enter to continue..."))
-    current_screen[0] = "main_menu"
+        for idx, note in enumerate(describe(notifications), start=1):
+            session.io.print(format_text(f"{idx}. {note}"))
+        # mark them as seen after viewing
+        mark_notifications_read(session.user, cursor)
+    show_footer(session)
+    session.io.input(format_text("press enter to continue..."))
+    session.screen = "main_menu"
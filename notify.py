@@ -0,0 +1,162 @@
+#------------------------------------------------------------------------------
+# notify.py
+#------------------------------------------------------------------------------
+# this file turns actions (likes, comments, follows, ...) into notifications.
+# a notification is an event:
+#
+#   {"kind": "like", "actors": ["mia", "sam"], "post": 12, "count": 2, "ts": 1729171532}
+#
+# events are not written as they happen. they wait in a buffer where events
+# of the same kind on the same post are folded together, and the buffer is
+# written in batches, one append per recipient. when notifications are shown,
+# events are folded again, so a popular post reads "mia and 41 others liked
+# your post" instead of forty-two lines.
+#------------------------------------------------------------------------------
+
+import time
+import atexit
+import threading
+
+from config import NOTIFY_BATCH_SIZE, NOTIFY_BATCH_SECONDS
+from data import save_notification_batch, get_post
+from session import on_idle
+import timestamps
+
+# what each kind of event says, for one action and for several
+KINDS = {
+    'like': ("liked your post", "liked your post"),
+    'comment': ("commented on your post", "commented on your post"),
+    'repost': ("reposted your post", "reposted your post"),
+    'quote': ("quoted your post", "quoted your post"),
+    'follow': ("started following you", "started following you"),
+    'message': ("sent you a message", "sent you messages"),
+}
+
+# how much of a post is shown next to a notification about it
+PREVIEW_LENGTH = 30
+
+_pending = {}      # (recipient, kind, post id) -> event waiting to be written
+_pending_count = 0
+_oldest = None     # when the oldest waiting event was added
+_mutex = threading.Lock()
+
+def notify(recipient, kind, actor, post_id=None):
+    """
+    queues a notification that actor did kind (to recipient's post_id).
+    nothing is queued when people act on their own posts.
+    """
+    global _pending_count, _oldest
+    if recipient == actor:
+        return
+    now = time.monotonic()
+    with _mutex:
+        event = _pending.get((recipient, kind, post_id))
+        if event is None:
+            event = _pending[(recipient, kind, post_id)] = {
+                'kind': kind, 'actors': [], 'post': post_id, 'count': 0}
+        if actor in event['actors']:
+            event['actors'].remove(actor)
+        event['actors'].insert(0, actor)  # most recent first
+        event['count'] += 1
+        event['ts'] = timestamps.now()
+        _pending_count += 1
+        if _oldest is None:
+            _oldest = now
+        due = _pending_count >= NOTIFY_BATCH_SIZE or now - _oldest >= NOTIFY_BATCH_SECONDS
+    if due:
+        flush()
+
+def retract(recipient, kind, actor, post_id=None):
+    """
+    takes back a queued notification that hasn't been written yet,
+    e.g. a like that was undone straight away.
+    """
+    global _pending_count, _oldest
+    with _mutex:
+        event = _pending.get((recipient, kind, post_id))
+        if event is not None and actor in event['actors']:
+            event['actors'].remove(actor)
+            event['count'] -= 1
+            _pending_count -= 1
+            if not event['actors']:
+                del _pending[(recipient, kind, post_id)]
+            if not _pending:
+                _oldest = None
+
+def flush():
+    """
+    writes every queued event, one batch per recipient.
+    """
+    global _pending, _pending_count, _oldest
+    with _mutex:
+        pending, _pending = _pending, {}
+        _pending_count = 0
+        _oldest = None
+    batches = {}
+    for (recipient, kind, post_id), event in pending.items():
+        batches.setdefault(recipient, []).append(event)
+    for recipient, events in batches.items():
+        save_notification_batch(recipient, events)
+
+def flush_due():
+    """
+    writes the queued events if the oldest has waited NOTIFY_BATCH_SECONDS.
+    runs while sessions wait for input, since notify() alone only checks
+    the age when the next event comes in.
+    """
+    with _mutex:
+        due = _oldest is not None and time.monotonic() - _oldest >= NOTIFY_BATCH_SECONDS
+    if due:
+        flush()
+
+atexit.register(flush)
+on_idle(flush_due)
+
+def _actors_text(actors):
+    """
+    names the people behind an event: "mia", "mia and sam",
+    "mia and 41 others".
+    """
+    if len(actors) == 1:
+        return actors[0]
+    if len(actors) == 2:
+        return f"{actors[0]} and {actors[1]}"
+    return f"{actors[0]} and {len(actors) - 1} others"
+
+def describe(notifications):
+    """
+    turns stored notifications into lines to show, newest first.
+    events of the same kind on the same post are folded into one line.
+    plain text notifications from older versions are shown as they are.
+    """
+    groups = {}  # (kind, post id) -> [actors, count]
+    lines = []   # (key or text) in the order they are shown
+    for notification in reversed(notifications):
+        if not isinstance(notification, dict):
+            lines.append(str(notification))
+            continue
+        key = (notification['kind'], notification.get('post'))
+        if key not in groups:
+            groups[key] = [[], 0]
+            lines.append(key)
+        actors, count = groups[key]
+        actors.extend(actor for actor in notification['actors'] if actor not in actors)
+        groups[key][1] = count + notification.get('count', 1)
+    text = []
+    for line in lines:
+        if isinstance(line, str):
+            text.append(line)
+            continue
+        kind, post_id = line
+        actors, count = groups[line]
+        one, many = KINDS.get(kind, (kind, kind))
+        sentence = f"{_actors_text(actors)} {one if count == 1 else many}"
+        if post_id is not None:
+            post = get_post(post_id)
+            if post is not None:
+                preview = post['content'].replace('\n', ' ')
+                if len(preview) > PREVIEW_LENGTH:
+                    preview = preview[:PREVIEW_LENGTH] + '...'
+                sentence += f': "{preview}"'
+        text.append(sentence + '.')
+    return text
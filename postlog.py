@@ -0,0 +1,369 @@
+#------------------------------------------------------------------------------
+# postlog.py
+#------------------------------------------------------------------------------
+# this file is the post store used by the json storage engine.
+# instead of rewriting posts.json on every action, posts and changes to them
+# are appended as single lines to posts.log:
+#
+#   {"op": "put", "post": {...}}                 a whole post (new or snapshot)
+#   {"op": "like", "id": 3, "user": "mia"}       a like
+#   {"op": "unlike", "id": 3, "user": "mia"}     an unlike
+#   {"op": "comment", "id": 3, "comment": {...}} a new comment
+#   {"op": "edit", "id": 3, "content": "..."}    new post content
+#   {"op": "delete", "id": 3}                    a deleted post
+#
+# every process keeps an index from post id to the offsets of that post's
+# records, so reading one post is a few seeks. the index is caught up by
+# reading only the bytes other processes appended since the last look.
+# compaction folds each post's records back into a single snapshot.
+# the scan also keeps a per-author list of post ids in posting order, so a
+# profile only ever reads that author's posts.
+#
+# post ids come from posts.seq, a counter that only ever goes up, so ids are
+# never reused even after the newest post is deleted and the log compacted.
+#
+# building the index means reading the whole log, which a new process (every
+# gotty connection) would otherwise do before its first screen. so the index
+# is saved now and then to posts.idx, along with how far into the log it
+# goes and which log it was made from. a new process loads that and only
+# reads what was appended after it. a checkpoint that doesn't match the log
+# (compacted, replaced or migrated since) is ignored.
+#------------------------------------------------------------------------------
+
+import os
+import sys
+import json
+import marshal
+import hashlib
+import threading
+
+from filestore import locked, append_records, read_records, encode_record, write_atomic, reopen_after_fork
+import timestamps
+
+LOG_PATH = 'posts.log'
+SEQ_PATH = 'posts.seq'
+INDEX_PATH = 'posts.idx'
+
+# save the index again once this many bytes (and at least a twentieth of
+# the log) were read past the last checkpoint
+CHECKPOINT_MIN_BYTES = 1 << 20
+
+# a checkpoint is only loaded by the python it was written with
+# (marshal's format can change between versions)
+CHECKPOINT_FORMAT = (1, marshal.version, sys.version_info[:2])
+
+# how much of the log before the checkpoint's end is hashed, to tell a
+# recompacted log that happens to reuse the old inode from the original
+CHECKPOINT_TAIL = 4096
+
+# compact once the log holds this many records that aren't live snapshots
+# (and at least as many as there are live posts)
+COMPACT_MIN_GARBAGE = 1000
+
+_index = {}       # post id -> offsets of the records that make up the post
+_authors = {}     # post id -> (author, ts)
+_by_author = {}   # username -> ids of their live posts, oldest first
+_scanned = 0      # how far into the log this process has read
+_records = 0      # how many records the scanned part of the log holds
+_max_id = 0       # highest post id ever seen in the log
+_reader = None    # open handle on the log, used for seeks
+_checkpointed = 0 # how far into the log the last loaded or saved checkpoint goes
+_mutex = threading.RLock()
+
+def _migrate():
+    """
+    creates posts.log, starting from posts.json if there is one.
+    this takes its own lock since it can run while the log lock is held.
+    """
+    with locked('posts.json'):
+        if os.path.exists(LOG_PATH):
+            return
+        posts = []
+        if os.path.exists('posts.json'):
+            with open('posts.json', 'r') as f:
+                posts = json.load(f)
+        write_atomic(LOG_PATH, b''.join(encode_record({'op': 'put', 'post': p}) for p in posts))
+
+def _reset():
+    """
+    forgets the index so the next sync reads the log from the start.
+    """
+    global _scanned, _records, _max_id, _reader, _checkpointed
+    _index.clear()
+    _authors.clear()
+    _by_author.clear()
+    _scanned = 0
+    _records = 0
+    _max_id = 0
+    _checkpointed = 0
+    if _reader is not None:
+        _reader.close()
+        _reader = None
+
+def _index_record(offset, record):
+    """
+    updates the index with one record found at offset.
+    """
+    global _max_id
+    op = record['op']
+    if op == 'put':
+        post_id = record['post']['id']
+        if post_id not in _index:
+            author = record['post']['user']
+            _authors[post_id] = (author, timestamps.of(record['post']))
+            _by_author.setdefault(author, []).append(post_id)
+        _index[post_id] = [offset]
+        _max_id = max(_max_id, post_id)
+    elif op == 'delete':
+        if _index.pop(record['id'], None) is not None:
+            _by_author[_authors.pop(record['id'])[0]].remove(record['id'])
+    elif record['id'] in _index:
+        _index[record['id']].append(offset)
+
+def _after_fork():
+    """
+    swaps the log handle inherited from a zygote parent for the child's own.
+    """
+    global _reader
+    _reader = reopen_after_fork(LOG_PATH, _reader, _reset)
+
+os.register_at_fork(after_in_child=_after_fork)
+
+def sync():
+    """
+    catches the index up with whatever was appended to the log.
+    if the log was compacted by another process, it is re-read from the start.
+    """
+    global _scanned, _records, _reader
+    with _mutex:
+        if not os.path.exists(LOG_PATH):
+            _migrate()
+        if _reader is not None and os.stat(LOG_PATH).st_ino != os.fstat(_reader.fileno()).st_ino:
+            _reset()
+        if _reader is None:
+            _reader = open(LOG_PATH, 'rb')
+            if _scanned == 0:
+                _load_checkpoint()
+        for offset, end, record in read_records(_reader, _scanned):
+            _index_record(offset, record)
+            _scanned = end
+            _records += 1
+        if _scanned - _checkpointed >= max(CHECKPOINT_MIN_BYTES, _scanned // 20):
+            _save_checkpoint()
+
+def _tail_digest(end):
+    """
+    hashes the CHECKPOINT_TAIL bytes of the log before end.
+    """
+    start = max(end - CHECKPOINT_TAIL, 0)
+    _reader.seek(start)
+    return hashlib.sha1(_reader.read(end - start)).digest()
+
+def _save_checkpoint():
+    """
+    writes the index to INDEX_PATH for the next process to start from.
+    the caller holds _mutex.
+    """
+    global _checkpointed
+    state = (CHECKPOINT_FORMAT, os.fstat(_reader.fileno()).st_ino, _scanned, _tail_digest(_scanned),
+             _records, _max_id, _index, _authors, _by_author)
+    try:
+        write_atomic(INDEX_PATH, marshal.dumps(state))
+    except OSError:
+        return  # the checkpoint is only a shortcut
+    _checkpointed = _scanned
+
+def _load_checkpoint():
+    """
+    starts the index from INDEX_PATH if it was made from the open log.
+    the caller holds _mutex and has just opened _reader.
+    """
+    global _index, _authors, _by_author, _scanned, _records, _max_id, _checkpointed
+    try:
+        # one read, then loads: marshal.load on the file reads in tiny pieces
+        with open(INDEX_PATH, 'rb') as f:
+            (version, inode, scanned, digest,
+             records, max_id, index, authors, by_author) = marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return
+    log = os.fstat(_reader.fileno())
+    if version != CHECKPOINT_FORMAT or inode != log.st_ino or scanned > log.st_size:
+        return
+    if digest != _tail_digest(scanned):
+        return
+    _index, _authors, _by_author = index, authors, by_author
+    _scanned = _checkpointed = scanned
+    _records = records
+    _max_id = max_id
+
+def _fold(post, record):
+    """
+    applies one record to a post and returns the result.
+    posts and comments written with a 'timestamp' string get a 'ts'.
+    """
+    op = record['op']
+    if op == 'put':
+        return timestamps.upgrade_post(record['post'])
+    if op == 'like':
+        likes = post.setdefault('likes', [])
+        if record['user'] not in likes:
+            likes.append(record['user'])
+    elif op == 'unlike':
+        likes = post.setdefault('likes', [])
+        if record['user'] in likes:
+            likes.remove(record['user'])
+    elif op == 'comment':
+        post.setdefault('comments', []).append(timestamps.upgrade(record['comment']))
+    elif op == 'edit':
+        post['content'] = record['content']
+    return post
+
+def get(post_id):
+    """
+    returns one post by id, or None if it doesn't exist.
+    """
+    with _mutex:
+        sync()
+        offsets = _index.get(post_id)
+        if offsets is None:
+            return None
+        post = None
+        for offset in offsets:
+            _reader.seek(offset)
+            post = _fold(post, json.loads(_reader.readline()))
+        return post
+
+def count_by_author(username):
+    """
+    returns how many live posts a user has.
+    """
+    with _mutex:
+        sync()
+        return len(_by_author.get(username, []))
+
+def author_ids(username):
+    """
+    returns the ids of a user's live posts, oldest first.
+    """
+    with _mutex:
+        sync()
+        return list(_by_author.get(username, []))
+
+def author_keys(username):
+    """
+    returns (ts, id) for each of a user's live posts, oldest first.
+    this is what the merged feed sorts on, without reading any posts.
+    """
+    with _mutex:
+        sync()
+        return sorted((_authors[post_id][1], post_id) for post_id in _by_author.get(username, []))
+
+def load_by_author(username, start=0, count=10):
+    """
+    returns a page of a user's posts, newest first.
+    start counts from the newest post (0 is the newest).
+    """
+    with _mutex:
+        sync()
+        ids = _by_author.get(username, [])
+        end = len(ids) - start
+        page = ids[max(end - count, 0):max(end, 0)]
+        return [get(post_id) for post_id in reversed(page)]
+
+def load_all():
+    """
+    returns every live post, oldest first, by reading the log once.
+    """
+    with _mutex:
+        sync()
+        posts = {}
+        for offset, end, record in read_records(_reader):
+            if end > _scanned:
+                break
+            post_id = record['post']['id'] if record['op'] == 'put' else record['id']
+            if record['op'] == 'delete':
+                posts.pop(post_id, None)
+            elif record['op'] == 'put' or post_id in posts:
+                posts[post_id] = _fold(posts.get(post_id), record)
+        return [post for post_id, post in posts.items() if post_id in _index]
+
+def allocate_id():
+    """
+    hands out the next post id.
+    the counter is written to disk (and synced) before the id is returned,
+    so a crash can leave a gap but never hand out the same id twice.
+    """
+    with _mutex:
+        with locked(SEQ_PATH):
+            sync()
+            last_id = _max_id
+            if os.path.exists(SEQ_PATH):
+                with open(SEQ_PATH, 'r') as f:
+                    last_id = max(last_id, int(f.read().strip() or 0))
+            write_atomic(SEQ_PATH, f"{last_id + 1}\n".encode('utf-8'))
+            return last_id + 1
+
+def _append_locked(records):
+    """
+    appends records and indexes them. the caller holds the lock.
+    """
+    append_records(LOG_PATH, records)
+    sync()
+    if _records - len(_index) > max(COMPACT_MIN_GARBAGE, len(_index)):
+        _compact_locked()
+
+def append(records):
+    """
+    appends records to the log in one write.
+    new posts without an id get one from allocate_id.
+    """
+    with _mutex:
+        for record in records:
+            if record['op'] == 'put' and 'id' not in record['post']:
+                record['post']['id'] = allocate_id()
+        with locked(LOG_PATH):
+            _append_locked(records)
+
+def update(post_id, fn):
+    """
+    reads a post, lets fn change it in place, and appends the result as a
+    new snapshot, all while holding the lock so no other change slips in.
+    returns the updated post, or None if it doesn't exist.
+    """
+    with _mutex:
+        with locked(LOG_PATH):
+            post = get(post_id)
+            if post is None:
+                return None
+            fn(post)
+            post['id'] = post_id
+            _append_locked([{'op': 'put', 'post': post}])
+            return post
+
+def _compact_locked():
+    """
+    rewrites the log as one snapshot per live post. the caller holds the lock.
+    """
+    posts = load_all()
+    write_atomic(LOG_PATH, b''.join(encode_record({'op': 'put', 'post': p}) for p in posts))
+    _reset()
+    sync()
+
+def compact():
+    """
+    folds likes, comments, edits and deletes into per-post snapshots.
+    """
+    with _mutex:
+        with locked(LOG_PATH):
+            sync()
+            _compact_locked()
+
+def replace_all(posts):
+    """
+    replaces the whole store with the given list of posts.
+    """
+    with _mutex:
+        with locked(LOG_PATH):
+            write_atomic(LOG_PATH, b''.join(encode_record({'op': 'put', 'post': p}) for p in posts))
+            _reset()
+            sync()
@@ -0,0 +1,45 @@
+#------------------------------------------------------------------------------
+# profile_cache.py
+#------------------------------------------------------------------------------
+# this file keeps a small in-memory cache of profile summaries (display name,
+# bio and pronouns), which is all that most screens need to show next to a
+# username. it saves opening and parsing a whole user file per name shown.
+# entries expire after a while so edits made in other sessions show up,
+# and saving a user's data refreshes their entry right away.
+#------------------------------------------------------------------------------
+
+import time
+
+from config import PROFILE_CACHE_SECONDS
+
+PROFILE_FIELDS = ('display_name', 'bio', 'pronouns')
+
+_entries = {}  # username -> (time cached, summary dict)
+
+def summarize(user_data):
+    """
+    picks the profile fields out of a user's data.
+    """
+    return {field: user_data[field] for field in PROFILE_FIELDS if field in user_data}
+
+def lookup(usernames):
+    """
+    returns (found, missing): the cached summaries that are still fresh,
+    and the usernames that have to be loaded.
+    """
+    now = time.monotonic()
+    found = {}
+    missing = []
+    for username in usernames:
+        entry = _entries.get(username)
+        if entry is not None and now - entry[0] < PROFILE_CACHE_SECONDS:
+            found[username] = entry[1]
+        elif username not in missing:
+            missing.append(username)
+    return found, missing
+
+def store(username, summary):
+    """
+    caches a user's profile summary.
+    """
+    _entries[username] = (time.monotonic(), summary)
@@ -0,0 +1,171 @@
+#------------------------------------------------------------------------------
+# server.py
+#------------------------------------------------------------------------------
+# this file hosts many dreamland sessions in a single process.
+# instead of gotty starting a new python for every visitor, one asyncio
+# server accepts plain tcp connections (telnet style, one line at a time)
+# and runs the normal screens for each of them. all sessions share the
+# same in-memory indexes and caches (post index, user directory, profile
+# summaries, ...), so a visitor costs a socket and a thread, not a whole
+# interpreter with its own copy of everything.
+#
+# asyncio does all of the network work. the screens are ordinary blocking
+# code, so each session runs them on its own thread, talking to its
+# connection through a SocketIO channel.
+#
+#   python3 server.py --port 2323                # start the server
+#   python3 server.py --connect localhost:2323   # talk to it
+#------------------------------------------------------------------------------
+
+import sys
+import asyncio
+import argparse
+import threading
+from collections import deque
+
+import dreamland
+import notify
+from session import Session, Channel
+
+class SocketIO(Channel):
+    """
+    a session's channel over a network connection. lines arrive from the
+    event loop with feed(); writes are handed back to the event loop, so
+    both work from the session's thread.
+    """
+    def __init__(self, loop, writer):
+        super().__init__()
+        self._loop = loop
+        self._writer = writer
+        self._lines = deque()
+        self._closed = False
+        self._ready = threading.Condition()
+
+    def feed(self, line):
+        with self._ready:
+            self._lines.append(line)
+            self._ready.notify()
+
+    def close(self):
+        with self._ready:
+            self._closed = True
+            self._ready.notify()
+
+    def send(self, text):
+        data = text.replace('\n', '\r\n').encode('utf-8')
+        self._loop.call_soon_threadsafe(self._writer.write, data)
+
+    def ready(self, timeout):
+        with self._ready:
+            return self._ready.wait_for(lambda: self._lines or self._closed, timeout)
+
+    def receive(self):
+        with self._ready:
+            self._ready.wait_for(lambda: self._lines or self._closed)
+            if not self._lines:
+                raise EOFError
+            return self._lines.popleft()
+
+def _run_session(io):
+    """
+    runs the screens for one session until its client goes away.
+    """
+    try:
+        dreamland.run(Session(io))
+    except (EOFError, ConnectionError):
+        pass
+    finally:
+        notify.flush()
+
+async def handle_client(reader, writer):
+    """
+    serves one connection: feeds its lines to a session thread and
+    waits for either side to finish.
+    """
+    loop = asyncio.get_running_loop()
+    io = SocketIO(loop, writer)
+    finished = loop.create_future()
+
+    def session():
+        try:
+            _run_session(io)
+        finally:
+            loop.call_soon_threadsafe(finished.set_result, None)
+
+    threading.Thread(target=session, daemon=True).start()
+
+    async def pump():
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            io.feed(line.decode('utf-8', errors='replace').rstrip('\r\n'))
+
+    pumping = asyncio.ensure_future(pump())
+    await asyncio.wait({pumping, finished}, return_when=asyncio.FIRST_COMPLETED)
+    io.close()
+    await finished
+    pumping.cancel()
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except ConnectionError:
+        pass
+
+async def serve(host, port):
+    """
+    accepts connections until the process is stopped.
+    """
+    server = await asyncio.start_server(handle_client, host, port)
+    print(f"dreamland is listening on {host}:{port}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+async def connect(host, port):
+    """
+    a bare-bones client: shows what the server sends and sends what is typed.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    loop = asyncio.get_running_loop()
+
+    async def show():
+        while True:
+            data = await reader.read(4096)
+            if not data:
+                return
+            sys.stdout.write(data.decode('utf-8', errors='replace').replace('\r\n', '\n'))
+            sys.stdout.flush()
+
+    async def send():
+        while True:
+            line = await loop.run_in_executor(None, sys.stdin.readline)
+            if not line:
+                return
+            writer.write(line.encode('utf-8'))
+            await writer.drain()
+
+    tasks = {asyncio.ensure_future(show()), asyncio.ensure_future(send())}
+    await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    for task in tasks:
+        task.cancel()
+    writer.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='host many dreamland sessions in one process')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2323)
+    parser.add_argument('--connect', metavar='HOST:PORT', help='connect to a running server instead')
+    args = parser.parse_args()
+
+    if args.connect:
+        host, _, port = args.connect.rpartition(':')
+        asyncio.run(connect(host or '127.0.0.1', int(port)))
+        return
+
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
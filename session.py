@@ -0,0 +1,260 @@
+#------------------------------------------------------------------------------
+# session.py
+#------------------------------------------------------------------------------
+# this file holds the state of one visitor: who they are logged in as, which
+# screen they are on, and the channel their screens talk through. every
+# screen gets the session and uses session.io instead of print() and
+# input(), so one process can run many sessions side by side (server.py)
+# and screens can be driven without a terminal (benchmarks).
+#
+# a channel only has to know how to send text, read a line and wait for
+# input; Channel builds the rest on top of those:
+#
+#   Terminal     the process's own stdin/stdout (the gotty setup)
+#   ScriptedIO   a list of lines to type, for benchmarks and scripts
+#   SocketIO     a network connection (see server.py)
+#------------------------------------------------------------------------------
+
+import os
+import sys
+import select
+import shutil
+from getpass import getpass
+
+from config import DIFF_FRAMES, POLL_SECONDS
+
+# moves to the top left and clears the screen and the scrollback
+CLEAR = '\033[H\033[2J\033[3J'
+
+# called every POLL_SECONDS while a session waits for input, for work that
+# mustn't wait for the next keypress (see on_idle)
+_idle = []
+
+def on_idle(fn):
+    """
+    registers fn to be called every POLL_SECONDS while a session waits
+    for input. notify.py uses it to write events that have waited long
+    enough even when nobody does anything.
+    """
+    _idle.append(fn)
+
+def _run_idle():
+    for fn in _idle:
+        fn()
+
+class Channel:
+    """
+    the i/o a session's screens use. subclasses provide send(), receive()
+    and ready().
+
+    what the screens write is kept in a frame and sent in one piece when
+    the session next waits for input, so a whole screen goes out as a
+    single write (one websocket message under gotty) instead of one per
+    line. clear() starts a new frame and throws away anything not sent yet.
+
+    with diff on, a new frame is compared with the one on screen and only
+    the rows that changed are rewritten, e.g. a like count. this relies on
+    rows not wrapping and the frame fitting on the screen, so it is off
+    unless DREAMLAND_DIFF_FRAMES is set.
+    """
+    rows = 24  # how many rows the screen has, for deciding when to diff
+
+    def __init__(self, diff=DIFF_FRAMES):
+        self.diff = diff
+        self._frame = []       # text waiting to be sent
+        self._clearing = False # whether the waiting text starts a new frame
+        self._screen = None    # complete rows of the frame on screen
+        self._below = 0        # rows used below them since (echoes, messages)
+
+    def send(self, text):
+        """
+        delivers text to the user in one write.
+        """
+        raise NotImplementedError
+
+    def receive(self):
+        """
+        returns the next line the user typed, without the newline.
+        raises EOFError when the user is gone.
+        """
+        raise NotImplementedError
+
+    def ready(self, timeout):
+        """
+        waits up to timeout seconds for a line and returns whether
+        receive() would return without blocking.
+        """
+        raise NotImplementedError
+
+    def write(self, text):
+        """
+        adds text to the frame.
+        """
+        self._frame.append(text)
+
+    def clear(self):
+        """
+        starts a new frame on a clear screen.
+        """
+        self._frame = []
+        self._clearing = True
+
+    def flush(self):
+        """
+        sends the frame written so far.
+        """
+        if not self._frame and not self._clearing:
+            return
+        text = ''.join(self._frame)
+        self._frame = []
+        if self._clearing:
+            self._clearing = False
+            rows = text.split('\n')
+            if (self.diff and self._screen is not None
+                    and len(self._screen) + self._below < self.rows and len(rows) < self.rows):
+                text = _frame_diff(self._screen, rows)
+            else:
+                text = CLEAR + text
+            self._screen = rows[:-1]  # the last row gets the user's typing
+            self._below = 0
+        else:
+            self._below += text.count('\n')
+        self.send(text)
+
+    def readline(self):
+        """
+        sends the frame and returns the next line the user typed.
+        """
+        self.flush()
+        while not self.ready(POLL_SECONDS):
+            _run_idle()
+        line = self.receive()
+        self._below += 1  # the typed line and its newline
+        return line
+
+    def wait(self, timeout):
+        """
+        sends the frame and waits up to timeout seconds for a line.
+        returns whether readline() would return without blocking.
+        """
+        self.flush()
+        if self.ready(timeout):
+            return True
+        _run_idle()
+        return False
+
+    def print(self, *values, sep=' ', end='\n'):
+        """
+        works like print().
+        """
+        self.write(sep.join(str(value) for value in values) + end)
+
+    def input(self, prompt=''):
+        """
+        works like input().
+        """
+        self.write(prompt)
+        return self.readline()
+
+    def password(self, prompt):
+        """
+        asks for a password. only a terminal can hide what is typed.
+        """
+        return self.input(prompt)
+
+def _frame_diff(old, new):
+    """
+    returns what turns the screen showing the rows in old into the frame
+    with the rows in new: the rows that changed are rewritten in place, and
+    everything from the end of the shorter one down is redrawn.
+    """
+    out = []
+    last = len(new) - 1  # the unfinished row the cursor is left on
+    common = min(len(old), last)
+    for row in range(common):
+        if old[row] != new[row]:
+            out.append(f'\033[{row + 1};1H{new[row]}\033[K')
+    out.append(f'\033[{common + 1};1H\033[J')
+    out.append('\n'.join(new[common:]))
+    return ''.join(out)
+
+class Terminal(Channel):
+    """
+    the process's own stdin and stdout.
+    """
+    def __init__(self, stdin=None, stdout=None, diff=DIFF_FRAMES):
+        super().__init__(diff)
+        self.stdin = stdin or sys.stdin
+        self.stdout = stdout or sys.stdout
+        if os.name == 'nt':
+            os.system('')  # switches the windows console to ansi escapes
+
+    def send(self, text):
+        self.rows = shutil.get_terminal_size().lines
+        self.stdout.write(text)
+        self.stdout.flush()
+
+    def receive(self):
+        line = self.stdin.readline()
+        if not line:
+            raise EOFError
+        return line.rstrip('\n')
+
+    def ready(self, timeout):
+        # a pipe or file is read straight away, like input() would.
+        # a terminal hands over one line at a time, so nothing can be left
+        # sitting in stdin's buffer where select wouldn't see it
+        if not self.stdin.isatty():
+            return True
+        return bool(select.select([self.stdin], [], [], timeout)[0])
+
+    def password(self, prompt):
+        if self.stdin.isatty():
+            self.flush()
+            self._below += 1
+            return getpass(prompt)
+        return self.input(prompt)
+
+class ScriptedIO(Channel):
+    """
+    types a fixed list of lines and keeps what the screens print, so
+    screens can be run from benchmarks and scripts.
+    raises EOFError once the lines run out.
+    """
+    def __init__(self, lines, keep_output=True, diff=DIFF_FRAMES):
+        super().__init__(diff)
+        self.lines = list(reversed(lines))
+        self.keep_output = keep_output
+        self.output = []
+        self.written = 0  # characters sent so far
+        self.sends = 0    # how many writes that took
+
+    def send(self, text):
+        self.written += len(text)
+        self.sends += 1
+        if self.keep_output:
+            self.output.append(text)
+
+    def receive(self):
+        if not self.lines:
+            raise EOFError
+        return self.lines.pop()
+
+    def ready(self, timeout):
+        return True
+
+    def text(self):
+        """
+        returns everything printed so far.
+        """
+        return ''.join(self.output)
+
+class Session:
+    """
+    one visitor: the logged-in user (or None), the current screen and the
+    channel the screens use.
+    """
+    def __init__(self, io=None, user=None, screen="splash"):
+        self.io = io or Terminal()
+        self.user = user
+        self.screen = screen
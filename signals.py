@@ -0,0 +1,52 @@
+#------------------------------------------------------------------------------
+# signals.py
+#------------------------------------------------------------------------------
+# this file lets one session tell another that something changed for a user,
+# so open screens can redraw without being asked. every user has a small
+# file per channel:
+#
+#   signals/<username>.messages        bumped when someone sends them a dm
+#   signals/<username>.notifications   bumped when notifications are written
+#
+# a bump appends a single byte, so the file size works as a version number.
+# a waiting screen only has to stat the file now and then to see whether
+# the version moved, which is cheap enough for every gotty process to do.
+# this works the same with either storage engine.
+#------------------------------------------------------------------------------
+
+import os
+
+SIGNAL_DIR = 'signals'
+
+# a signal file is emptied once it grows this big; waiting screens compare
+# versions for equality, so starting over still counts as a change
+MAX_VERSION = 1024 * 1024
+
+def _path(username, channel):
+    """
+    returns the path of a user's signal file for a channel.
+    """
+    return os.path.join(SIGNAL_DIR, f'{username}.{channel}')
+
+def version(username, channel):
+    """
+    returns the current version of a user's channel.
+    """
+    try:
+        return os.stat(_path(username, channel)).st_size
+    except FileNotFoundError:
+        return 0
+
+def bump(username, channel):
+    """
+    tells every session watching a user's channel that it changed.
+    """
+    os.makedirs(SIGNAL_DIR, exist_ok=True)
+    path = _path(username, channel)
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, b'.')
+        if os.fstat(fd).st_size >= MAX_VERSION:
+            os.ftruncate(fd, 0)
+    finally:
+        os.close(fd)
@@ -0,0 +1,1062 @@
+#------------------------------------------------------------------------------
+# sqlite_store.py
+#------------------------------------------------------------------------------
+# this file is the sqlite storage engine.
+# it implements the same functions as data.py on top of a single sqlite
+# database in wal mode, so a like or a comment touches one row instead of
+# rewriting every post on the server.
+# data.py switches to these functions when DREAMLAND_STORAGE=sqlite.
+#------------------------------------------------------------------------------
+
+import os
+import json
+import sqlite3
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from config import SQLITE_PATH, TIMELINE_LENGTH
+import postlog
+import profile_cache
+import directory
+import conversations
+import notification_log
+import signals
+import timestamps
+
+__all__ = [
+    'load_posts',
+    'save_posts',
+    'allocate_post_id',
+    'get_post',
+    'update_post',
+    'load_user_posts',
+    'count_user_posts',
+    'append_post',
+    'record_like',
+    'record_unlike',
+    'record_comment',
+    'record_edit',
+    'record_delete',
+    'compact_posts',
+    'load_user_data',
+    'save_user_data',
+    'update_user_data',
+    'fetch_profiles',
+    'user_exists',
+    'list_usernames',
+    'update_directory',
+    'load_directory_page',
+    'follow_user',
+    'unfollow_user',
+    'load_followers',
+    'load_follow_counts',
+    'load_feed_page',
+    'backfill_timeline',
+    'prune_timeline',
+    'load_feed_cursor',
+    'save_feed_cursor',
+    'iter_author_keys',
+    'send_message',
+    'load_conversation',
+    'load_inbox',
+    'mark_conversation_read',
+    'save_notifications',
+    'save_notification_batch',
+    'count_unread_notifications',
+    'load_new_notifications',
+    'mark_notifications_read',
+]
+
+# how many of an author's post keys iter_author_keys reads at a time
+AUTHOR_KEY_BATCH = 50
+
+# how long a statement waits for another process's write to finish
+BUSY_TIMEOUT_SECONDS = 30
+
+# how long opening the database waits for another process that is still
+# importing the json files; a big install takes minutes
+IMPORT_WAIT_SECONDS = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username      TEXT PRIMARY KEY,
+    password_hash TEXT NOT NULL DEFAULT '',
+    display_name  TEXT NOT NULL DEFAULT '',
+    bio           TEXT NOT NULL DEFAULT '',
+    pronouns      TEXT NOT NULL DEFAULT '',
+    age           TEXT NOT NULL DEFAULT '',
+    created       INTEGER NOT NULL DEFAULT 0,
+    extra         TEXT NOT NULL DEFAULT '{}'
+);
+
+CREATE TABLE IF NOT EXISTS posts (
+    id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    user      TEXT NOT NULL,
+    content   TEXT NOT NULL,
+    ts        INTEGER NOT NULL DEFAULT 0,
+    extra     TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS posts_by_user ON posts (user, id);
+CREATE INDEX IF NOT EXISTS posts_by_user_ts ON posts (user, ts, id);
+
+CREATE TABLE IF NOT EXISTS likes (
+    post_id INTEGER NOT NULL,
+    user    TEXT NOT NULL,
+    PRIMARY KEY (post_id, user)
+);
+
+CREATE TABLE IF NOT EXISTS comments (
+    id        INTEGER PRIMARY KEY,
+    post_id   INTEGER NOT NULL,
+    user      TEXT NOT NULL,
+    comment   TEXT NOT NULL,
+    ts        INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS comments_by_post ON comments (post_id, id);
+
+CREATE TABLE IF NOT EXISTS follows (
+    follower TEXT NOT NULL,
+    followee TEXT NOT NULL,
+    PRIMARY KEY (follower, followee)
+);
+CREATE INDEX IF NOT EXISTS follows_by_followee ON follows (followee, follower);
+
+-- kept in step with follows so profiles can show counts without counting
+CREATE TABLE IF NOT EXISTS follow_counts (
+    username  TEXT PRIMARY KEY,
+    followers INTEGER NOT NULL DEFAULT 0,
+    following INTEGER NOT NULL DEFAULT 0
+);
+
+-- each conversation is stored once under conversations.key(a, b), with
+-- ids counting up from 1 within the conversation
+CREATE TABLE IF NOT EXISTS direct_messages (
+    pair      TEXT NOT NULL,
+    id        INTEGER NOT NULL,
+    sender    TEXT NOT NULL,
+    message   TEXT NOT NULL,
+    ts        INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (pair, id)
+) WITHOUT ROWID;
+
+-- each user's summary of every conversation they have, kept up to date on
+-- send and read so the inbox never reads direct_messages. sending moves the
+-- sender's read_id forward, so last_id - read_id is the unread count
+CREATE TABLE IF NOT EXISTS conversations (
+    owner          TEXT NOT NULL,
+    partner        TEXT NOT NULL,
+    read_id        INTEGER NOT NULL DEFAULT 0,
+    last_id        INTEGER NOT NULL DEFAULT 0,
+    last_sender    TEXT NOT NULL DEFAULT '',
+    last_ts        INTEGER NOT NULL DEFAULT 0,
+    preview        TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (owner, partner)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS timelines (
+    owner     TEXT NOT NULL,
+    post_id   INTEGER NOT NULL,
+    author    TEXT NOT NULL,
+    ts        INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (owner, post_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS timelines_by_author ON timelines (owner, author);
+
+-- users whose timeline has been built; only these get posts fanned out
+CREATE TABLE IF NOT EXISTS timeline_owners (
+    owner TEXT PRIMARY KEY
+);
+
+CREATE TABLE IF NOT EXISTS feed_cursors (
+    owner     TEXT PRIMARY KEY,
+    ts        INTEGER NOT NULL DEFAULT 0,
+    post_id   INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS notifications (
+    id       INTEGER PRIMARY KEY,
+    username TEXT NOT NULL,
+    body     TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS notifications_by_user ON notifications (username, id);
+
+-- how many notifications each user hasn't seen, so the menu doesn't count rows
+CREATE TABLE IF NOT EXISTS notification_counts (
+    username TEXT PRIMARY KEY,
+    unread   INTEGER NOT NULL DEFAULT 0
+);
+
+-- facts about the database itself: 'imported' is set once the json files
+-- have been copied in
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# keys that have their own column or table, everything else goes to 'extra'
+# ('timestamp' is how older posts stored ts)
+POST_KEYS = ('id', 'user', 'content', 'ts', 'timestamp', 'likes', 'comments')
+USER_KEYS = ('password_hash', 'display_name', 'bio', 'pronouns', 'age',
+             'following', 'notifications')
+
+# every thread gets its own connection (sqlite connections can't be shared)
+_local = threading.local()
+
+# nor carried into a forked child (see zygote.py), which opens its own
+os.register_at_fork(after_in_child=lambda: setattr(_local, 'conn', None))
+
+# what the posts looked like when this process last loaded them,
+# so save_posts only writes the posts that actually changed
+_post_fingerprints = {}
+
+def _db():
+    """
+    returns this thread's database connection, opening it on first use.
+    a brand new database is filled from the json files if there are any.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(SQLITE_PATH, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(SCHEMA)
+        _local.conn = conn
+        try:
+            _import_once(conn)
+        except BaseException:
+            _local.conn = None
+            conn.close()
+            raise
+    return conn
+
+def _import_once(conn):
+    """
+    runs import_json unless the database has been filled already. the
+    check and the import share one write transaction, so processes opening
+    the database at the same time wait for the import instead of seeing it
+    half done, and an import that fails is rolled back and tried again on
+    the next start.
+    """
+    imported = "SELECT 1 FROM meta WHERE key = 'imported'"
+    if conn.execute(imported).fetchone():
+        return
+    conn.execute(f'PRAGMA busy_timeout = {IMPORT_WAIT_SECONDS * 1000}')
+    try:
+        with _transaction(conn):
+            if not conn.execute(imported).fetchone():
+                import_json(conn)
+                conn.execute("INSERT INTO meta (key, value) VALUES ('imported', '1')")
+    finally:
+        conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_SECONDS * 1000}')
+
+@contextmanager
+def _transaction(db):
+    """
+    runs a block of statements as one write transaction.
+    """
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        yield db
+    except BaseException:
+        db.execute('ROLLBACK')
+        raise
+    db.execute('COMMIT')
+
+def _extra(data, known_keys):
+    """
+    packs the keys that don't have their own column into a json string.
+    """
+    return json.dumps({k: v for k, v in data.items() if k not in known_keys})
+
+def _fingerprint(post):
+    """
+    a cheap summary of a post used to spot changes between load and save.
+    """
+    return hash(json.dumps(post, sort_keys=True, default=str))
+
+#------------------------------------------------------------------------------
+# posts
+#------------------------------------------------------------------------------
+
+def load_posts():
+    """
+    loads all posts, oldest first, in the same shape as posts.json.
+    """
+    db = _db()
+    likes = defaultdict(list)
+    for post_id, user in db.execute('SELECT post_id, user FROM likes ORDER BY rowid'):
+        likes[post_id].append(user)
+    comments = defaultdict(list)
+    for post_id, user, comment, ts in db.execute(
+            'SELECT post_id, user, comment, ts FROM comments ORDER BY id'):
+        comments[post_id].append({'user': user, 'comment': comment, 'ts': ts})
+
+    posts = []
+    _post_fingerprints.clear()
+    for post_id, user, content, ts, extra in db.execute(
+            'SELECT id, user, content, ts, extra FROM posts ORDER BY id'):
+        post = {
+            'id': post_id,
+            'user': user,
+            'content': content,
+            'likes': likes.get(post_id, []),
+            'comments': comments.get(post_id, []),
+            'ts': ts,
+        }
+        post.update(json.loads(extra))
+        _post_fingerprints[post_id] = _fingerprint(post)
+        posts.append(post)
+    return posts
+
+def _write_post(db, post):
+    """
+    writes one post and brings its likes and comments rows up to date.
+    only the rows that differ from the database are touched.
+    """
+    post_id = post['id']
+    db.execute(
+        'INSERT INTO posts (id, user, content, ts, extra) VALUES (?, ?, ?, ?, ?) '
+        'ON CONFLICT (id) DO UPDATE SET user = excluded.user, content = excluded.content, '
+        'ts = excluded.ts, extra = excluded.extra',
+        (post_id, post['user'], post['content'], timestamps.of(post), _extra(post, POST_KEYS)))
+
+    likes = post.get('likes', [])
+    stored = {row[0] for row in db.execute('SELECT user FROM likes WHERE post_id = ?', (post_id,))}
+    for user in stored - set(likes):
+        db.execute('DELETE FROM likes WHERE post_id = ? AND user = ?', (post_id, user))
+    for user in likes:
+        if user not in stored:
+            db.execute('INSERT OR IGNORE INTO likes (post_id, user) VALUES (?, ?)', (post_id, user))
+
+    # comments are only ever appended, so normally just the new tail is inserted
+    comments = post.get('comments', [])
+    stored_count = db.execute('SELECT COUNT(*) FROM comments WHERE post_id = ?', (post_id,)).fetchone()[0]
+    if len(comments) < stored_count:
+        db.execute('DELETE FROM comments WHERE post_id = ?', (post_id,))
+        stored_count = 0
+    db.executemany(
+        'INSERT INTO comments (post_id, user, comment, ts) VALUES (?, ?, ?, ?)',
+        [(post_id, c['user'], c['comment'], timestamps.of(c)) for c in comments[stored_count:]])
+
+def _delete_post(db, post_id):
+    """
+    removes a post together with its likes and comments.
+    """
+    db.execute('DELETE FROM posts WHERE id = ?', (post_id,))
+    db.execute('DELETE FROM likes WHERE post_id = ?', (post_id,))
+    db.execute('DELETE FROM comments WHERE post_id = ?', (post_id,))
+
+def save_posts(posts):
+    """
+    saves the list of posts.
+    only posts that changed since the last load_posts are written, and posts
+    that were dropped from the list are deleted. posts created by other
+    sessions in the meantime are left alone.
+    """
+    db = _db()
+    seen = set()
+    with _transaction(db):
+        for post in posts:
+            post_id = post['id']
+            seen.add(post_id)
+            fingerprint = _fingerprint(post)
+            if _post_fingerprints.get(post_id) == fingerprint:
+                continue
+            _write_post(db, post)
+            _post_fingerprints[post_id] = fingerprint
+        for post_id in [p for p in _post_fingerprints if p not in seen]:
+            _delete_post(db, post_id)
+            del _post_fingerprints[post_id]
+
+def allocate_post_id():
+    """
+    returns a new post id. ids only ever go up and are never reused.
+    """
+    db = _db()
+    with _transaction(db):
+        row = db.execute("SELECT seq FROM sqlite_sequence WHERE name = 'posts'").fetchone()
+        if row is None:
+            next_id = (db.execute('SELECT MAX(id) FROM posts').fetchone()[0] or 0) + 1
+            db.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('posts', ?)", (next_id,))
+        else:
+            next_id = row[0] + 1
+            db.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'posts'", (next_id,))
+    return next_id
+
+def _load_post(db, post_id):
+    """
+    reads one post with its likes and comments, or None if it doesn't exist.
+    """
+    row = db.execute('SELECT user, content, ts, extra FROM posts WHERE id = ?',
+                     (post_id,)).fetchone()
+    if row is None:
+        return None
+    post = {
+        'id': post_id,
+        'user': row[0],
+        'content': row[1],
+        'likes': [r[0] for r in db.execute(
+            'SELECT user FROM likes WHERE post_id = ? ORDER BY rowid', (post_id,))],
+        'comments': [{'user': r[0], 'comment': r[1], 'ts': r[2]} for r in db.execute(
+            'SELECT user, comment, ts FROM comments WHERE post_id = ? ORDER BY id', (post_id,))],
+        'ts': row[2],
+    }
+    post.update(json.loads(row[3]))
+    return post
+
+def get_post(post_id):
+    """
+    returns a single post by id, or None if it was deleted.
+    """
+    return _load_post(_db(), post_id)
+
+def update_post(post_id, fn):
+    """
+    applies fn to the stored post (fn changes the dict in place) and saves
+    it in the same transaction. returns the updated post, or None if it
+    was deleted.
+    """
+    db = _db()
+    with _transaction(db):
+        post = _load_post(db, post_id)
+        if post is None:
+            return None
+        fn(post)
+        post['id'] = post_id
+        _write_post(db, post)
+    return post
+
+def load_user_posts(username, start=0, count=10):
+    """
+    returns a page of one user's posts, newest first.
+    start counts from their newest post, so start=0 is the first page.
+    """
+    db = _db()
+    rows = db.execute('SELECT id FROM posts WHERE user = ? ORDER BY id DESC LIMIT ? OFFSET ?',
+                      (username, count, start)).fetchall()
+    return [_load_post(db, row[0]) for row in rows]
+
+def count_user_posts(username):
+    """
+    returns how many posts a user has.
+    """
+    return _db().execute('SELECT COUNT(*) FROM posts WHERE user = ?', (username,)).fetchone()[0]
+
+def append_post(post):
+    """
+    adds a new post. if it has no id yet, one is assigned.
+    returns the post's id.
+    """
+    db = _db()
+    with _transaction(db):
+        if 'id' not in post:
+            cursor = db.execute('INSERT INTO posts (user, content, ts) VALUES (?, ?, ?)',
+                                (post['user'], post['content'], timestamps.of(post)))
+            post['id'] = cursor.lastrowid
+        _write_post(db, post)
+        # fan the post out to the author's and their followers' timelines
+        db.execute(
+            'INSERT OR IGNORE INTO timelines (owner, post_id, author, ts) '
+            'SELECT owner, ?, ?, ? FROM timeline_owners WHERE owner = ? '
+            'OR owner IN (SELECT follower FROM follows WHERE followee = ?)',
+            (post['id'], post['user'], timestamps.of(post), post['user'], post['user']))
+    return post['id']
+
+def record_like(post_id, username):
+    """
+    records that a user liked a post.
+    """
+    db = _db()
+    with _transaction(db):
+        db.execute('INSERT OR IGNORE INTO likes (post_id, user) VALUES (?, ?)', (post_id, username))
+
+def record_unlike(post_id, username):
+    """
+    records that a user took back their like.
+    """
+    db = _db()
+    with _transaction(db):
+        db.execute('DELETE FROM likes WHERE post_id = ? AND user = ?', (post_id, username))
+
+def record_comment(post_id, comment):
+    """
+    adds a comment (a dict with user, comment and ts) to a post.
+    """
+    db = _db()
+    with _transaction(db):
+        db.execute('INSERT INTO comments (post_id, user, comment, ts) VALUES (?, ?, ?, ?)',
+                   (post_id, comment['user'], comment['comment'], timestamps.of(comment)))
+
+def record_edit(post_id, content):
+    """
+    replaces the content of a post.
+    """
+    db = _db()
+    with _transaction(db):
+        db.execute('UPDATE posts SET content = ? WHERE id = ?', (content, post_id))
+
+def record_delete(post_id):
+    """
+    deletes a post.
+    """
+    db = _db()
+    with _transaction(db):
+        _delete_post(db, post_id)
+
+def compact_posts():
+    """
+    folds the write-ahead log back into the database file.
+    """
+    _db().execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+#------------------------------------------------------------------------------
+# users
+#------------------------------------------------------------------------------
+
+def load_user_data(username):
+    """
+    loads a user's data in the same shape as their json file.
+    raises FileNotFoundError for unknown users, just like the json engine.
+    """
+    db = _db()
+    row = db.execute(
+        'SELECT password_hash, display_name, bio, pronouns, age, extra FROM users WHERE username = ?',
+        (username,)).fetchone()
+    if row is None:
+        raise FileNotFoundError(f"no such user: {username}")
+    user_data = {
+        'password_hash': row[0],
+        'display_name': row[1],
+        'bio': row[2],
+        'pronouns': row[3],
+        'age': row[4],
+        'following': [r[0] for r in db.execute(
+            'SELECT followee FROM follows WHERE follower = ? ORDER BY rowid', (username,))],
+    }
+    user_data.update(json.loads(row[5]))
+    return user_data
+
+def _save_user_data(db, username, data):
+    """
+    writes a user row plus their follows.
+    """
+    db.execute(
+        'INSERT INTO users (username, password_hash, display_name, bio, pronouns, age, extra) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (username) DO UPDATE SET '
+        'password_hash = excluded.password_hash, display_name = excluded.display_name, '
+        'bio = excluded.bio, pronouns = excluded.pronouns, age = excluded.age, extra = excluded.extra',
+        (username, data.get('password_hash', ''), data.get('display_name', ''), data.get('bio', ''),
+         data.get('pronouns', ''), data.get('age', ''), _extra(data, USER_KEYS)))
+
+    following = data.get('following', [])
+    stored = {r[0] for r in db.execute('SELECT followee FROM follows WHERE follower = ?', (username,))}
+    for followee in stored - set(following):
+        _remove_follow(db, username, followee)
+    for followee in following:
+        if followee not in stored:
+            _add_follow(db, username, followee)
+
+    # notifications left in an old json user file are moved to their own table
+    _add_notifications(db, username, data.get('notifications', []))
+
+def _count_follow(db, follower, followee, delta):
+    """
+    moves the follow counters of both users by delta.
+    """
+    db.executemany('INSERT OR IGNORE INTO follow_counts (username) VALUES (?)',
+                   [(follower,), (followee,)])
+    db.execute('UPDATE follow_counts SET following = following + ? WHERE username = ?',
+               (delta, follower))
+    db.execute('UPDATE follow_counts SET followers = followers + ? WHERE username = ?',
+               (delta, followee))
+
+def _add_follow(db, follower, followee):
+    """
+    adds a follow row and counts it. returns False if it was already there.
+    """
+    cursor = db.execute('INSERT OR IGNORE INTO follows (follower, followee) VALUES (?, ?)',
+                        (follower, followee))
+    if cursor.rowcount == 0:
+        return False
+    _count_follow(db, follower, followee, 1)
+    return True
+
+def _remove_follow(db, follower, followee):
+    """
+    removes a follow row and uncounts it. returns False if it wasn't there.
+    """
+    cursor = db.execute('DELETE FROM follows WHERE follower = ? AND followee = ?',
+                        (follower, followee))
+    if cursor.rowcount == 0:
+        return False
+    _count_follow(db, follower, followee, -1)
+    return True
+
+def save_user_data(username, data):
+    """
+    saves a user's data.
+    """
+    db = _db()
+    with _transaction(db):
+        _save_user_data(db, username, data)
+    profile_cache.store(username, profile_cache.summarize(data))
+
+def update_user_data(username, fn):
+    """
+    reads a user's data, lets fn change it in place and saves it, all in
+    one transaction, so a follow made in the meantime isn't undone.
+    returns the saved data.
+    """
+    db = _db()
+    with _transaction(db):
+        user_data = load_user_data(username)
+        fn(user_data)
+        _save_user_data(db, username, user_data)
+    profile_cache.store(username, profile_cache.summarize(user_data))
+    return user_data
+
+def fetch_profiles(usernames):
+    """
+    reads profile summaries for many users in one query, skipping unknown
+    users. screens should use load_profiles, which is cached.
+    """
+    profiles = {}
+    usernames = list(usernames)
+    # stay under sqlite's limit on the number of query parameters
+    for i in range(0, len(usernames), 500):
+        chunk = usernames[i:i + 500]
+        for username, display_name, bio, pronouns in _db().execute(
+                'SELECT username, display_name, bio, pronouns FROM users WHERE username IN '
+                f'({", ".join("?" * len(chunk))})', chunk):
+            profiles[username] = {'display_name': display_name, 'bio': bio, 'pronouns': pronouns}
+    return profiles
+
+def user_exists(username):
+    """
+    checks whether an account with this username exists.
+    """
+    return _db().execute('SELECT 1 FROM users WHERE username = ?', (username,)).fetchone() is not None
+
+def update_directory(username, user_data):
+    """
+    stamps a new account with the time it joined. the rest of the directory
+    entry is read straight from the users table.
+    """
+    db = _db()
+    with _transaction(db):
+        db.execute('UPDATE users SET created = ? WHERE username = ? AND created = 0',
+                   (timestamps.now(), username))
+
+def load_directory_page(after=None, count=10):
+    """
+    returns up to count directory entries in alphabetical order, starting
+    after the username after. each entry has username, display_name, bio
+    (the first few words) and created.
+    """
+    rows = _db().execute(
+        'SELECT username, display_name, substr(bio, 1, ?), created FROM users '
+        'WHERE username > ? ORDER BY username LIMIT ?',
+        (directory.BIO_SNIPPET_LENGTH, after if after is not None else '', count))
+    return [{'username': r[0], 'display_name': r[1], 'bio': r[2], 'created': r[3]} for r in rows]
+
+def list_usernames():
+    """
+    returns every username, in the order the accounts were created.
+    """
+    return [r[0] for r in _db().execute('SELECT username FROM users ORDER BY rowid')]
+
+#------------------------------------------------------------------------------
+# follows
+#------------------------------------------------------------------------------
+
+def follow_user(username, other):
+    """
+    makes username follow other and updates both counters.
+    returns False if username already followed other.
+    """
+    db = _db()
+    with _transaction(db):
+        return _add_follow(db, username, other)
+
+def unfollow_user(username, other):
+    """
+    makes username stop following other.
+    returns False if username wasn't following other.
+    """
+    db = _db()
+    with _transaction(db):
+        return _remove_follow(db, username, other)
+
+def load_followers(username):
+    """
+    returns the users who follow username.
+    """
+    return [r[0] for r in _db().execute(
+        'SELECT follower FROM follows WHERE followee = ? ORDER BY follower', (username,))]
+
+def load_follow_counts(username):
+    """
+    returns (followers, following) counts for a user.
+    """
+    row = _db().execute('SELECT followers, following FROM follow_counts WHERE username = ?',
+                        (username,)).fetchone()
+    return tuple(row) if row else (0, 0)
+
+#------------------------------------------------------------------------------
+# home timelines
+#------------------------------------------------------------------------------
+
+# a post id larger than any real one, used when paging from the top
+NEWEST = 2 ** 62
+
+def _ensure_timeline(db, username):
+    """
+    builds a user's timeline from the people they follow if they have none.
+    """
+    if db.execute('SELECT 1 FROM timeline_owners WHERE owner = ?', (username,)).fetchone():
+        return
+    db.execute('INSERT INTO timeline_owners (owner) VALUES (?)', (username,))
+    db.execute(
+        'INSERT OR IGNORE INTO timelines (owner, post_id, author, ts) '
+        'SELECT ?, id, user, ts FROM posts '
+        'WHERE user = ? OR user IN (SELECT followee FROM follows WHERE follower = ?) '
+        'ORDER BY id DESC LIMIT ?',
+        (username, username, username, TIMELINE_LENGTH))
+
+def _trim_timeline(db, username):
+    """
+    cuts a user's timeline back to the newest TIMELINE_LENGTH posts.
+    """
+    db.execute(
+        'DELETE FROM timelines WHERE owner = ? AND post_id < (SELECT post_id FROM timelines '
+        'WHERE owner = ? ORDER BY post_id DESC LIMIT 1 OFFSET ?)',
+        (username, username, TIMELINE_LENGTH - 1))
+
+def load_feed_page(username, before=None, count=10):
+    """
+    returns up to count posts for a user's feed, newest first, older than
+    the post id before (or the newest posts if before is None).
+    posts come from the user's home timeline; once that runs out and it has
+    been trimmed, older posts are read from the followed users' posts.
+    """
+    db = _db()
+    with _transaction(db):
+        _ensure_timeline(db, username)
+        size = db.execute('SELECT COUNT(*) FROM timelines WHERE owner = ?', (username,)).fetchone()[0]
+        if size > 2 * TIMELINE_LENGTH:
+            _trim_timeline(db, username)
+            size = TIMELINE_LENGTH
+
+    before = NEWEST if before is None else before
+    posts = []
+    while len(posts) < count:
+        wanted = count - len(posts)
+        ids = [r[0] for r in db.execute(
+            'SELECT post_id FROM timelines WHERE owner = ? AND post_id < ? ORDER BY post_id DESC LIMIT ?',
+            (username, before, wanted))]
+        if len(ids) < wanted and size >= TIMELINE_LENGTH:
+            oldest = ids[-1] if ids else before
+            ids += [r[0] for r in db.execute(
+                'SELECT id FROM posts WHERE id < ? AND id < (SELECT MIN(post_id) FROM timelines WHERE owner = ?) '
+                'AND (user = ? OR user IN (SELECT followee FROM follows WHERE follower = ?)) '
+                'ORDER BY id DESC LIMIT ?',
+                (oldest, username, username, username, wanted - len(ids)))]
+        if not ids:
+            break
+        # deleted posts still have timeline rows, skip over them
+        posts += [post for post in (_load_post(db, post_id) for post_id in ids) if post is not None]
+        before = ids[-1]
+    return posts
+
+def backfill_timeline(username, author):
+    """
+    adds author's recent posts to username's timeline after a follow.
+    """
+    db = _db()
+    with _transaction(db):
+        _ensure_timeline(db, username)
+        db.execute(
+            'INSERT OR IGNORE INTO timelines (owner, post_id, author, ts) '
+            'SELECT ?, id, user, ts FROM posts WHERE user = ? ORDER BY id DESC LIMIT ?',
+            (username, author, TIMELINE_LENGTH))
+        # keep the timeline a contiguous run of the newest posts, so that
+        # anything older can be found by reading the authors' posts
+        _trim_timeline(db, username)
+
+def prune_timeline(username, author):
+    """
+    removes author's posts from username's timeline after an unfollow.
+    if that leaves the timeline short, it is topped up with older posts from
+    the people they still follow.
+    """
+    db = _db()
+    with _transaction(db):
+        db.execute('DELETE FROM timelines WHERE owner = ? AND author = ?', (username, author))
+        size, oldest = db.execute('SELECT COUNT(*), MIN(post_id) FROM timelines WHERE owner = ?',
+                                  (username,)).fetchone()
+        if size < TIMELINE_LENGTH:
+            db.execute(
+                'INSERT OR IGNORE INTO timelines (owner, post_id, author, ts) '
+                'SELECT ?, id, user, ts FROM posts WHERE id < ? '
+                'AND (user = ? OR user IN (SELECT followee FROM follows WHERE follower = ?)) '
+                'ORDER BY id DESC LIMIT ?',
+                (username, oldest or NEWEST, username, username, TIMELINE_LENGTH - size))
+
+def load_feed_cursor(username):
+    """
+    returns the (ts, id) of the feed post a user last looked at, or None.
+    """
+    row = _db().execute('SELECT ts, post_id FROM feed_cursors WHERE owner = ?',
+                        (username,)).fetchone()
+    return tuple(row) if row else None
+
+def save_feed_cursor(username, cursor):
+    """
+    remembers a (ts, id) feed position so the feed can reopen there.
+    """
+    db = _db()
+    with _transaction(db):
+        db.execute('INSERT OR REPLACE INTO feed_cursors (owner, ts, post_id) VALUES (?, ?, ?)',
+                   (username, cursor[0], cursor[1]))
+
+def iter_author_keys(username, start=None):
+    """
+    yields (ts, id) for a user's posts, newest first, starting at
+    start (inclusive) if given. rows are read AUTHOR_KEY_BATCH at a time,
+    each batch fetched whole: an unfinished select would keep a read
+    transaction open while the feed is on screen, and this connection's
+    next like or comment would then fail with "database is locked".
+    """
+    db = _db()
+    if start is None:
+        rows = db.execute('SELECT ts, id FROM posts WHERE user = ? '
+                          'ORDER BY ts DESC, id DESC LIMIT ?', (username, AUTHOR_KEY_BATCH)).fetchall()
+    else:
+        rows = db.execute('SELECT ts, id FROM posts WHERE user = ? AND (ts, id) <= (?, ?) '
+                          'ORDER BY ts DESC, id DESC LIMIT ?',
+                          (username, start[0], start[1], AUTHOR_KEY_BATCH)).fetchall()
+    while rows:
+        for row in rows:
+            yield tuple(row)
+        if len(rows) < AUTHOR_KEY_BATCH:
+            return
+        ts, post_id = rows[-1]
+        rows = db.execute('SELECT ts, id FROM posts WHERE user = ? AND (ts, id) < (?, ?) '
+                          'ORDER BY ts DESC, id DESC LIMIT ?',
+                          (username, ts, post_id, AUTHOR_KEY_BATCH)).fetchall()
+
+#------------------------------------------------------------------------------
+# messages and notifications
+#------------------------------------------------------------------------------
+
+def send_message(sender, recipient, text):
+    """
+    adds a message to the conversation between sender and recipient and
+    returns it. both users' inbox summaries are updated in the same
+    transaction.
+    """
+    db = _db()
+    pair = conversations.key(sender, recipient)
+    ts = timestamps.now()
+    with _transaction(db):
+        message_id = db.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM direct_messages WHERE pair = ?',
+                                (pair,)).fetchone()[0]
+        db.execute('INSERT INTO direct_messages (pair, id, sender, message, ts) VALUES (?, ?, ?, ?, ?)',
+                   (pair, message_id, sender, text, ts))
+        message = {'id': message_id, 'sender': sender, 'message': text, 'ts': ts}
+        summary = conversations.summarize(message)
+        for owner, partner in ((sender, recipient), (recipient, sender)):
+            db.execute(
+                'INSERT INTO conversations (owner, partner, last_id, last_sender, last_ts, preview) '
+                'VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (owner, partner) DO UPDATE SET '
+                'last_id = excluded.last_id, last_sender = excluded.last_sender, '
+                'last_ts = excluded.last_ts, preview = excluded.preview',
+                (owner, partner, summary['last_id'], summary['last_sender'],
+                 summary['last_ts'], summary['preview']))
+        db.execute('UPDATE conversations SET read_id = ? WHERE owner = ? AND partner = ?',
+                   (message_id, sender, recipient))
+    signals.bump(recipient, 'messages')
+    return message
+
+def load_conversation(username, partner, after=0, before=None, limit=None):
+    """
+    returns the messages between two users with after < id < before,
+    oldest first (every message by default). with a limit, only the newest
+    limit of them. each message has id, sender, message and ts.
+    """
+    rows = _db().execute(
+        'SELECT id, sender, message, ts FROM direct_messages '
+        'WHERE pair = ? AND id > ? AND id < ? ORDER BY id DESC LIMIT ?',
+        (conversations.key(username, partner), after, before if before is not None else NEWEST,
+         limit if limit is not None else -1))
+    return [{'id': r[0], 'sender': r[1], 'message': r[2], 'ts': r[3]} for r in reversed(rows.fetchall())]
+
+def load_inbox(username):
+    """
+    returns {partner: summary} for everyone a user has a conversation with.
+    a summary has read_id (the last message they have seen), last_id,
+    last_sender, last_ts, preview and unread, which is worked out
+    from the two ids.
+    """
+    rows = _db().execute(
+        'SELECT partner, read_id, last_id, last_sender, last_ts, preview '
+        'FROM conversations WHERE owner = ?', (username,))
+    return {r[0]: {'read_id': r[1], 'last_id': r[2], 'last_sender': r[3], 'last_ts': r[4],
+                   'preview': r[5], 'unread': max(0, r[2] - r[1])} for r in rows}
+
+def mark_conversation_read(username, partner, message_id):
+    """
+    records that a user has seen a conversation up to message_id.
+    nothing is written unless that moves their read position forward.
+    """
+    db = _db()
+    row = db.execute('SELECT read_id FROM conversations WHERE owner = ? AND partner = ?',
+                     (username, partner)).fetchone()
+    if row is not None and row[0] >= message_id:
+        return
+    with _transaction(db):
+        db.execute('INSERT INTO conversations (owner, partner, read_id) VALUES (?, ?, ?) '
+                   'ON CONFLICT (owner, partner) DO UPDATE SET read_id = max(read_id, excluded.read_id)',
+                   (username, partner, message_id))
+
+def _write_summary(db, owner, partner, read_id, thread):
+    """
+    writes owner's inbox summary of a whole conversation.
+    """
+    entry = conversations.build_summary(owner, thread, read_id)
+    db.execute(
+        'INSERT OR REPLACE INTO conversations '
+        '(owner, partner, read_id, last_id, last_sender, last_ts, preview) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?)',
+        (owner, partner, entry['read_id'], entry['last_id'],
+         entry.get('last_sender', ''), entry.get('last_ts', 0), entry.get('preview', '')))
+
+def _import_messages(db, messages):
+    """
+    copies conversations in the old messages.json layout into the
+    conversation tables.
+    """
+    _import_conversations(db, *conversations.from_legacy(messages))
+
+def _import_conversations(db, threads, read_ids):
+    """
+    copies conversations and read positions into the conversation tables.
+    """
+    for (user_a, user_b), thread in threads.items():
+        db.executemany(
+            'INSERT OR IGNORE INTO direct_messages (pair, id, sender, message, ts) VALUES (?, ?, ?, ?, ?)',
+            [(conversations.key(user_a, user_b), msg['id'], msg['sender'], msg['message'], timestamps.of(msg))
+             for msg in thread])
+    for (owner, partner), read_id in read_ids.items():
+        _write_summary(db, owner, partner, read_id, threads.get(tuple(sorted((owner, partner))), []))
+
+def _add_notifications(db, username, notifications):
+    """
+    inserts notifications for a user and counts them as unread.
+    """
+    if not notifications:
+        return
+    db.executemany('INSERT INTO notifications (username, body) VALUES (?, ?)',
+                   [(username, json.dumps(body)) for body in notifications])
+    db.execute('INSERT INTO notification_counts (username, unread) VALUES (?, ?) '
+               'ON CONFLICT (username) DO UPDATE SET unread = unread + excluded.unread',
+               (username, len(notifications)))
+
+def _notification_body(body):
+    """
+    decodes a stored notification. rows written before notifications were
+    json encoded hold the plain text.
+    """
+    try:
+        return json.loads(body)
+    except ValueError:
+        return body
+
+def save_notifications(username, notification):
+    """
+    adds a notification for a user. this is a single row insert.
+    """
+    save_notification_batch(username, [notification])
+
+def save_notification_batch(username, notifications):
+    """
+    adds several notifications for a user in one transaction.
+    a notification is a string or an event dict (see notify.py).
+    """
+    db = _db()
+    with _transaction(db):
+        _add_notifications(db, username, notifications)
+    signals.bump(username, 'notifications')
+
+def count_unread_notifications(username):
+    """
+    returns how many notifications a user hasn't seen yet.
+    """
+    row = _db().execute('SELECT unread FROM notification_counts WHERE username = ?',
+                        (username,)).fetchone()
+    return row[0] if row else 0
+
+def load_new_notifications(username):
+    """
+    returns (notifications, cursor) with the notifications a user hasn't
+    seen yet, oldest first. pass the cursor to mark_notifications_read
+    once they have been shown.
+    """
+    rows = _db().execute('SELECT id, body FROM notifications WHERE username = ? ORDER BY id',
+                         (username,)).fetchall()
+    return [_notification_body(row[1]) for row in rows], (rows[-1][0] if rows else 0)
+
+def mark_notifications_read(username, cursor):
+    """
+    marks the notifications returned with cursor as seen. seen
+    notifications are deleted, like the old screen cleared them.
+    """
+    db = _db()
+    with _transaction(db):
+        seen = db.execute('DELETE FROM notifications WHERE username = ? AND id <= ?',
+                          (username, cursor)).rowcount
+        if seen:
+            db.execute('UPDATE notification_counts SET unread = max(0, unread - ?) WHERE username = ?',
+                       (seen, username))
+
+#------------------------------------------------------------------------------
+# migration
+#------------------------------------------------------------------------------
+
+def import_json(db):
+    """
+    copies users/, the post log (or posts.json), the conversation logs
+    (or messages.json) and unread notifications into the database. this
+    runs once, inside _import_once's transaction.
+    """
+    if os.path.isdir('users'):
+        for user_file in sorted(os.listdir('users')):
+            if user_file.endswith('.json'):
+                with open(os.path.join('users', user_file), 'r') as f:
+                    _save_user_data(db, user_file[:-5], json.load(f))
+        # user files don't say when the account was made, so the import
+        # time stands in, as it does when the json directory is built
+        db.execute('UPDATE users SET created = ? WHERE created = 0', (timestamps.now(),))
+
+    posts = []
+    if os.path.exists(postlog.LOG_PATH):
+        posts = postlog.load_all()
+    elif os.path.exists('posts.json'):
+        with open('posts.json', 'r') as f:
+            posts = json.load(f)
+    for post in posts:
+        _write_post(db, post)
+
+    if conversations.exists():
+        _import_conversations(db, *conversations.load_all())
+    elif os.path.exists('messages.json'):
+        with open('messages.json', 'r') as f:
+            _import_messages(db, json.load(f))
+
+    if os.path.isdir(notification_log.NOTIFICATION_DIR):
+        for log_file in sorted(os.listdir(notification_log.NOTIFICATION_DIR)):
+            if log_file.endswith('.log'):
+                username = log_file[:-len('.log')]
+                _add_notifications(db, username, notification_log.read_unread(username)[0])
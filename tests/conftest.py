@@ -0,0 +1,80 @@
+#------------------------------------------------------------------------------
+# conftest.py
+#------------------------------------------------------------------------------
+# shared fixtures for the storage tests. every test that asks for `store`
+# runs twice, once per storage engine, in an empty data directory of its
+# own. `reopen` makes the process forget everything it has cached, as if a
+# new dreamland process had started on the same directory.
+#------------------------------------------------------------------------------
+
+import os
+import sys
+import importlib
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import postlog
+import directory
+import conversations
+import profile_cache
+import sqlite_store
+import auth
+
+def _forget():
+    """
+    drops the in-memory state the stores keep between calls.
+    """
+    postlog._reset()
+    directory._reset()
+    conversations._offsets.clear()
+    profile_cache._entries.clear()
+    auth._secret = None
+    conn = getattr(sqlite_store._local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        sqlite_store._local.conn = None
+
+@pytest.fixture(params=['json', 'sqlite'])
+def store(request, tmp_path, monkeypatch):
+    """
+    returns the data module, switched to one storage engine and working
+    in an empty directory.
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('DREAMLAND_STORAGE', request.param)
+    monkeypatch.setenv('DREAMLAND_DB', str(tmp_path / 'dreamland.db'))
+    # the cheapest bcrypt cost, the tests aren't about password hashing
+    monkeypatch.setattr(auth, 'BCRYPT_ROUNDS', 4)
+    _forget()
+    importlib.reload(config)
+    importlib.reload(sqlite_store)
+    import data
+    data = importlib.reload(data)
+    yield data
+    _forget()
+
+@pytest.fixture
+def reopen():
+    """
+    returns a function that makes this process start over from disk.
+    """
+    return _forget
+
+def make_user(data, username, **fields):
+    """
+    saves a new account the way register_screen does and returns its data.
+    """
+    user_data = {
+        'password_hash': auth.hash_password('dreamland'),
+        'display_name': username,
+        'bio': '',
+        'pronouns': '',
+        'age': '',
+        'following': [],
+    }
+    user_data.update(fields)
+    data.save_user_data(username, user_data)
+    return user_data
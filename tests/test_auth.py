@@ -0,0 +1,61 @@
+#------------------------------------------------------------------------------
+# test_auth.py
+#------------------------------------------------------------------------------
+# resume codes: a fresh code logs its user back in; expired, tampered,
+# malformed and revoked ones don't.
+#------------------------------------------------------------------------------
+
+import pytest
+
+import auth
+from conftest import make_user
+
+@pytest.fixture
+def mia(store):
+    """
+    returns (data module, a resume code for mia).
+    """
+    user_data = make_user(store, 'mia')
+    return store, auth.issue_code('mia', user_data)
+
+def test_fresh_code(mia):
+    data, code = mia
+    assert auth.code_user(code) == 'mia'
+    assert auth.check_code(code, data.load_user_data('mia'))
+    # typed back in with stray whitespace or caps lock on
+    username, expires, signature = code.split('.')
+    assert auth.check_code(f' {username}.{expires}.{signature.upper()}\n', data.load_user_data('mia'))
+
+def test_expired_code(store, monkeypatch):
+    user_data = make_user(store, 'mia')
+    monkeypatch.setattr(auth, 'RESUME_DAYS', -1)
+    code = auth.issue_code('mia', user_data)
+    assert not auth.check_code(code, store.load_user_data('mia'))
+
+def test_tampered_code(mia):
+    data, code = mia
+    make_user(data, 'sam')
+    username, expires, signature = code.split('.')
+    flipped = signature[:-1] + ('a' if signature[-1] != 'a' else 'b')
+    later = auth._base36(int(expires, 36) + 86400)
+    for tampered in (f'{username}.{expires}.{flipped}',
+                     f'{username}.{later}.{signature}',
+                     f'sam.{expires}.{signature}',
+                     f'{username}.{expires}.{signature[:-1]}'):
+        assert not auth.check_code(tampered, data.load_user_data(auth.code_user(tampered)))
+
+@pytest.mark.parametrize('code', ['', 'mia', 'mia.abc', '..', 'mia.!!.abcd', 'mia.abc.é', 'mia.zz.\x00'])
+def test_malformed_code(store, code):
+    user_data = make_user(store, 'mia')
+    assert not auth.check_code(code, user_data)
+
+def test_logout_and_new_password_revoke_codes(mia):
+    data, code = mia
+    data.update_user_data('mia', auth.revoke_codes)
+    assert not auth.check_code(code, data.load_user_data('mia'))
+
+    code = auth.issue_code('mia', data.load_user_data('mia'))
+    assert auth.check_code(code, data.load_user_data('mia'))
+    new_hash = auth.hash_password('a new password')
+    data.update_user_data('mia', lambda user_data: auth.set_password_hash(user_data, new_hash))
+    assert not auth.check_code(code, data.load_user_data('mia'))
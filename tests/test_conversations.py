@@ -0,0 +1,68 @@
+#------------------------------------------------------------------------------
+# test_conversations.py
+#------------------------------------------------------------------------------
+# direct messages: reading a conversation a window at a time, and the
+# inbox unread counts, which come from each side's read position.
+#------------------------------------------------------------------------------
+
+def _send(data, count, sender='mia', recipient='sam'):
+    """
+    sends count numbered messages and returns them.
+    """
+    return [data.send_message(sender, recipient, f'message {n}') for n in range(count)]
+
+def test_ids_count_up_within_a_conversation(store):
+    sent = _send(store, 3) + _send(store, 2, 'sam', 'mia')
+    assert [message['id'] for message in sent] == [1, 2, 3, 4, 5]
+    assert store.send_message('mia', 'lou', 'hi lou')['id'] == 1
+
+def test_paging(store, reopen):
+    _send(store, 25)
+    everything = store.load_conversation('sam', 'mia')
+    assert [message['id'] for message in everything] == list(range(1, 26))
+    assert everything == store.load_conversation('mia', 'sam')
+
+    # newest window first, then older ones with before=
+    page = store.load_conversation('sam', 'mia', limit=10)
+    assert [message['id'] for message in page] == list(range(16, 26))
+    page = store.load_conversation('sam', 'mia', before=page[0]['id'], limit=10)
+    assert [message['id'] for message in page] == list(range(6, 16))
+    page = store.load_conversation('sam', 'mia', before=page[0]['id'], limit=10)
+    assert [message['id'] for message in page] == list(range(1, 6))
+    assert store.load_conversation('sam', 'mia', before=1, limit=10) == []
+
+    # and what arrived after a given message
+    _send(store, 2, 'sam', 'mia')
+    newer = store.load_conversation('mia', 'sam', after=25)
+    assert [(message['id'], message['sender']) for message in newer] == [(26, 'sam'), (27, 'sam')]
+
+    reopen()
+    assert store.load_conversation('mia', 'sam', limit=3) == everything[-1:] + newer
+    assert store.load_conversation('mia', 'sam', after=3, before=6) == everything[3:5]
+
+def test_unread_counts(store):
+    _send(store, 4)
+    inbox = store.load_inbox('sam')
+    assert inbox['mia']['unread'] == 4
+    assert inbox['mia']['last_sender'] == 'mia'
+    assert inbox['mia']['preview'] == 'message 3'
+    assert store.load_inbox('mia')['sam']['unread'] == 0
+
+    store.mark_conversation_read('sam', 'mia', 3)
+    assert store.load_inbox('sam')['mia']['unread'] == 1
+    # moving the read position back does nothing
+    store.mark_conversation_read('sam', 'mia', 1)
+    assert store.load_inbox('sam')['mia']['unread'] == 1
+
+    # replying counts everything before it as read
+    store.send_message('sam', 'mia', 'hey')
+    assert store.load_inbox('sam')['mia']['unread'] == 0
+    assert store.load_inbox('mia')['sam']['unread'] == 1
+
+def test_inbox_lists_every_partner(store):
+    _send(store, 1, 'mia', 'sam')
+    _send(store, 2, 'lou', 'sam')
+    inbox = store.load_inbox('sam')
+    assert sorted(inbox) == ['lou', 'mia']
+    assert (inbox['lou']['unread'], inbox['mia']['unread']) == (2, 1)
+    assert store.load_inbox('nobody') == {}
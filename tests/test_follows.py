@@ -0,0 +1,73 @@
+#------------------------------------------------------------------------------
+# test_follows.py
+#------------------------------------------------------------------------------
+# following: a user's following list, the other side's followers and both
+# counters always have to agree.
+#------------------------------------------------------------------------------
+
+from conftest import make_user
+
+USERS = ('mia', 'sam', 'lou', 'ash')
+
+def _check_consistent(data):
+    """
+    checks that the following lists, follower lists and counts match.
+    """
+    following = {user: data.load_user_data(user)['following'] for user in USERS}
+    for user in USERS:
+        followers = sorted(other for other in USERS if user in following[other])
+        assert sorted(data.load_followers(user)) == followers
+        assert data.load_follow_counts(user) == (len(followers), len(following[user]))
+
+def test_follow_and_unfollow(store):
+    for user in USERS:
+        make_user(store, user)
+
+    assert store.follow_user('mia', 'sam')
+    assert store.follow_user('mia', 'lou')
+    assert store.follow_user('sam', 'mia')
+    assert store.follow_user('ash', 'sam')
+    assert not store.follow_user('mia', 'sam')
+    _check_consistent(store)
+    assert store.load_follow_counts('sam') == (2, 1)
+
+    assert store.unfollow_user('mia', 'sam')
+    assert not store.unfollow_user('mia', 'sam')
+    assert not store.unfollow_user('lou', 'ash')
+    _check_consistent(store)
+    assert store.load_user_data('mia')['following'] == ['lou']
+
+def test_consistent_after_reopen(store, reopen):
+    for user in USERS:
+        make_user(store, user)
+    for follower in USERS:
+        for followee in USERS:
+            if follower != followee:
+                store.follow_user(follower, followee)
+    store.unfollow_user('lou', 'mia')
+    store.unfollow_user('ash', 'mia')
+    reopen()
+    _check_consistent(store)
+    assert store.load_follow_counts('mia') == (1, 3)
+
+def test_index_built_from_user_files(store, reopen):
+    # accounts whose files already list who they follow, as older installs have
+    make_user(store, 'mia', following=['sam', 'lou'])
+    make_user(store, 'sam', following=['mia'])
+    make_user(store, 'lou')
+    make_user(store, 'ash')
+    reopen()
+    _check_consistent(store)
+    assert store.unfollow_user('mia', 'lou')
+    _check_consistent(store)
+
+def test_profile_edit_keeps_follows(store):
+    for user in USERS:
+        make_user(store, user)
+    stale = store.load_user_data('mia')
+    store.follow_user('mia', 'sam')
+    store.update_user_data('mia', lambda user_data: user_data.update(bio='hello'))
+    assert stale['following'] == []
+    assert store.load_user_data('mia')['following'] == ['sam']
+    assert store.load_user_data('mia')['bio'] == 'hello'
+    _check_consistent(store)
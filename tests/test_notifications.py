@@ -0,0 +1,68 @@
+#------------------------------------------------------------------------------
+# test_notifications.py
+#------------------------------------------------------------------------------
+# notifications: unread counts, the read cursor, and what happens when the
+# json engine cuts a log down to its unread tail.
+#------------------------------------------------------------------------------
+
+import os
+
+import config
+import notification_log
+
+def _bodies(data, username):
+    """
+    returns (unread notification texts, cursor) for a user.
+    """
+    notifications, cursor = data.load_new_notifications(username)
+    return [n['text'] for n in notifications], cursor
+
+def test_read_cursor(store):
+    store.save_notification_batch('mia', [{'text': 'one'}, {'text': 'two'}])
+    store.save_notifications('mia', {'text': 'three'})
+    assert store.count_unread_notifications('mia') == 3
+
+    texts, cursor = _bodies(store, 'mia')
+    assert texts == ['one', 'two', 'three']
+    # something arriving while the screen is open stays unread
+    store.save_notifications('mia', {'text': 'four'})
+    store.mark_notifications_read('mia', cursor)
+    assert store.count_unread_notifications('mia') == 1
+    texts, cursor = _bodies(store, 'mia')
+    assert texts == ['four']
+    store.mark_notifications_read('mia', cursor)
+    assert store.count_unread_notifications('mia') == 0
+    assert _bodies(store, 'mia')[0] == []
+
+def test_compaction(store, monkeypatch):
+    monkeypatch.setattr(notification_log, 'COMPACT_BYTES', 256)
+    store.save_notification_batch('mia', [{'text': f'old {n}'} for n in range(20)])
+    texts, old_cursor = _bodies(store, 'mia')
+    assert len(texts) == 20
+
+    store.save_notification_batch('mia', [{'text': 'new 0'}, {'text': 'new 1'}])
+    store.mark_notifications_read('mia', old_cursor)
+    assert store.count_unread_notifications('mia') == 2
+    if config.STORAGE_BACKEND == 'json':
+        # the read part is gone from the log, only the unread tail is left
+        with open(os.path.join(notification_log.NOTIFICATION_DIR, 'mia.log'), 'rb') as f:
+            assert f.read().count(b'\n') == 2
+
+    # a cursor handed out before the compaction no longer moves anything
+    store.mark_notifications_read('mia', old_cursor)
+    assert store.count_unread_notifications('mia') == 2
+
+    texts, cursor = _bodies(store, 'mia')
+    assert texts == ['new 0', 'new 1']
+    store.save_notifications('mia', {'text': 'new 2'})
+    store.mark_notifications_read('mia', cursor)
+    assert _bodies(store, 'mia')[0] == ['new 2']
+    assert store.count_unread_notifications('mia') == 1
+
+def test_moved_out_of_the_user_file(store, reopen):
+    from conftest import make_user
+    make_user(store, 'mia', notifications=[{'text': 'from before'}])
+    reopen()
+    assert store.count_unread_notifications('mia') == 1
+    assert _bodies(store, 'mia')[0] == ['from before']
+    assert 'notifications' not in store.load_user_data('mia')
@@ -0,0 +1,107 @@
+#------------------------------------------------------------------------------
+# test_posts.py
+#------------------------------------------------------------------------------
+# posts: appending, changing and deleting them, and reading them back in a
+# new process. on the json engine that reload starts from the post index
+# checkpoint (posts.idx) and reads only the log after it.
+#------------------------------------------------------------------------------
+
+import config
+import postlog
+import timestamps
+
+def _post(data, user, content):
+    """
+    appends a new post and returns its id.
+    """
+    return data.append_post({'user': user, 'content': content, 'ts': timestamps.now(),
+                             'likes': [], 'comments': []})
+
+def _snapshot(data, post_ids):
+    """
+    returns what every post looks like right now (None once deleted).
+    """
+    return {post_id: data.get_post(post_id) for post_id in post_ids}
+
+def test_append_update_delete(store):
+    first = _post(store, 'mia', 'hello')
+    second = _post(store, 'mia', 'second post')
+    third = _post(store, 'sam', 'hi mia')
+    assert first < second < third
+
+    store.record_like(first, 'sam')
+    store.record_like(first, 'lou')
+    store.record_unlike(first, 'lou')
+    store.record_comment(first, {'user': 'sam', 'comment': 'welcome!', 'ts': timestamps.now()})
+    store.record_edit(second, 'second post, edited')
+    store.update_post(third, lambda post: post['likes'].append('mia'))
+    store.record_delete(second)
+
+    post = store.get_post(first)
+    assert post['content'] == 'hello'
+    assert post['likes'] == ['sam']
+    assert [c['comment'] for c in post['comments']] == ['welcome!']
+    assert store.get_post(second) is None
+    assert store.get_post(third)['likes'] == ['mia']
+    assert store.update_post(second, lambda post: None) is None
+    assert store.count_user_posts('mia') == 1
+    assert [p['id'] for p in store.load_user_posts('mia')] == [first]
+    assert [p['id'] for p in store.load_posts()] == [first, third]
+
+def test_ids_are_never_reused(store, reopen):
+    first = _post(store, 'mia', 'one')
+    store.record_delete(first)
+    reopen()
+    assert _post(store, 'mia', 'two') > first
+
+def test_reload_from_checkpoint_and_tail(store, reopen, monkeypatch):
+    # checkpoint after every sync while the first posts go in
+    monkeypatch.setattr(postlog, 'CHECKPOINT_MIN_BYTES', 0)
+    ids = [_post(store, f'user{n % 3}', f'post {n}') for n in range(30)]
+    store.record_like(ids[0], 'user1')
+    store.record_delete(ids[1])
+
+    # then no more checkpoints, so these changes are only in the tail
+    monkeypatch.setattr(postlog, 'CHECKPOINT_MIN_BYTES', 1 << 40)
+    ids += [_post(store, 'user1', f'late post {n}') for n in range(5)]
+    store.record_edit(ids[2], 'edited after the checkpoint')
+    store.record_delete(ids[3])
+    store.record_comment(ids[0], {'user': 'user2', 'comment': 'late', 'ts': timestamps.now()})
+    expected = _snapshot(store, ids)
+    counts = {user: store.count_user_posts(user) for user in ('user0', 'user1', 'user2')}
+
+    reopen()
+    assert _snapshot(store, ids) == expected
+    assert {user: store.count_user_posts(user) for user in counts} == counts
+    if config.STORAGE_BACKEND == 'json':
+        # the reload started from the checkpoint, not the top of the log
+        assert 0 < postlog._checkpointed < postlog._scanned
+
+def test_reload_after_compaction(store, reopen, monkeypatch):
+    monkeypatch.setattr(postlog, 'CHECKPOINT_MIN_BYTES', 0)
+    ids = [_post(store, 'mia', f'post {n}') for n in range(10)]
+    for post_id in ids[:5]:
+        store.record_like(post_id, 'sam')
+    store.record_delete(ids[5])
+
+    # the log is rewritten and grows past where the checkpoint ended,
+    # which now describes a file that is gone
+    monkeypatch.setattr(postlog, 'CHECKPOINT_MIN_BYTES', 1 << 40)
+    store.compact_posts()
+    ids += [_post(store, 'sam', 'a longer post ' * 20) for n in range(10)]
+    expected = _snapshot(store, ids)
+
+    reopen()
+    assert _snapshot(store, ids) == expected
+    assert store.count_user_posts('mia') == 9
+    assert store.count_user_posts('sam') == 10
+
+def test_bad_checkpoint_is_ignored(store, reopen, monkeypatch):
+    monkeypatch.setattr(postlog, 'CHECKPOINT_MIN_BYTES', 0)
+    ids = [_post(store, 'mia', f'post {n}') for n in range(10)]
+    expected = _snapshot(store, ids)
+    with open(postlog.INDEX_PATH, 'wb') as f:
+        f.write(b'not a checkpoint')
+
+    reopen()
+    assert _snapshot(store, ids) == expected
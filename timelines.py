@@ -0,0 +1,127 @@
+#------------------------------------------------------------------------------
+# timelines.py
+#------------------------------------------------------------------------------
+# this file stores home timelines for the json storage engine.
+# every user has timelines/<username>.log, one line per post that belongs in
+# their feed: [post id, author, ts]. when someone posts, a line is
+# appended to the timeline of each follower, so opening the feed only has to
+# read one short file instead of every post on the server.
+#
+# timelines are bounded: once a file holds twice TIMELINE_LENGTH entries it
+# is cut back to the newest TIMELINE_LENGTH. anything older is found by
+# merging the authors' own post lists (see data.load_feed_page).
+#------------------------------------------------------------------------------
+
+import os
+import json
+
+from config import TIMELINE_LENGTH
+from filestore import locked, append_records, read_records, encode_record, write_atomic
+import timestamps
+
+TIMELINE_DIR = 'timelines'
+
+def _path(username):
+    """
+    returns the path of a user's timeline file.
+    """
+    return os.path.join(TIMELINE_DIR, f'{username}.log')
+
+def exists(username):
+    """
+    checks whether a timeline has been built for this user yet.
+    """
+    return os.path.exists(_path(username))
+
+def push(usernames, post):
+    """
+    appends a post to the timelines of the given users.
+    users without a timeline yet are skipped; theirs is built when they
+    next open the feed and will include the post anyway.
+    """
+    entry = [post['id'], post['user'], timestamps.of(post)]
+    for username in usernames:
+        path = _path(username)
+        if not os.path.exists(path):
+            continue
+        with locked(path):
+            append_records(path, [entry])
+
+def _read_entries(path):
+    """
+    reads every entry in a timeline file, oldest first.
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, 'rb') as f:
+        return [entry for offset, end, entry in read_records(f)]
+
+def read(username):
+    """
+    returns a user's timeline entries, oldest first.
+    trims the file if it has grown past twice the timeline length.
+    """
+    path = _path(username)
+    entries = _read_entries(path)
+    if len(entries) > 2 * TIMELINE_LENGTH:
+        with locked(path):
+            entries = _read_entries(path)[-TIMELINE_LENGTH:]
+            write_atomic(path, b''.join(encode_record(entry) for entry in entries))
+    return entries
+
+def write(username, entries):
+    """
+    replaces a user's timeline with entries (sorted and cut to length).
+    """
+    os.makedirs(TIMELINE_DIR, exist_ok=True)
+    entries = sorted({entry[0]: entry for entry in entries}.values())[-TIMELINE_LENGTH:]
+    path = _path(username)
+    with locked(path):
+        write_atomic(path, b''.join(encode_record(entry) for entry in entries))
+
+def merge(username, entries):
+    """
+    adds entries to a user's timeline (used when they follow someone).
+    """
+    os.makedirs(TIMELINE_DIR, exist_ok=True)
+    path = _path(username)
+    with locked(path):
+        current = _read_entries(path)
+        merged = sorted({entry[0]: entry for entry in current + entries}.values())
+        write_atomic(path, b''.join(encode_record(entry) for entry in merged[-TIMELINE_LENGTH:]))
+
+def remove_author(username, author):
+    """
+    drops every post by author from a user's timeline (used on unfollow).
+    """
+    path = _path(username)
+    if not os.path.exists(path):
+        return
+    with locked(path):
+        kept = [entry for entry in _read_entries(path) if entry[1] != author]
+        write_atomic(path, b''.join(encode_record(entry) for entry in kept))
+
+def _cursor_path(username):
+    """
+    returns the path of the file holding a user's feed position.
+    """
+    return os.path.join(TIMELINE_DIR, f'{username}.cursor')
+
+def load_cursor(username):
+    """
+    returns the (ts, id) of the post a user was last looking at
+    in their feed, or None.
+    """
+    try:
+        with open(_cursor_path(username), 'r') as f:
+            position, post_id = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return (position, post_id)
+
+def save_cursor(username, cursor):
+    """
+    remembers where a user is in their feed.
+    """
+    os.makedirs(TIMELINE_DIR, exist_ok=True)
+    write_atomic(_cursor_path(username), json.dumps(list(cursor)).encode('utf-8'))
@@ -0,0 +1,60 @@
+#------------------------------------------------------------------------------
+# timestamps.py
+#------------------------------------------------------------------------------
+# this file deals with when things happened. posts, comments and messages
+# store 'ts', whole seconds since the epoch, which sorts and compares as a
+# plain int. older records have a 'timestamp' string in local time
+# ('2024-10-17 13:25:32') instead; the stores turn those into 'ts' as they
+# read them, and migrate_timestamps.py rewrites them for good.
+#------------------------------------------------------------------------------
+
+import time
+from datetime import datetime
+from functools import lru_cache
+
+# how old records wrote their time
+LEGACY_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def now():
+    """
+    returns the current time as a 'ts' value.
+    """
+    return int(time.time())
+
+@lru_cache(maxsize=65536)
+def parse(text):
+    """
+    turns an old local time string into a 'ts' value, or 0 if it is
+    empty or unreadable.
+    """
+    try:
+        return int(datetime.strptime(text, LEGACY_FORMAT).timestamp())
+    except (TypeError, ValueError):
+        return 0
+
+def of(record):
+    """
+    returns the 'ts' of a record, old or new.
+    """
+    if 'ts' in record:
+        return record['ts']
+    return parse(record.get('timestamp', ''))
+
+def upgrade(record):
+    """
+    gives an old record a 'ts' in place of its 'timestamp' string.
+    returns the record.
+    """
+    if 'timestamp' in record:
+        text = record.pop('timestamp')
+        record.setdefault('ts', parse(text))
+    return record
+
+def upgrade_post(post):
+    """
+    upgrades a post and its comments.
+    """
+    upgrade(post)
+    for comment in post.get('comments', []):
+        upgrade(comment)
+    return post
@@ -12,65 +12,71 @@ from helpers import (
     format_text,
     wrap_text,
     format_menu_options,
-    current_screen,
-    current_user,
 )
-from data import load_user_data, save_user_data, save_notifications
+from data import (
+    load_user_data,
+    update_user_data,
+    update_directory,
+    follow_user,
+    unfollow_user,
+    load_follow_counts,
+    backfill_timeline,
+    prune_timeline,
+)
 from feed import view_user_posts
+from notify import notify, retract
 from chat import send_message_to_user
 
-def edit_profile_screen():
+def edit_profile_screen(session):
     """
     lets the user edit their profile information like display name, bio, etc.
     """
-    clear_screen()
-    show_header(current_user[0])
-    print(format_text("edit your profile\n"))
-    user_data = load_user_data(current_user[0])
+    clear_screen(session)
+    show_header(session)
+    session.io.print(format_text("edit your profile\n"))
+    user_data = load_user_data(session.user)
 
     # get current values or empty strings if not set
-    display_name = input(format_text(f"display name [{user_data.get('display_name', '')}]: ")).strip()
-    bio = input(format_text(f"bio [{user_data.get('bio', '')}]: ")).strip()
-    pronouns = input(format_text(f"pronouns [{user_data.get('pronouns', '')}]: ")).strip()
-    age = input(format_text(f"age [{user_data.get('age', '')}]: ")).strip()
-
-    # update the user data if new values are provided
-    if display_name:
-        user_data['display_name'] = display_name
-    if bio:
-        user_data['bio'] = bio
-    if pronouns:
-        user_data['pronouns'] = pronouns
-    if age:
-        user_data['age'] = age
+    display_name = session.io.input(format_text(f"display name [{user_data.get('display_name', '')}]: ")).strip()
+    bio = session.io.input(format_text(f"bio [{user_data.get('bio', '')}]: ")).strip()
+    pronouns = session.io.input(format_text(f"pronouns [{user_data.get('pronouns', '')}]: ")).strip()
+    age = session.io.input(format_text(f"age [{user_data.get('age', '')}]: ")).strip()
 
-    save_user_data(current_user[0], user_data)
-    print(format_text("profile updated successfully!"))
-    input(format_text("press enter to continue..."))
-    current_screen[0] = "main_menu"
+    # update the user data if new values are provided. only those fields
+    # are written, onto a fresh copy: user_data is as old as this screen
+    changes = {field: value for field, value in (('display_name', display_name), ('bio', bio),
+                                                 ('pronouns', pronouns), ('age', age)) if value}
+    user_data = update_user_data(session.user, lambda user_data: user_data.update(changes))
+    update_directory(session.user, user_data)
+    session.io.print(format_text("profile updated successfully!"))
+    session.io.input(format_text("press enter to continue..."))
+    session.screen = "main_menu"
 
-def user_profile_screen(selected_user):
+def user_profile_screen(session, selected_user):
     """
     displays another user's profile.
     allows the current user to follow/unfollow, view posts, or send a message.
     """
     while True:
-        clear_screen()
-        show_header(current_user[0])
+        clear_screen(session)
+        show_header(session)
         user_data = load_user_data(selected_user)
         display_name = user_data.get('display_name', selected_user)
         bio = user_data.get('bio', 'no bio available.')
         pronouns = user_data.get('pronouns', '')
         age = user_data.get('age', '')
 
-        current_user_data = load_user_data(current_user[0])
+        current_user_data = load_user_data(session.user)
         following = current_user_data.get('following', [])
 
-        profile_info = f"display name: {display_name}\npronouns: {pronouns} | age: {age}\nbio: {bio}\n"
-        print(format_text(profile_info))
+        followers_count, following_count = load_follow_counts(selected_user)
+
+        profile_info = (f"display name: {display_name}\npronouns: {pronouns} | age: {age}\nbio: {bio}\n"
+                        f"followers: {followers_count} | following: {following_count}\n")
+        session.io.print(format_text(profile_info))
 
         options = []
-        if selected_user != current_user[0]:
+        if selected_user != session.user:
             # if the user is not viewing their own profile
             if selected_user in following:
                 follow_status = f"1. unfollow {selected_user}"
@@ -81,46 +87,51 @@ def user_profile_screen(selected_user):
             options.append("3. send message")
         else:
             # if the user is viewing their own profile
-            print(format_text("you are viewing your own profile."))
+            session.io.print(format_text("you are viewing your own profile."))
             options.append("1. view my posts")
 
         options.append("enter: go back")
-        print(format_menu_options(options))
-        show_footer()
-        choice = input(format_text("enter your choice: ")).strip()
+        session.io.print(format_menu_options(options))
+        show_footer(session)
+        choice = session.io.input(format_text("enter your choice: ")).strip()
 
         if choice == '':
             return  # go back to the previous screen
 
-        if selected_user != current_user[0]:
+        if selected_user != session.user:
             if choice == '1':
                 # toggle follow/unfollow
                 if selected_user in following:
-                    following.remove(selected_user)
-                    print(format_text(f"you have unfollowed {selected_user}."))
+                    if unfollow_user(session.user, selected_user):
+                        prune_timeline(session.user, selected_user)
+                        retract(selected_user, 'follow', session.user)
+                    session.io.print(format_text(f"you have unfollowed {selected_user}."))
                 else:
-                    following.append(selected_user)
-                    print(format_text(f"you are now following {selected_user}."))
-                    notification = f"{current_user[0]} started following you."
-                    save_notifications(selected_user, notification)
-                current_user_data['following'] = following
-                save_user_data(current_user[0], current_user_data)
-                input(format_text("press enter to continue..."))
+                    if follow_user(session.user, selected_user):
+                        backfill_timeline(session.user, selected_user)
+                        notify(selected_user, 'follow', session.user)
+                    session.io.print(format_text(f"you are now following {selected_user}."))
+                session.io.input(format_text("press enter to continue..."))
             elif choice == '2':
                 # view the selected user's posts
-                view_user_posts(selected_user)
+                view_user_posts(session, selected_user)
             elif choice == '3':
                 # send a direct message to the selected user
-                send_message_to_user(selected_user)
-                input(format_text("press enter to continue..."))
+                message = session.io.input(format_text("enter your message: ")).strip()
+                if message:
+                    send_message_to_user(session, selected_user, message)
+                    session.io.print(format_text("message sent."))
+                else:
+                    session.io.print(format_text("you cannot send an empty message."))
+                session.io.input(format_text("press enter to continue..."))
             else:
-                print(format_text("invalid choice. please try again."))
-                input(format_text("press enter to continue..."))
+                session.io.print(format_text("invalid choice. please try again."))
+                session.io.input(format_text("press enter to continue..."))
         else:
             if choice == '1':
                 # view the current user's own posts
-                current_screen[0] = "my_posts"
+                session.screen = "my_posts"
                 return
             else:
-                print(format_text("invalid choice. please try again."))
-                input(format_text("press enter to continue..."))
+                session.io.print(format_text("invalid choice. please try again."))
+                session.io.input(format_text("press enter to continue..."))
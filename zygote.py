@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+
+#------------------------------------------------------------------------------
+# zygote.py
+#------------------------------------------------------------------------------
+# this file makes starting a gotty session nearly free.
+# normally every connection runs python3 dreamland.py from scratch: a new
+# interpreter imports bcrypt and every screen module and reads the post
+# index and user directory before the splash art appears.
+#
+# in zygote mode a long-lived parent does all of that once. gotty runs the
+# small client instead of dreamland.py; the client hands its terminal (its
+# stdin, stdout and stderr file descriptors) to the parent over a unix
+# socket, and the parent forks a child that runs the session on that
+# terminal. the child starts with everything already imported and warm, so
+# the first frame is a fork away. when the session ends the child sends its
+# exit status back and the client exits with it.
+#
+#   python3 zygote.py                         # start the parent, in the data dir
+#   gotty -w python3 -S zygote.py --connect   # what gotty runs per connection
+#
+# the client only imports modules that are built into the interpreter
+# (socket.py alone pulls in enum and re, which would double its startup),
+# so it can run with -S, which skips site-packages setup as well.
+# if no parent is running it runs dreamland.py itself, so a restart of the
+# parent doesn't lock anyone out. the parent keeps the code it started
+# with: restart it after an update.
+#------------------------------------------------------------------------------
+
+import os
+import sys
+import struct
+import _socket
+
+# the unix socket the parent listens on
+ZYGOTE_PATH = os.environ.get('DREAMLAND_ZYGOTE', 'dreamland.sock')
+
+# environment the client passes on to its session
+FORWARDED_ENV = ('TERM', 'COLUMNS', 'LINES', 'DREAMLAND_RESUME')
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def _encode_request(argv, env):
+    """
+    packs the client's arguments and environment into one message:
+    arguments, a blank, then NAME=value pairs, separated by NUL bytes.
+    """
+    fields = argv + [''] + [f'{name}={value}' for name, value in env.items()]
+    return '\0'.join(fields).encode('utf-8')
+
+def _decode_request(message):
+    """
+    unpacks a message made by _encode_request into (argv, env).
+    """
+    fields = message.decode('utf-8').split('\0')
+    blank = fields.index('')
+    env = dict(field.split('=', 1) for field in fields[blank + 1:] if '=' in field)
+    return fields[:blank], env
+
+def connect(argv):
+    """
+    runs one session through the parent and returns its exit status.
+    falls back to running dreamland.py in this process if there is no
+    parent to talk to.
+    """
+    sock = _socket.socket(_socket.AF_UNIX, _socket.SOCK_SEQPACKET)
+    try:
+        sock.connect(ZYGOTE_PATH)
+    except OSError:
+        sock.close()
+        script = os.path.join(HERE, 'dreamland.py')
+        os.execv(sys.executable, [sys.executable, script] + argv)
+    env = {name: os.environ[name] for name in FORWARDED_ENV if name in os.environ}
+    terminal = [(_socket.SOL_SOCKET, _socket.SCM_RIGHTS, struct.pack('3i', 0, 1, 2))]
+    sock.sendmsg([_encode_request(argv, env)], terminal)
+    try:
+        status = sock.recv(16)
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        sock.close()
+    return int(status or 1)
+
+def _warm():
+    """
+    imports everything a session uses and reads the shared indexes, so
+    children start with them loaded.
+    """
+    import dreamland
+    import auth
+    from config import STORAGE_BACKEND
+    if STORAGE_BACKEND == 'json':
+        import postlog
+        import directory
+        postlog.sync()
+        directory.sync()
+    auth._key()
+    return dreamland
+
+def _run_child(conn, fds, argv, env, dreamland):
+    """
+    runs a session in a freshly forked child on the client's terminal.
+    never returns.
+    """
+    import signal
+    status = 0
+    try:
+        # leave the parent's session, so the child doesn't share its
+        # controlling terminal (getpass then reads the client's terminal)
+        os.setsid()
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+            os.close(fd)
+        sys.stdin = open(0, 'r', encoding='utf-8', closefd=False)
+        sys.stdout = open(1, 'w', encoding='utf-8', closefd=False)
+        sys.stderr = open(2, 'w', encoding='utf-8', closefd=False)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        os.environ.update(env)
+        dreamland.main(argv)
+    except (EOFError, KeyboardInterrupt, OSError):
+        pass  # the terminal went away
+    except SystemExit as e:
+        status = e.code if isinstance(e.code, int) else 1
+    except BaseException:
+        import traceback
+        traceback.print_exc()
+        status = 1
+    finally:
+        try:
+            import notify
+            notify.flush()
+            sys.stdout.flush()
+            conn.send(str(status).encode('utf-8'))
+        except BaseException:
+            pass
+        os._exit(status)
+
+def serve():
+    """
+    starts the parent: warms up, then forks a child per client.
+    """
+    import signal
+    import socket
+    dreamland = _warm()
+    if os.path.exists(ZYGOTE_PATH):
+        os.unlink(ZYGOTE_PATH)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    listener.bind(ZYGOTE_PATH)
+    listener.listen(128)
+    # children are reaped automatically
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(f"zygote ready on {ZYGOTE_PATH}")
+    try:
+        while True:
+            conn, _ = listener.accept()
+            try:
+                message, fds, flags, _ = socket.recv_fds(conn, 65536, 3)
+                argv, env = _decode_request(message)
+            except (OSError, ValueError):
+                conn.close()
+                continue
+            if len(fds) != 3:
+                for fd in fds:
+                    os.close(fd)
+                conn.close()
+                continue
+            if os.fork() == 0:
+                listener.close()
+                _run_child(conn, fds, argv, env, dreamland)
+            for fd in fds:
+                os.close(fd)
+            conn.close()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+        os.unlink(ZYGOTE_PATH)
+
+def main():
+    # the client's arguments go to dreamland.py, so they aren't parsed here
+    if sys.argv[1:2] == ['--connect']:
+        sys.exit(connect(sys.argv[2:]))
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='preload dreamland once and fork a session per connection',
+        epilog='run with --connect [dreamland.py arguments] for one session (what gotty should run)')
+    parser.parse_args()
+    serve()
+
+if __name__ == '__main__':
+    main()